@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Record the outputs of the fake LSF commands for the benchmarks.
+
+The cluster is generated by lsf.testing.fakelsf (configured by its
+FAKELSF_* environment variables) and its outputs are written to files named
+after the commands they replace (see replay.py): bjobs-o.txt, bjobs-W.txt,
+bjobs-p.txt, bjobs-UF.txt, bhosts-l.txt, and lshosts-w.txt.
+"""
+
+from __future__ import print_function, division
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lsf"))
+
+from lsf.testing import fakelsf
+from readjobs import bjobscmd
+
+fixturefiles = ("bjobs-o.txt", "bjobs-W.txt", "bjobs-p.txt", "bjobs-UF.txt",
+                "bhosts-l.txt", "lshosts-w.txt")
+
+
+def writefixtures(path, njobs, nhosts, seed=0):
+    """Write the outputs for njobs jobs on nhosts hosts to a directory."""
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    conf = fakelsf.config()
+    conf.update(njobs=njobs, nhosts=nhosts, seed=seed)
+    hosts = fakelsf.makehosts(conf)
+    jobs = fakelsf.makejobs(conf, hosts)
+    ospec = bjobscmd([])[-1]  # the -o specification used by readjobs
+    outputs = {
+        "bjobs-o.txt": fakelsf.bjobso(jobs, ospec),
+        "bjobs-W.txt": fakelsf.bjobsw(jobs, header=False),
+        "bjobs-p.txt": fakelsf.bjobsp(jobs),
+        "bhosts-l.txt": fakelsf.bhostsl(hosts),
+        "lshosts-w.txt": fakelsf.lshostsw(hosts),
+    }
+    for filename, lines in outputs.iteritems():
+        with open(os.path.join(path, filename), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    with open(os.path.join(path, "bjobs-UF.txt"), "w") as f:
+        f.write(fakelsf.bjobsuf(jobs))
+
+
+def main():
+    """Main program entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="output directory")
+    parser.add_argument("--jobs", type=int, default=10000,
+                        help="number of jobs (default: 10000)")
+    parser.add_argument("--hosts", type=int, default=500,
+                        help="number of hosts (default: 500)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed (default: 0)")
+    args = parser.parse_args()
+    writefixtures(args.path, args.jobs, args.hosts, args.seed)
+
+
+if __name__ == "__main__":
+    main()
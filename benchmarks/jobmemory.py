@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Compare the memory footprint of Job records and plain job dicts."""
+
+from __future__ import print_function, division
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lsf"))
+
+from job import Job, keys, aliases
+from readjobs import parsejob, delimiter
+
+
+def bjobsline(i):
+    """Generate a line of bjobs -o output for job number i."""
+    values = {
+        "jobid": str(100000 + i),
+        "stat": "RUN",
+        "user": "user%d" % (i % 50),
+        "queue": "normal",
+        "job_name": "sweep_%d" % i,
+        "proj_name": "project%d" % (i % 5),
+        "command": "./run.sh --param %d" % i,
+        "pids": "%d,%d" % (2000 + i, 2001 + i),
+        "from_host": "login1",
+        "exec_host": "16*host%d:8*host%d" % (i % 1000, (i + 1) % 1000),
+        "nexec_host": "2",
+        "submit_time": "Oct 18 11:52:56 2026",
+        "start_time": "Oct 18 11:53:56 2026",
+        "%complete": "12.50% L",
+        "cpu_used": "3600.0 second(s)",
+        "run_time": "900 second(s)",
+        "slots": "24",
+        "mem": "1.5 Gbytes",
+        "max_mem": "2 Gbytes",
+        "memlimit": "4 Gbytes",
+        "min_req_proc": "24",
+        "sub_cwd": "/home/user%d" % (i % 50),
+        "output_file": "sweep_%d.out" % i,
+    }
+    return delimiter.join(values.get(key, "-") for key in keys)
+
+
+def asdict(job):
+    """Convert a Job into a dict as formerly returned by readjobs."""
+    result = job.todict()
+    result.update({alias: result[key] for alias, key in aliases})
+    return result
+
+
+def deepsize(obj, seen):
+    """Size of an object and all objects it refers to (counted once)."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deepsize(k, seen) + deepsize(v, seen)
+                    for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deepsize(x, seen) for x in obj)
+    elif isinstance(obj, Job):
+        size += sum(deepsize(getattr(obj, attr), seen)
+                    for attr in Job.__slots__)
+    return size
+
+
+def main():
+    """Main program entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=10000,
+                        help="number of jobs (default: 10000)")
+    args = parser.parse_args()
+
+    jobs = [parsejob(bjobsline(i)) for i in range(args.n)]
+    dicts = [asdict(job) for job in jobs]
+    # shared objects (e.g., field names) are counted once in each measurement
+    jobsize = deepsize(jobs, set()) / args.n
+    dictsize = deepsize(dicts, set()) / args.n
+    print("jobs:          %8d" % args.n)
+    print("dict per job:  %8.0f B" % dictsize)
+    print("Job per job:   %8.0f B" % jobsize)
+    print("ratio:         %8.2f" % (dictsize / jobsize))
+
+
+if __name__ == "__main__":
+    main()
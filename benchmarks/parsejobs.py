@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Measure the throughput of parsing bjobs -o output."""
+
+from __future__ import print_function, division
+
+import os
+import sys
+import argparse
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lsf"))
+
+from readjobs import parsejob, parsers
+from jobmemory import bjobsline
+
+
+def clearcaches():
+    """Clear the memoization caches of all field parsers."""
+    for parse in set(parsers.values()):
+        if hasattr(parse, "cache"):
+            parse.cache.clear()
+
+
+def main():
+    """Main program entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100000,
+                        help="number of synthetic jobs (default: 100000)")
+    parser.add_argument("-f", "--file",
+                        help="recorded bjobs -o output (instead of synthetic)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="write the synthetic output to FILE and exit")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="number of repetitions (default: 3)")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            lines = f.read().splitlines()[1:]  # get rid of header
+    else:
+        lines = [bjobsline(i) for i in range(args.n)]
+    if args.record:
+        with open(args.record, "w") as f:
+            f.write("JOBID\n")
+            f.write("\n".join(lines) + "\n")
+        return
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        clearcaches()
+        t = time()
+        for line in lines:
+            parsejob(line)
+        best = min(best, time() - t)
+    print("jobs:    %10d" % len(lines))
+    print("time:    %10.3f s" % best)
+    print("jobs/s:  %10.0f" % (len(lines) / best))
+
+
+if __name__ == "__main__":
+    main()
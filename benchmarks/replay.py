@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Stand-in for bjobs, bhosts, and lshosts that replays recorded outputs.
+
+Installed under the command names (see installreplay), it prints the file
+from the directory $LSF_FIXTURES that corresponds to the command and its
+flags, regardless of the other arguments.
+"""
+
+import os
+import sys
+import shutil
+
+# fixture file for (command, flag)
+fixtures = (
+    ("bjobs", "-o", "bjobs-o.txt"),
+    ("bjobs", "-W", "bjobs-W.txt"),
+    ("bjobs", "-p", "bjobs-p.txt"),
+    ("bjobs", "-UF", "bjobs-UF.txt"),
+    ("bhosts", "-l", "bhosts-l.txt"),
+    ("lshosts", "-w", "lshosts-w.txt"),
+)
+
+
+def installreplay(bindir):
+    """Install the stand-in commands into a directory."""
+    if not os.path.isdir(bindir):
+        os.makedirs(bindir)
+    script = "#!%s\nimport sys\nsys.path.insert(0, %r)\nimport replay\n" \
+        "replay.main()\n" % (sys.executable, os.path.dirname(
+            os.path.abspath(__file__)))
+    for cmd in set(cmd for cmd, flag, filename in fixtures):
+        filename = os.path.join(bindir, cmd)
+        with open(filename, "w") as f:
+            f.write(script)
+        os.chmod(filename, 0o755)
+
+
+def main():
+    """Main program entry point."""
+    cmd = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+    for fixturecmd, flag, filename in fixtures:
+        if cmd == fixturecmd and flag in args:
+            break
+    else:
+        sys.stderr.write("%s: no recorded output for %s\n" %
+                         (cmd, " ".join(args)))
+        sys.exit(1)
+    with open(os.path.join(os.environ["LSF_FIXTURES"], filename)) as f:
+        shutil.copyfileobj(f, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Benchmark the startup time of the scripts.
+
+Each case is a new python process that starts the interpreter, imports a
+part of the package, or runs a script with --help (which parses its
+arguments without calling LSF).  The median and minimum wall times of
+several runs are reported.
+"""
+
+from __future__ import print_function, division
+
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from time import time, strftime
+
+from suite import gitcommit
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.join(here, "..")
+scripts = os.path.join(root, "scripts")
+
+# case name and python arguments
+cases = (
+    ("interpreter", ["-c", "pass"]),
+    ("import lsf", ["-c", "import lsf"]),
+    ("import ejobs", ["-c", "from lsf import ejobs"]),
+    ("import ehosts", ["-c", "from lsf import ehosts"]),
+    ("import esub", ["-c", "from lsf import esub"]),
+    ("ejobs -h", [os.path.join(scripts, "ejobs"), "-h"]),
+    ("ehosts -h", [os.path.join(scripts, "ehosts"), "-h"]),
+    ("esub -h", [os.path.join(scripts, "esub"), "-h"]),
+    ("python-lsf sub -h", [os.path.join(scripts, "python-lsf"), "sub", "-h"]),
+)
+
+
+def runcase(args, repeat):
+    """Wall times of repeated runs of python with args."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.abspath(root)
+    times = []
+    with open(os.devnull, "w") as devnull:
+        for _ in range(repeat):
+            t = time()
+            subprocess.check_call([sys.executable] + args, env=env,
+                                  stdout=devnull)
+            times.append(time() - t)
+    return sorted(times)
+
+
+def main():
+    """Main program entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--repeat", type=int, default=20,
+                        help="runs per case (default: 20)")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="save the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print("%-20s %10s %10s" % ("case", "median ms", "min ms"))
+    for name, pyargs in cases:
+        times = runcase(pyargs, args.repeat)
+        median = times[len(times) // 2]
+        results.append({"case": name, "median": median, "min": times[0]})
+        print("%-20s %10.1f %10.1f" % (name, 1000 * median, 1000 * times[0]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "date": strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "commit": gitcommit(),
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
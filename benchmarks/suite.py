@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""Benchmark ejobs and ehosts on recorded LSF outputs.
+
+bjobs, bhosts, and lshosts are replaced by stand-ins that replay recorded
+outputs (see replay.py), either of the fake LSF commands (see fixtures.py)
+or captured on a real cluster with --fixtures.  Each case runs in its own
+process and reports the time, throughput, and peak memory (resident set
+size) of its phases: parse, sort, group, sum, and render.
+"""
+
+from __future__ import print_function, division
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+from time import time, strftime
+from tempfile import mkdtemp
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, "..", "lsf"))
+
+from fixtures import writefixtures, fixturefiles
+from replay import installreplay
+
+defaultjobs = (1000, 10000, 100000)
+defaulthosts = (500, 5000)
+
+
+def resetpeak():
+    """Reset the peak memory of this process (False if not supported)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # reset VmHWM (Linux 4.0)
+        return True
+    except IOError:
+        return False
+
+
+def peakmemory():
+    """Peak memory (since the last reset) of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def runphases(phases):
+    """Run (name, function, count) phases and measure each of them.
+
+    Each phase's peak memory is its own if the peak can be reset, and
+    otherwise the peak of the process so far (phase_peak is False).
+    """
+    results = []
+    for name, f, count in phases:
+        reset = resetpeak()
+        t = time()
+        f()
+        t = time() - t
+        results.append({
+            "phase": name,
+            "seconds": t,
+            "records": count(),
+            "per_second": count() / t if t else None,
+            "peak_mb": peakmemory(),
+            "phase_peak": reset,
+        })
+    return results
+
+
+def benchjobs():
+    """Phases for jobs (in this process)."""
+    from job import fields, prefetch, sortjobs
+    from readjobs import readjobs
+    from groupjobs import groupjobs
+    from sumjobs import sumjobs
+    from printjobs import printjobs
+
+    state = {}
+
+    def parse():
+        state["jobs"] = readjobs([])
+        prefetch(state["jobs"], fields)
+
+    def sort():
+        # the default order of ejobs
+        sortjobs(state["jobs"])
+
+    def group():
+        state["groups"] = groupjobs(state["jobs"], "user")
+
+    def sum():
+        state["sums"] = [sumjobs(group)
+                         for group in state["groups"].itervalues()]
+
+    def render():
+        with open(os.devnull, "w") as f:
+            printjobs(state["jobs"], file=f)
+
+    count = lambda: len(state["jobs"])
+    return [("parse", parse, count), ("sort", sort, count),
+            ("group", group, count), ("sum", sum, count),
+            ("render", render, count)]
+
+
+def benchhosts():
+    """Phases for hosts (in this process)."""
+    from readjobs import readjobs
+    from readhosts import readhosts
+    from grouphosts import grouphosts
+    from sumhosts import sumhosts
+    from printhosts import printhosts, indexjobs
+
+    state = {}
+
+    def parse():
+        state["hosts"] = readhosts([])
+        state["jobs"] = [job for job in readjobs([], fast=True)
+                         if job["exec_host"]]
+
+    def sort():
+        state["hosts"].sort(key=lambda h: h["host_name"])
+
+    def group():
+        state["groups"] = grouphosts(state["hosts"], "model")
+
+    def sum():
+        state["sums"] = [sumhosts(group)
+                         for group in state["groups"].itervalues()]
+
+    def render():
+        jobs = state["jobs"]
+        with open(os.devnull, "w") as f:
+            printhosts(state["hosts"], jobs, file=f,
+                       jobsbyhost=indexjobs(jobs))
+
+    count = lambda: len(state["hosts"])
+    return [("parse", parse, count), ("sort", sort, count),
+            ("group", group, count), ("sum", sum, count),
+            ("render", render, count)]
+
+
+def runcase(kind, fixtures):
+    """Run a case in a subprocess with the stand-in LSF commands."""
+    bindir = mkdtemp(prefix="lsfbench")
+    try:
+        installreplay(bindir)
+        env = dict(os.environ)
+        env["PATH"] = bindir + os.pathsep + env.get("PATH", "")
+        env["LSF_FIXTURES"] = fixtures
+        env["LSF_DAEMON_SOCKET"] = os.devnull  # don't ask a shared daemon
+        out = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--run", kind],
+            env=env)
+    finally:
+        shutil.rmtree(bindir)
+    return json.loads(out)
+
+
+def gitcommit():
+    """Current commit of the repository (or None)."""
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], cwd=here,
+                stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """Main program entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, nargs="+", default=defaultjobs,
+                        help="numbers of generated jobs (default: %s)" %
+                        " ".join(map(str, defaultjobs)))
+    parser.add_argument("--hosts", type=int, nargs="+", default=defaulthosts,
+                        help="numbers of generated hosts (default: %s)" %
+                        " ".join(map(str, defaulthosts)))
+    parser.add_argument("--fixtures", metavar="DIR",
+                        help="recorded outputs (%s) instead of generated ones"
+                        % ", ".join(fixturefiles))
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="save the results as JSON")
+    parser.add_argument("--run", choices=("jobs", "hosts"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # inside a case's process
+        phases = benchjobs() if args.run == "jobs" else benchhosts()
+        json.dump(runphases(phases), sys.stdout)
+        return
+
+    cases = []
+    if args.fixtures:
+        cases.append((None, None, os.path.abspath(args.fixtures), False))
+    else:
+        # job cases on the smallest cluster, host cases with the most jobs
+        hosts = min(args.hosts)
+        for njobs in args.jobs:
+            cases.append((njobs, hosts, None, True))
+        for nhosts in args.hosts:
+            if nhosts != hosts:
+                cases.append((max(args.jobs), nhosts, None, True))
+
+    results = []
+    cumulative = False  # whether some peaks are those of the process so far
+    print("%-6s %8s %6s  %-7s %10s %12s %9s" % (
+        "case", "jobs", "hosts", "phase", "seconds", "records/s", "peak MB"))
+    for njobs, nhosts, fixtures, generated in cases:
+        if generated:
+            fixtures = mkdtemp(prefix="lsffixtures")
+            writefixtures(fixtures, njobs, nhosts)
+        try:
+            for kind in ("jobs", "hosts"):
+                if kind == "jobs" and nhosts != min(args.hosts) and generated:
+                    continue  # the host count hardly matters for jobs
+                phases = runcase(kind, fixtures)
+                results.append({"case": kind, "jobs": njobs, "hosts": nhosts,
+                                "phases": phases})
+                for phase in phases:
+                    print("%-6s %8s %6s  %-7s %10.3f %12.0f %9.1f%s" % (
+                        kind, njobs or "-", nhosts or "-", phase["phase"],
+                        phase["seconds"], phase["per_second"] or 0,
+                        phase["peak_mb"], "" if phase["phase_peak"] else "*"))
+                    cumulative |= not phase["phase_peak"]
+        finally:
+            if generated:
+                shutil.rmtree(fixtures)
+    if cumulative:
+        print("* peak of the process so far (not of the phase)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "date": strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "commit": gitcommit(),
+                "fixtures": args.fixtures,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,55 @@
-"""LSF module."""
+"""LSF module.
 
-__all__ = ["ejobs", "ehosts", "esub", "submitjob"]
+The submodules are only imported when first used, so that, e.g., esub does
+not load what ejobs and ehosts need.
+"""
+
+import sys
+from types import ModuleType
+from importlib import import_module
+
+__all__ = ["ejobs", "ehosts", "esub", "aio", "submitjob", "submitjobs",
+           "SubmitPool", "submitall", "readacct",
+           "JobTracker"]
 __author__ = "Elmar Peise"
 
-import ejobs
-import ehosts
-import esub
-from submitjob import submitjob
+# submodule and attribute (None for the submodule itself) of each public name
+lazynames = {
+    "ejobs": ("ejobs", None),
+    "ehosts": ("ehosts", None),
+    "esub": ("esub", None),
+    "aio": ("aio", None),
+    "submitjob": ("submitjob", "submitjob"),
+    "submitjobs": ("submitjob", "submitjobs"),
+    "SubmitPool": ("submitpool", "SubmitPool"),
+    "submitall": ("submitpool", "submitall"),
+    "readacct": ("readacct", "readacct"),
+    "JobTracker": ("readevents", "JobTracker"),
+}
+
+
+def lazyname(modname, attr):
+    """Property that imports a public name when accessed."""
+    def get(self):
+        module = import_module(__name__ + "." + modname)
+        return module if attr is None else getattr(module, attr)
+    return property(get)
+
+
+class LazyModule(ModuleType):
+    """Package whose public names are imported when accessed.
+
+    (Properties also take precedence over the submodules that imports store
+    in the package, e.g., lsf.submitjob stays the function.)
+    """
+
+
+for name, (modname, attr) in lazynames.iteritems():
+    setattr(LazyModule, name, lazyname(modname, attr))
+
+# replace this module (which is kept, since python 2 clears the globals of
+# deleted modules)
+lazymodule = LazyModule(__name__, __doc__)
+lazymodule.__dict__.update(sys.modules[__name__].__dict__)
+lazymodule.module = sys.modules[__name__]
+sys.modules[__name__] = lazymodule
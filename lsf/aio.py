@@ -0,0 +1,230 @@
+"""Non-blocking variants of readjobs, readhosts, and submitjob.
+
+Each function starts its query in the background and returns a Future for
+its result at once.  Futures run independently (and so concurrently), can
+be cancelled (killing their LSF commands), and time out.
+"""
+
+from __future__ import print_function, division
+
+import errno
+from time import time
+from threading import Thread, Lock, Event, Timer
+from subprocess import Popen, PIPE
+
+from readjobs import (bjobscmd, bjobserrors, parsejob, makefieldparsers,
+                      JobLoader, phaseparsers)
+from readhosts import parsebhosts, parselshosts
+from submitjob import bsubargs, jobscript, parsebsub
+from timings import span, current, adopt
+
+# order in which the bjobs -W, -p, and -UF outputs are parsed
+phases = ("W", "p", "UF")
+
+
+class Cancelled(EnvironmentError):
+    """A query was cancelled."""
+
+
+class Timeout(EnvironmentError):
+    """A query did not finish in time."""
+
+
+class Future(object):
+    """Result of a query running in the background."""
+
+    def __init__(self, query, args=(), timeout=None):
+        """Start query(future, *args) in a thread (cancelled after timeout)."""
+        self.value = None
+        self.error = None
+        self.cancelled = None  # error raised in the cancelled query
+        self.callbacks = []
+        self.processes = set()
+        self.lock = Lock()
+        self.finished = Event()
+        self.parent = current()
+        self.timer = None
+        if timeout is not None:
+            error = Timeout(errno.ETIMEDOUT,
+                            "timed out after %g seconds" % timeout)
+            self.timer = Timer(timeout, self.cancel, (error,))
+            self.timer.daemon = True
+            self.timer.start()
+        self.thread = Thread(target=self.work, args=(query, args))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def work(self, query, args):
+        """Run the query and call the callbacks."""
+        with adopt(self.parent):
+            try:
+                value = query(self, *args)
+            except Exception as e:
+                self.error = e
+            else:
+                self.value = value
+        if self.timer:
+            self.timer.cancel()
+        with self.lock:
+            if self.cancelled:
+                self.value, self.error = None, self.cancelled
+            self.finished.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def run(self, cmd, stdin=None):
+        """Run a command for the query and return its output and errors."""
+        with span("command", cmd) as record:
+            with self.lock:
+                if self.cancelled:
+                    raise self.cancelled
+                p = Popen(cmd, stdout=PIPE, stderr=PIPE,
+                          stdin=None if stdin is None else PIPE)
+                self.processes.add(p)
+            try:
+                out, err = p.communicate(stdin)
+            finally:
+                with self.lock:
+                    self.processes.discard(p)
+            if self.cancelled:
+                raise self.cancelled
+            record["bytes"] = len(out)
+            return out, err
+
+    def runall(self, cmds):
+        """Run several commands concurrently for the query."""
+        outs = [None] * len(cmds)
+        errors = []
+        parent = current()
+
+        def run(i):
+            with adopt(parent):
+                try:
+                    outs[i] = self.run(cmds[i])
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [Thread(target=run, args=(i,)) for i in range(len(cmds))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return outs
+
+    def cancel(self, error=None):
+        """Cancel the query and kill its commands (False if it is done)."""
+        with self.lock:
+            if self.finished.is_set():
+                return False
+            if not self.cancelled:
+                self.cancelled = error or Cancelled(errno.EINTR, "cancelled")
+            for p in self.processes:
+                try:
+                    p.kill()
+                except OSError:
+                    pass
+        return True
+
+    def done(self):
+        """Whether the query finished (or was cancelled)."""
+        return self.finished.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the query's result (or raise its error).
+
+        If the result is not there within timeout seconds, Timeout is raised
+        (but the query continues).
+        """
+        if not self.finished.wait(timeout):
+            raise Timeout(errno.ETIMEDOUT,
+                          "no result after %g seconds" % timeout)
+        if self.error:
+            raise self.error
+        return self.value
+
+    def add_done_callback(self, callback):
+        """Call callback(future) once the query finished."""
+        with self.lock:
+            if not self.finished.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+
+def gather(futures, timeout=None):
+    """Wait for several futures and return their results."""
+    if timeout is None:
+        return [future.result() for future in futures]
+    end = time() + timeout
+    return [future.result(max(0, end - time())) for future in futures]
+
+
+def queryjobs(future, args, fast, fields):
+    """Read and parse jobs (with all of their information unless fast)."""
+    out, err = future.run(bjobscmd(args, fields))
+    if bjobserrors(err):
+        return []
+    joborder = []
+    jobs = {}
+    jobparsers = makefieldparsers(fields)
+    with span("parse bjobs -o") as record:
+        for line in out.splitlines()[1:]:
+            job = parsejob(line, jobparsers)
+            joborder.append(job["jobid"])
+            jobs[job["jobid"]] = job
+        record["records"] = len(joborder)
+    if not fast and joborder:
+        loader = JobLoader(jobs, joborder)
+        cmds = [(phase, loader.command(phase)) for phase in phases]
+        cmds = [(phase, cmd) for phase, cmd in cmds if cmd]
+        outs = future.runall([cmd for phase, cmd in cmds])
+        for (phase, cmd), (out, err) in zip(cmds, outs):
+            with span("parse bjobs -" + phase) as record:
+                phaseparsers[phase](jobs, out)
+                record["bytes"] = len(out)
+                record["records"] = len(joborder)
+    return [jobs[jid] for jid in joborder]
+
+
+def queryhosts(future, args, fast):
+    """Read and parse hosts (with lshosts information unless fast)."""
+    out, err = future.run(["bhosts", "-l"] + args)
+    if err:
+        return []
+    hosts = parsebhosts(out)
+    if not fast and hosts:
+        hostorder = [host["host_name"] for host in hosts]
+        out, err = future.run(["lshosts", "-w"] + hostorder)
+        parselshosts({host["host_name"]: host for host in hosts}, out)
+    return hosts
+
+
+def querysubmit(future, data, shell):
+    """Submit a job and return its id."""
+    out, err = future.run(["bsub"] + bsubargs(data),
+                          jobscript(data["command"], shell))
+    return parsebsub(out, err)
+
+
+def readjobs(args, fast=False, timeout=None, fields=None):
+    """Read jobs from bjobs in the background.
+
+    Unlike readjobs.readjobs, the bjobs -W, -p, and -UF information is read
+    with the jobs (unless fast), so that accessing it later does not block.
+    """
+    return Future(queryjobs, (args, fast, fields), timeout)
+
+
+def readhosts(args, fast=False, timeout=None):
+    """Read hosts from LSF in the background."""
+    return Future(queryhosts, (args, fast), timeout)
+
+
+def submitjob(data, shell=False, timeout=None):
+    """Submit a job to LSF in the background."""
+    if "command" not in data:
+        raise ValueError("no command given")
+    return Future(querysubmit, (data, shell), timeout)
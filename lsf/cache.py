@@ -0,0 +1,184 @@
+"""On-disk snapshot cache for the output of LSF commands."""
+
+import os
+import stat
+import fcntl
+import hashlib
+from time import time
+from contextlib import contextmanager
+from tempfile import mkstemp, TemporaryFile
+from subprocess import Popen, PIPE
+
+# entries are: header with stdout and stderr lengths, stdout, stderr
+headerformat = "%20d %20d\n"
+
+# entries older than this are removed when a new entry is written
+prunetime = 24 * 60 * 60
+
+
+def cachedir():
+    """Directory for cached LSF output."""
+    base = os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "python-lsf")
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path, 0o700)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+def cachefile(cmd):
+    """Cache file name for a command line."""
+    key = hashlib.sha1("\0".join(cmd)).hexdigest()
+    return os.path.join(cachedir(), key)
+
+
+def samefile(f, filename):
+    """Whether an open file is still at filename (not removed by pruning)."""
+    try:
+        return os.stat(filename).st_ino == os.fstat(f.fileno()).st_ino
+    except OSError:
+        return False
+
+
+@contextmanager
+def cachelock(cmd):
+    """Hold an exclusive lock on a command line's cache entry."""
+    lockname = cachefile(cmd) + ".lock"
+    while True:
+        f = open(lockname, "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if samefile(f, lockname):
+            break
+        # pruned while waiting for the lock: lock the new file
+        f.close()
+    with f:
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def opencache(cmd, maxage):
+    """Open a cache entry not older than maxage seconds.
+
+    Returns (file, stdout length, stderr length) or None.
+    """
+    try:
+        f = open(cachefile(cmd), "rb")
+    except IOError:
+        return None
+    if time() - os.fstat(f.fileno()).st_mtime > maxage:
+        f.close()
+        return None
+    outlen, errlen = map(int, f.readline().split())
+    return f, outlen, errlen
+
+
+def prunelock(filename):
+    """Remove a lock file unless it is locked."""
+    with open(filename, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return
+        # cachelock checks that the file it locked wasn't removed
+        if samefile(f, filename):
+            os.remove(filename)
+
+
+def prunecache():
+    """Remove old cache entries.
+
+    Lock files (whose mtimes don't change while they are used) are only
+    removed while holding their lock; sockets (e.g., of elsfd) are kept.
+    """
+    path = cachedir()
+    now = time()
+    for filename in os.listdir(path):
+        filename = os.path.join(path, filename)
+        try:
+            info = os.lstat(filename)
+            if not stat.S_ISREG(info.st_mode) or \
+                    now - info.st_mtime <= prunetime:
+                continue
+            if filename.endswith(".lock"):
+                prunelock(filename)
+            else:
+                os.remove(filename)
+        except (IOError, OSError):
+            pass
+
+
+def streamtocache(cmd):
+    """Run a command, yield its output lines, and store them in the cache.
+
+    The entry is written to a temporary file that atomically replaces the
+    old entry once the command is complete.
+    """
+    prunecache()
+    fd, tmpname = mkstemp(dir=cachedir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(headerformat % (0, 0))
+            errfile = TemporaryFile()
+            p = Popen(cmd, stdout=PIPE, stderr=errfile)
+            outlen = 0
+            try:
+                for line in iter(p.stdout.readline, ""):
+                    f.write(line)
+                    outlen += len(line)
+                    yield line
+            finally:
+                if p.poll() is None:
+                    p.kill()
+                p.wait()
+            errfile.seek(0)
+            err = errfile.read()
+            f.write(err)
+            f.seek(0)
+            f.write(headerformat % (outlen, len(err)))
+        os.rename(tmpname, cachefile(cmd))
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+
+def itercachedoutput(cmd, maxage):
+    """Yield a command's output lines, cached for maxage seconds."""
+    entry = opencache(cmd, maxage)
+    if entry is None:
+        with cachelock(cmd):
+            # another process may have updated the entry in the meantime
+            entry = opencache(cmd, maxage)
+            if entry is None:
+                for line in streamtocache(cmd):
+                    yield line
+                return
+    f, outlen, errlen = entry
+    with f:
+        while outlen > 0:
+            line = f.readline(outlen)
+            outlen -= len(line)
+            yield line
+
+
+def cachedoutput(cmd, maxage):
+    """Return a command's (stdout, stderr), cached for maxage seconds."""
+    entry = opencache(cmd, maxage)
+    if entry is None:
+        with cachelock(cmd):
+            # another process may have updated the entry in the meantime
+            entry = opencache(cmd, maxage)
+            if entry is None:
+                out = "".join(streamtocache(cmd))
+                entry = opencache(cmd, float("inf"))
+                if entry is None:
+                    return out, ""
+    f, outlen, errlen = entry
+    with f:
+        return f.read(outlen), f.read(errlen)
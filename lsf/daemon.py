@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+"""Daemon that serves jobs and hosts from memory over a Unix socket.
+
+The daemon periodically reads all unfinished jobs and all hosts from LSF and
+answers the queries of ejobs and ehosts, which would otherwise each query LSF
+themselves.  Queries that can't be answered from the daemon's state (e.g.,
+finished jobs or resource requirements) are refused, in which case the
+clients fall back to querying LSF directly.  With --events, the jobs are
+followed in LSF's event log (lsb.events) instead of read with bjobs.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import re
+import grp
+import pwd
+import stat
+import json
+import socket
+import signal
+import argparse
+import SocketServer
+from fnmatch import fnmatch
+from threading import Thread
+from time import time, sleep
+
+from job import Job, fields, prefetch
+from readjobs import readjobs
+from readhosts import readhosts
+from readevents import readevents
+from cache import cachedir
+from utility import decodeobject
+
+# socket of a daemon shared by several users (default: the user's own)
+socketpath = os.environ.get("LSF_DAEMON_SOCKET")
+
+# user whose daemon (besides the user's own) clients trust
+daemonadmin = os.environ.get("LSF_DAEMON_ADMIN")
+
+# stat flags understood by filterjobs
+statflags = {
+    "-r": ("RUN", "PROV"),
+    "-p": ("PEND",),
+    "-s": ("PSUSP", "USUSP", "SSUSP"),
+}
+
+
+def filterjobs(jobs, args, user):
+    """Select jobs like bjobs would.
+
+    Returns None if the arguments are not supported.
+    """
+    users = [user]
+    stats = set()
+    filters = {}
+    jobids = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in statflags:
+            stats.update(statflags[arg])
+        elif arg in ("-u", "-q", "-m", "-P", "-G", "-J"):
+            if not args:
+                return None
+            filters[arg] = args.pop(0)
+        elif re.match("\d+(\[\d+\])?$", arg):
+            jobids.append(arg)
+        else:
+            return None
+    if "-u" in filters:
+        users = filters.pop("-u").split()
+        if "all" in users:
+            users = None
+    elif jobids:
+        users = None
+    if users is not None:
+        # users without jobs might be user groups
+        known = set(job["user"] for job in jobs)
+        if not all(u in known for u in users):
+            return None
+        users = set(users)
+    hosts = None
+    if "-m" in filters:
+        hosts = set(filters.pop("-m").split())
+    result = []
+    for job in jobs:
+        if users is not None and job["user"] not in users:
+            continue
+        if stats and job["stat"] not in stats:
+            continue
+        if jobids and job["jobid"] not in jobids and \
+                job["jobid"].split("[")[0] not in jobids:
+            continue
+        if "-q" in filters and job["queue"] != filters["-q"]:
+            continue
+        if "-P" in filters and job["proj_name"] != filters["-P"]:
+            continue
+        if "-G" in filters and job["user_group"] != filters["-G"]:
+            continue
+        if "-J" in filters and not fnmatch(job["job_name"] or "",
+                                           filters["-J"]):
+            continue
+        if hosts is not None and not (job["exec_host"] and
+                                      hosts.intersection(job["exec_host"])):
+            continue
+        result.append(job)
+    if jobids:
+        # the requested jobs might have finished
+        found = set(job["jobid"] for job in result)
+        found.update(jid.split("[")[0] for jid in list(found))
+        if not all(jid in found for jid in jobids):
+            return None
+    return result
+
+
+def filterhosts(hosts, args):
+    """Select hosts like bhosts would.
+
+    Returns None if the arguments are not supported.
+    """
+    if any(arg.startswith("-") for arg in args):
+        return None
+    if not args:
+        return hosts
+    hostsbyname = {host["host_name"]: host for host in hosts}
+    # unknown names might be host groups
+    if not all(name in hostsbyname for name in args):
+        return None
+    return [hostsbyname[name] for name in args]
+
+
+def defaultsocket():
+    """The user's own socket (in $XDG_RUNTIME_DIR or the cache directory)."""
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if not base or not os.path.isdir(base):
+        base = cachedir()
+    return os.path.join(base, "python-lsf-daemon.sock")
+
+
+def trustedsocket(path):
+    """Whether path is a socket of the user or the daemon admin."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISSOCK(info.st_mode):
+        return False
+    if info.st_uid == os.getuid():
+        return True
+    if not daemonadmin:
+        return False
+    try:
+        return info.st_uid == pwd.getpwnam(daemonadmin).pw_uid
+    except KeyError:
+        return False
+
+
+class State(object):
+    """Jobs and hosts as last read from LSF."""
+
+    def __init__(self, interval, events=None):
+        """Initialize an empty state (with jobs from the event log events)."""
+        self.interval = interval
+        self.events = events
+        self.jobs = None
+        self.hosts = None
+        self.time = None
+
+    def poll(self):
+        """Periodically read jobs and hosts from LSF."""
+        while True:
+            try:
+                if self.events:
+                    jobs = readevents(self.events)
+                else:
+                    jobs = readjobs(["-u", "all"])
+                    prefetch(jobs, fields)
+                hosts = readhosts([])
+                self.jobs, self.hosts, self.time = jobs, hosts, time()
+            except Exception as e:
+                print("polling LSF failed:", e, file=sys.stderr)
+            sleep(self.interval)
+
+    def query(self, request):
+        """Answer a query."""
+        if self.time is None or time() - self.time > 3 * self.interval:
+            return {"error": "no recent data"}
+        if request.get("type") == "jobs":
+            jobs = filterjobs(self.jobs, request["args"], request["user"])
+            if jobs is None:
+                return {"error": "unsupported arguments"}
+            return {"jobs": jobs, "time": self.time}
+        if request.get("type") == "hosts":
+            hosts = filterhosts(self.hosts, request["args"])
+            if hosts is None:
+                return {"error": "unsupported arguments"}
+            return {"hosts": hosts, "time": self.time}
+        return {"error": "unknown request"}
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    """Handler for a single client connection."""
+
+    def handle(self):
+        """Answer the client's query."""
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.state.query(request)
+        except ValueError:
+            response = {"error": "invalid request"}
+        json.dump(response, self.wfile, default=Job.todict)
+        self.wfile.write("\n")
+
+
+class Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Threaded Unix socket server."""
+
+    daemon_threads = True
+
+
+def query(request):
+    """Send a query to the daemon; None if it can't be answered.
+
+    Only daemons of the user or of LSF_DAEMON_ADMIN are asked, so that other
+    users can't serve made-up jobs and hosts.
+    """
+    path = socketpath or defaultsocket()
+    if not trustedsocket(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(1)
+        sock.connect(path)
+        sock.settimeout(60)
+        f = sock.makefile("rw")
+        json.dump(request, f)
+        f.write("\n")
+        f.flush()
+        response = json.loads(f.readline(), object_pairs_hook=decodeobject)
+    except (socket.error, ValueError):
+        return None
+    finally:
+        sock.close()
+    if "error" in response:
+        return None
+    return response
+
+
+def daemonjobs(args):
+    """Read jobs from the daemon; None if it can't answer."""
+    response = query({"type": "jobs", "args": args,
+                      "user": os.getenv("USER")})
+    if response is None:
+        return None
+    jobs = map(Job, response["jobs"])
+    for job in jobs:
+        job["pend_reason"] = map(tuple, job["pend_reason"])
+    return jobs
+
+
+def daemonhosts(args):
+    """Read hosts from the daemon; None if it can't answer."""
+    response = query({"type": "hosts", "args": args})
+    if response is None:
+        return None
+    return response["hosts"]
+
+
+def main():
+    """Main program entry point."""
+    parser = argparse.ArgumentParser(
+        description="Serve LSF jobs and hosts to ejobs and ehosts."
+    )
+    parser.add_argument(
+        "--interval",
+        help="read from LSF every SECONDS (default: 30)",
+        type=float,
+        default=30,
+        metavar="SECONDS"
+    )
+    parser.add_argument(
+        "--socket",
+        help="Unix socket to listen on (default: $LSF_DAEMON_SOCKET or "
+        "python-lsf-daemon.sock in $XDG_RUNTIME_DIR or the cache directory)"
+    )
+    parser.add_argument(
+        "--group",
+        help="let the members of GROUP connect (they need LSF_DAEMON_SOCKET "
+        "and LSF_DAEMON_ADMIN set to the socket and this user)",
+        metavar="GROUP"
+    )
+    parser.add_argument(
+        "--events",
+        help="follow the jobs in LSF's event log FILE instead of bjobs",
+        metavar="FILE"
+    )
+    args = parser.parse_args()
+    if not args.socket:
+        args.socket = socketpath or defaultsocket()
+    if args.group:
+        try:
+            gid = grp.getgrnam(args.group).gr_gid
+        except KeyError:
+            parser.error("unknown group %s" % args.group)
+
+    state = State(args.interval, args.events)
+    poller = Thread(target=state.poll)
+    poller.daemon = True
+    poller.start()
+
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    # only the user can connect until the socket's mode is set
+    umask = os.umask(0o177)
+    try:
+        server = Server(args.socket, RequestHandler)
+    finally:
+        os.umask(umask)
+    server.state = state
+    if args.group:
+        os.chown(args.socket, -1, gid)
+        os.chmod(args.socket, 0o660)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
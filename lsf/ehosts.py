@@ -5,18 +5,29 @@ import sys
 import re
 import argparse
 
+from utility import groupkeys, flattengroups
 from shortcuts import ehostsshortcuts
 
-from readhosts import readhosts
-from printhosts import printhosts
+from readhosts import readhosts, refreshhosts
+from printhosts import printhosts, indexjobs
 from grouphosts import grouphosts
-from sumhosts import sumhosts
+from sumhosts import sumhosts, sumhostgroups
 
-from readjobs import readjobs
+from readjobs import readjobs, refreshjobs
 
+from writerecords import writerecords, formats
 
-def ehosts(args, bhostsargs):
-    """Wrapper script with bhosts functionality."""
+from daemon import daemonjobs, daemonhosts
+from watch import watch
+from timings import enable, profiled
+
+
+def ehosts(args, bhostsargs, old=None):
+    """Wrapper script with bhosts functionality.
+
+    With old (as returned by the previous call), the lshosts information and
+    the unchanged jobs' information is reused.  Returns (hosts, jobs).
+    """
     # construct -R argument
     select = []
     for shortcutname, shortcutselect in ehostsshortcuts.items():
@@ -30,6 +41,7 @@ def ehosts(args, bhostsargs):
         else:
             select = "model==" + args.model
     if select:
+        bhostsargs = list(bhostsargs)
         if "-R" not in bhostsargs:
             bhostsargs += ["-R", "select[%s]" % select]
         else:
@@ -42,49 +54,113 @@ def ehosts(args, bhostsargs):
                 bhostsargs[i] = "(%s) & (%s)" % (req, select)
 
     # read
-    hosts = readhosts(bhostsargs, fast=args.fast)
+    hosts = daemonhosts(bhostsargs)
+    if hosts is None:
+        if old is not None and not args.fast:
+            hosts = refreshhosts(bhostsargs, old[0], maxage=args.max_age)
+        else:
+            hosts = readhosts(bhostsargs, fast=args.fast,
+                              maxage=args.max_age)
 
     if not hosts:
-        return
+        return hosts, []
+    groupby = groupkeys(args.groupby) if args.groupby else []
+    if not all(key in hosts[0] for key in groupby):
+        groupby = []
+
+    # records
+    if args.format:
+        if not args.nosort:
+            hosts.sort(key=lambda h: h["host_name"])
+        records = hosts
+        if args.sum:
+            if len(groupby) > 1:
+                # nested groups (titles as lists of their keys' values)
+                hostgroups = grouphosts(hosts, groupby)
+                records = []
+                for titles, sumhost in sumhostgroups(hostgroups, hosts):
+                    sumhost["title"] = list(titles)
+                    records.append(sumhost)
+            elif groupby:
+                hostgroups = grouphosts(hosts, args.groupby)
+                records = []
+                for title in sorted(hostgroups.keys()):
+                    sumhost = sumhosts(hostgroups[title])
+                    sumhost["title"] = title
+                    records.append(sumhost)
+            else:
+                records = [sumhosts(hosts)]
+        writerecords(records, args.format)
+        return hosts, []
 
     # read jobs
     if args.fast:
         jobs = []
     else:
         hostnames = [h["host_name"] for h in hosts]
-        jobs = readjobs(["-u", "all", "-r", "-m", " ".join(hostnames)])
+        jobsargs = ["-u", "all", "-r", "-m", " ".join(hostnames)]
+        jobs = daemonjobs(jobsargs)
+        if jobs is None:
+            if old is not None:
+                jobs = refreshjobs(jobsargs, old[1], maxage=args.max_age)
+            else:
+                jobs = readjobs(jobsargs, maxage=args.max_age)
+    jobsbyhost = indexjobs(jobs)
 
     # sort
     if not args.nosort:
         hosts.sort(key=lambda h: h["host_name"])
 
     # no grouping
-    if not args.groupby or args.groupby not in hosts[0]:
+    if not groupby:
         if args.sum:
             printhosts([sumhosts(hosts)], wide=args.wide, header=not
                        args.noheader)
         else:
-            printhosts(hosts, jobs, wide=args.wide, header=not args.noheader)
-        return
+            printhosts(hosts, wide=args.wide, header=not args.noheader,
+                       jobsbyhost=jobsbyhost)
+        return hosts, jobs
+
+    # nested grouping (with subtotals)
+    if len(groupby) > 1:
+        hostgroups = grouphosts(hosts, groupby)
+        if args.sum:
+            sumhostlist = []
+            for titles, sumhost in sumhostgroups(hostgroups, hosts):
+                sumhost["title"] = "  " * (len(titles) - 1) + str(titles[-1])
+                sumhostlist.append(sumhost)
+            printhosts(sumhostlist, wide=args.wide, header=not args.noheader,
+                       jobsbyhost=jobsbyhost)
+        else:
+            for titles, group in flattengroups(hostgroups, hosts):
+                if len(titles) == len(groupby):
+                    printhosts(group, wide=args.wide,
+                               header=not args.noheader,
+                               title=" / ".join(map(str, titles)),
+                               jobsbyhost=jobsbyhost)
+        return hosts, jobs
 
     # grouping
     hostgroups = grouphosts(hosts, args.groupby)
     if args.sum:
-        hosts = []
+        sumhostlist = []
         for title in sorted(hostgroups.keys()):
             hostgroup = hostgroups[title]
             sumhost = sumhosts(hostgroup)
             sumhost["title"] = title
-            hosts.append(sumhost)
-        printhosts(hosts, jobs, wide=args.wide, header=not args.noheader)
+            sumhostlist.append(sumhost)
+        printhosts(sumhostlist, wide=args.wide, header=not args.noheader,
+                   jobsbyhost=jobsbyhost)
     else:
 
         for title in sorted(hostgroups.keys()):
-            hosts = hostgroups[title]
-            printhosts(hosts, jobs, wide=args.wide, header=not args.noheader,
-                       title=title)
+            printhosts(hostgroups[title], wide=args.wide,
+                       header=not args.noheader, title=title,
+                       jobsbyhost=jobsbyhost)
+    return hosts, jobs
 
 
+@profiled
 def main():
     """Main program entry point."""
     # argument parser and options
@@ -101,9 +177,15 @@ def main():
         help="summarize across hosts",
         action="store_true"
     )
+    parser.add_argument(
+        "--format",
+        help="write records as %s" % "|".join(formats),
+        choices=formats,
+        metavar="FORMAT"
+    )
     parser.add_argument(
         "--groupby",
-        help="group jobs by KEY",
+        help="group jobs by KEY (nested for KEY,KEY...)",
         metavar="KEY"
     )
     parser.add_argument(
@@ -111,6 +193,18 @@ def main():
         help="read less info frim LSF",
         action="store_true"
     )
+    parser.add_argument(
+        "--max-age",
+        help="use LSF output cached up to SECONDS ago",
+        type=float,
+        metavar="SECONDS"
+    )
+    parser.add_argument(
+        "--watch",
+        help="redraw every SECONDS, highlighting changes",
+        type=float,
+        metavar="SECONDS"
+    )
     parser.add_argument(
         "--noheader",
         help="don't show the header",
@@ -121,6 +215,11 @@ def main():
         help="don't sort lexigraphically",
         action="store_true"
     )
+    parser.add_argument(
+        "--timings",
+        help="print where the time went on stderr",
+        action="store_true"
+    )
 
     # shortcuts
     shortcuts = parser.add_argument_group("shortcuts")
@@ -143,10 +242,15 @@ def main():
 
     # parse arguments
     args, bhostsargs = parser.parse_known_args()
+    if args.timings:
+        enable(printreport=True)
 
     # run ehosts
     try:
-        ehosts(args, bhostsargs)
+        if args.watch:
+            watch(lambda old: ehosts(args, bhostsargs, old), args.watch)
+        else:
+            ehosts(args, bhostsargs)
     except (KeyboardInterrupt, IOError):
         pass
 
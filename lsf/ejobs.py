@@ -3,21 +3,35 @@
 
 from __future__ import print_function
 
+import os
 import sys
 import re
 import argparse
+from itertools import chain
 
-from utility import color
+from utility import color, groupkeys, flattengroups
 from useraliases import lookupalias
 from shortcuts import ejobsshortcuts
 
-from readjobs import readjobs
-from printjobs import printjobs
+from readjobs import readjobs, iterjobs, refreshjobs
+from job import sortjobs, prefetch
+from printjobs import printjobs, longkeys, shortkeys, sumjobkeys
 from groupjobs import groupjobs
-from sumjobs import sumjobs
+from sumjobs import sumjobs, sumjobgroups
 
 from readhosts import readhosts
-from printhosts import printhosts
+from resreq import selecthosts
+from printhosts import printhosts, indexjobs
+
+from writerecords import writerecords, formats
+
+from daemon import daemonjobs, daemonhosts, filterjobs
+from readevents import readevents
+from watch import watch
+from timings import enable, profiled
+
+# minimum number of jobs for columnar processing
+tablesize = 1000
 
 # highlighting color for pending reasing
 pendingcolors = {
@@ -31,24 +45,61 @@ pendingcolors = {
     "Job('s)? requirements for reserving resource \(.*\) not satisfied": "r",
 }
 
-# order of status identifiers
-statorder = {
-    "RUN": 4,
-    "PROV": 4,
-    "PSUSP": 3,
-    "USUSP": 3,
-    "SSUSP": 3,
-    "PEND": 2,
-    "WAIT": 2,
-    "UNKWN": 1,
-    "DONE": 0,
-    "ZOMBI": 0,
-    "EXIT": 0,
-}
+
+def potentialhosts(resreq, hostreq, allhosts, maxage=None):
+    """Select the hosts for a resource requirement and requested hosts.
+
+    The selection is evaluated locally on allhosts if possible and by bhosts
+    otherwise.
+    """
+    try:
+        hosts = selecthosts(resreq, allhosts)
+        if hostreq:
+            hostsbyname = {host["host_name"]: host for host in hosts}
+            knownnames = set(host["host_name"] for host in allhosts)
+            if not knownnames.issuperset(hostreq):
+                raise ValueError("unknown hosts (e.g., host groups)")
+            hosts = [hostsbyname[name] for name in set(hostreq)
+                     if name in hostsbyname]
+        return hosts
+    except ValueError:
+        hostsargs = ["-R", resreq] + hostreq
+        hosts = daemonhosts(hostsargs)
+        if hosts is None:
+            hosts = readhosts(hostsargs, maxage=maxage)
+        return hosts
+
+
+def jobfields(args):
+    """Fields needed for the chosen view, sorting, and grouping (or None)."""
+    if args.long or (args.format and not args.output):
+        return None  # all fields
+    if args.output:
+        fields = list(args.output)
+    else:
+        fields = list(shortkeys) + list(sumjobkeys)
+    fields += ["submit_time", "priority", "run_time", "stat"]  # default order
+    if args.sort:
+        fields.append(args.sort)
+    if args.groupby:
+        fields += groupkeys(args.groupby)
+    return fields
+
+
+def knownjobs(args, bjobsargs):
+    """Jobs from lsb.events (--events) or the daemon (None if unsupported)."""
+    if args.events and not args.pending:  # lsb.events has no pending reasons
+        return filterjobs(readevents(args.events), bjobsargs,
+                          os.getenv("USER"))
+    return daemonjobs(bjobsargs)
 
 
-def ejobs(args, bjobsargs):
-    """Wrapper script with bjobs functionality."""
+def ejobs(args, bjobsargs, oldjobs=None):
+    """Wrapper script with bjobs functionality.
+
+    With oldjobs (as returned by the previous call), only the bjobs -o
+    listing is read again (see refreshjobs).  Returns the jobs read.
+    """
     # handle arguments
     if args.pending:
         bjobsargs = ["-p"] + bjobsargs
@@ -70,39 +121,167 @@ def ejobs(args, bjobsargs):
         args.output = sum([fields.split() for fields in args.output], [])
         if len(args.output) == 1:
             args.noheader = True
+    groupby = groupkeys(args.groupby) if args.groupby else []
+    fields = jobfields(args)
+
+    # records (written as they are read)
+    if args.format:
+        jobs = knownjobs(args, bjobsargs)
+        if jobs is None:
+            jobs = iterjobs(bjobsargs, fast=args.fast, maxage=args.max_age,
+                            fields=fields)
+        keys = args.output
+        if args.sort:
+            try:
+                jobs = sorted(jobs, key=lambda j: j[args.sort])
+            except KeyError:
+                print("Unknown sorting key \"%s\"!" % args.sort,
+                      file=sys.stderr)
+                sys.exit(1)
+        if args.sum:
+            jobs = list(jobs)
+            if not jobs:
+                return jobs
+            if len(groupby) > 1 and all(key in jobs[0] for key in groupby):
+                # nested groups (titles as lists of their keys' values)
+                sums = sumjobgroups(groupjobs(jobs, groupby), jobs, keys=keys)
+                jobs = []
+                for titles, sumjob in sums:
+                    sumjob["title"] = list(titles)
+                    jobs.append(sumjob)
+                if keys:
+                    keys = ["title"] + keys
+            elif args.groupby and args.groupby in jobs[0]:
+                jobgroups = groupjobs(jobs, args.groupby)
+                jobs = []
+                for title in sorted(jobgroups.keys()):
+                    sumjob = sumjobs(jobgroups[title], keys=keys)
+                    sumjob["title"] = title
+                    jobs.append(sumjob)
+                if keys:
+                    keys = ["title"] + keys
+            else:
+                jobs = [sumjobs(jobs, keys=keys)]
+        writerecords(jobs, args.format, keys=keys)
+        return None
+
+    # stream (print jobs as they are read)
+    if not args.groupby and not args.sort and (args.nosort or args.sum) and \
+            not args.watch:
+        jobs = knownjobs(args, bjobsargs)
+        if jobs is None:
+            jobs = iterjobs(bjobsargs, fast=args.fast, maxage=args.max_age,
+                            fields=fields)
+        jobs = iter(jobs)
+        try:
+            job = next(jobs)
+        except StopIteration:
+            return
+        jobs = chain([job], jobs)
+        if args.sum:
+            jobs = [sumjobs(jobs)]
+        printjobs(jobs, wide=args.wide, long=args.long, output=args.output,
+                  header=not args.noheader)
+        return
 
     # read
-    jobs = readjobs(bjobsargs, fast=args.fast)
+    jobs = knownjobs(args, bjobsargs)
+    if jobs is None:
+        if oldjobs is not None and not args.fast:
+            jobs = refreshjobs(bjobsargs, oldjobs, maxage=args.max_age,
+                               fields=fields)
+        else:
+            jobs = readjobs(bjobsargs, fast=args.fast, maxage=args.max_age,
+                            fields=fields)
+    alljobs = jobs
 
     if not jobs:
-        return
+        return alljobs
+
+    # load the lazy fields needed for sorting, grouping, and printing at once
+    if args.long:
+        keys = list(longkeys)
+    elif args.output:
+        keys = list(args.output)
+    else:
+        keys = list(shortkeys)
+    keys += [args.sort] + groupby
+    if args.pending:
+        keys += ["resreq", "host_req"]
+    prefetch(jobs, keys)
+
+    # columnar processing for many jobs (numpy is slow to import)
+    table = None
+    if len(jobs) >= tablesize and not args.pending:
+        from jobtable import maketable
+        table = maketable(jobs)
+    # keys needed for summarized jobs
+    if args.long:
+        sumkeys = None
+    elif args.output:
+        sumkeys = ["jobid"] + args.output
+    else:
+        sumkeys = sumjobkeys
 
     # sort
-    jobs.sort(key=lambda j: j["submit_time"])
-    jobs.sort(key=lambda j: j["priority"], reverse=True)  # can be None
-    jobs.sort(key=lambda j: -j["run_time"])
-    jobs.sort(key=lambda j: -statorder[j["stat"]])
-    if args.sort:
+    if table is not None:
         try:
-            jobs.sort(key=lambda j: j[args.sort])
-        except:
+            table = table.sorted(args.sort)
+        except KeyError:
             print("Unknown sorting key \"%s\"!" % args.sort, file=sys.stderr)
+            table = table.sorted()
+        jobs = table.jobs
+    else:
+        sortjobs(jobs)
+        if args.sort:
+            try:
+                jobs.sort(key=lambda j: j[args.sort])
+            except:
+                print("Unknown sorting key \"%s\"!" % args.sort,
+                      file=sys.stderr)
 
     # no grouping
-    if not args.groupby or args.groupby not in jobs[0]:
+    if not groupby or not all(key in jobs[0] for key in groupby):
         if args.sum:
-            jobs = [sumjobs(jobs)]
+            if table is not None:
+                jobs = [table.sumjobs(sumkeys)]
+            else:
+                jobs = [sumjobs(jobs)]
         printjobs(jobs, wide=args.wide, long=args.long, output=args.output,
                   header=not args.noheader)
-        return
+        return alljobs
+
+    # nested grouping (with subtotals)
+    if len(groupby) > 1:
+        jobgroups = groupjobs(jobs, groupby)
+        if args.sum:
+            sumjoblist = []
+            for titles, sumjob in sumjobgroups(jobgroups, jobs, sumkeys):
+                sumjob["title"] = "  " * (len(titles) - 1) + str(titles[-1])
+                sumjoblist.append(sumjob)
+            printjobs(sumjoblist, wide=args.wide, long=args.long,
+                      output=args.output, header=not args.noheader)
+        else:
+            for titles, group in flattengroups(jobgroups, jobs):
+                if len(titles) == len(groupby):
+                    printjobs(group, wide=args.wide, long=args.long,
+                              output=args.output, header=not args.noheader,
+                              title=" / ".join(map(str, titles)))
+        return alljobs
 
     # grouping
-    jobgroups = groupjobs(jobs, args.groupby)
+    if table is not None:
+        jobgroups = table.groupby(args.groupby)
+    else:
+        jobgroups = groupjobs(jobs, args.groupby)
     if not args.pending:
         if args.sum:
             jobs = []
             for title in sorted(jobgroups.keys()):
-                sumjob = sumjobs(jobgroups[title])
+                if table is not None:
+                    sumjob = jobgroups[title].sumjobs(sumkeys)
+                else:
+                    sumjob = sumjobs(jobgroups[title])
                 if args.groupby not in ("name", "jobname", "user"):
                     sumjob["title"] = title
                 jobs.append(sumjob)
@@ -110,12 +289,13 @@ def ejobs(args, bjobsargs):
                       header=not args.noheader)
         else:
             for title in sorted(jobgroups.keys()):
-                printjobs(jobgroups[title], wide=args.wide, long=args.long,
-                          output=args.output, header=not args.noheader,
-                          title=title)
-        return
+                printjobs(list(jobgroups[title]), wide=args.wide,
+                          long=args.long, output=args.output,
+                          header=not args.noheader, title=title)
+        return alljobs
 
     # pending
+    allhosts = None
     for title in sorted(jobgroups.keys()):
         jobs = jobgroups[title]
         reasons = jobs[0]["pend_reason"]
@@ -148,16 +328,27 @@ def ejobs(args, bjobsargs):
             if resreq and not args.fast:
                 resreq = re.sub(" && \(hostok\)", "", resreq)
                 resreq = re.sub(" && \(mem>\d+\)", "", resreq)
-                hosts = readhosts(["-R", resreq] + hostreq)
-                hostnames = [h["host_name"] for h in hosts]
-                jobs = readjobs(["-u", "all", "-r", "-m", " ".join(hostnames)])
+                if allhosts is None:
+                    # read all hosts and running jobs once for all groups
+                    allhosts = daemonhosts([])
+                    if allhosts is None:
+                        allhosts = readhosts([], maxage=args.max_age)
+                    runningjobs = knownjobs(args, ["-u", "all", "-r"])
+                    if runningjobs is None:
+                        runningjobs = readjobs(["-u", "all", "-r"],
+                                               maxage=args.max_age)
+                    jobsbyhost = indexjobs(runningjobs)
+                hosts = potentialhosts(resreq, hostreq, allhosts,
+                                       maxage=args.max_age)
                 hosts.sort(key=lambda h: h["host_name"])
-                printhosts(hosts, jobs, wide=args.wide,
-                           header=not args.noheader)
+                printhosts(hosts, wide=args.wide, header=not args.noheader,
+                           jobsbyhost=jobsbyhost)
                 if len(jobgroups) > 1:
                     print()
+    return alljobs
 
 
+@profiled
 def main():
     """Main program entry point."""
     # argument parser and options
@@ -181,6 +372,13 @@ def main():
         action="append",
         metavar="FIELD"
     )
+    parser.add_argument(
+        "--format",
+        help="write records as %s (of the -o FIELDs or all fields)" %
+        "|".join(formats),
+        choices=formats,
+        metavar="FORMAT"
+    )
     parser.add_argument(
         "--sum",
         help="summarize across jobs",
@@ -194,7 +392,7 @@ def main():
     )
     exg.add_argument(
         "--groupby",
-        help="group jobs by KEY",
+        help="group jobs by KEY (nested for KEY,KEY...)",
         metavar="KEY"
     )
     parser.add_argument(
@@ -204,16 +402,43 @@ def main():
         nargs="?",
         const="id"
     )
+    parser.add_argument(
+        "--nosort",
+        help="don't sort jobs (show them as they are read)",
+        action="store_true"
+    )
     parser.add_argument(
         "--fast",
         help="read less info from LSF",
         action="store_true"
     )
+    parser.add_argument(
+        "--max-age",
+        help="use LSF output cached up to SECONDS ago",
+        type=float,
+        metavar="SECONDS"
+    )
+    parser.add_argument(
+        "--events",
+        help="follow the jobs in LSF's event log FILE (no bjobs calls)",
+        metavar="FILE"
+    )
+    parser.add_argument(
+        "--watch",
+        help="redraw every SECONDS, highlighting changes",
+        type=float,
+        metavar="SECONDS"
+    )
     parser.add_argument(
         "--noheader",
         help="don't show the header",
         action="store_true"
     )
+    parser.add_argument(
+        "--timings",
+        help="print where the time went on stderr",
+        action="store_true"
+    )
 
     # shortcuts
     shortcuts = parser.add_argument_group("shortcuts")
@@ -255,10 +480,15 @@ def main():
 
     # parse arguments
     args, bjobsargs = parser.parse_known_args()
+    if args.timings:
+        enable(printreport=True)
 
     # run ejobs
     try:
-        ejobs(args, bjobsargs)
+        if args.watch:
+            watch(lambda oldjobs: ejobs(args, bjobsargs, oldjobs), args.watch)
+        else:
+            ejobs(args, bjobsargs)
     except (KeyboardInterrupt, IOError):
         pass
 
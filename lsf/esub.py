@@ -8,8 +8,9 @@ import os
 import shlex
 import argparse
 
-from submitjob import submitjob
+from submitjob import submitjob, submitjobs
 from utility import color
+from timings import enable, profiled
 
 
 def esub(args, bsubargs, jobscript):
@@ -44,24 +45,53 @@ def esub(args, bsubargs, jobscript):
     if last:
         data[last] = True
     try:
-        jobid = submitjob(data)
-        print(jobid)
+        if args.commands:
+            # one job per command (arrays where possible)
+            with open(args.commands) as f:
+                commands = [line.strip() for line in f]
+            datas = [dict(data, command=command) for command in commands
+                     if command and not command.startswith("#")]
+            failed = False
+            for jobid in submitjobs(datas):
+                if isinstance(jobid, EnvironmentError):
+                    print(color(jobid.strerror, "r"))
+                    failed = True
+                else:
+                    print(jobid)
+            if failed:
+                sys.exit(-1)
+        else:
+            jobid = submitjob(data)
+            print(jobid)
     except Exception as e:
         print(color(e.strerror, "r"))
         sys.exit(-1)
 
 
+@profiled
 def main():
     """Main program entry point."""
     parser = argparse.ArgumentParser(
         description="Wrapper for bsub."
     )
+    parser.add_argument(
+        "--commands",
+        help="submit each line of FILE as a job (as job arrays)",
+        metavar="FILE"
+    )
+    parser.add_argument(
+        "--timings",
+        help="print where the time went on stderr",
+        action="store_true"
+    )
     parser.add_argument_group("further arguments",
                               description="are passed to bsub")
 
     args, bsubargs = parser.parse_known_args()
+    if args.timings:
+        enable(printreport=True)
 
-    jobscript = sys.stdin.read()
+    jobscript = "" if args.commands else sys.stdin.read()
     try:
         esub(args, bsubargs, jobscript)
     except KeyboardInterrupt:
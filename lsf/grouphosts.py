@@ -1,15 +1,20 @@
 """Sort the jobs in groups by attributes."""
 
-from collections import defaultdict
+from utility import groupkeys, nestgroups
+from timings import timed
 
 
+def hosttitles(host, key):
+    """The groups of a host for a key."""
+    if isinstance(host[key], dict):
+        return list(host[key])
+    return [host[key]]
+
+
+@timed("grouphosts")
 def grouphosts(jobs, key):
-    """Sort the jobs in groups by attributes."""
-    result = defaultdict(list)
-    for job in jobs:
-        if isinstance(job[key], dict):
-            for val in job[key]:
-                result[val].append(job)
-        else:
-            result[job[key]].append(job)
-    return dict(result)
+    """Sort the jobs in groups by attributes.
+
+    With several keys (a list or comma-separated), the groups are nested.
+    """
+    return nestgroups(jobs, groupkeys(key), hosttitles)
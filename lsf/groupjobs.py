@@ -1,23 +1,27 @@
 """Sort the jobs in groups by attributes."""
 
-from collections import defaultdict
+from utility import groupkeys, nestgroups
+from timings import timed
 
 
+def jobtitles(job, key):
+    """The groups of a job for a key."""
+    if key == "pend_reason":
+        if len(job[key]) == 1:
+            return [repr(job[key])]
+        group = job["resreq"]
+        group += repr(sorted(job[key]))
+        group += repr(sorted(job["host_req"]))
+        return [group]
+    if isinstance(job[key], dict):
+        return list(job[key])
+    return [job[key]]
+
+
+@timed("groupjobs")
 def groupjobs(jobs, key):
-    """Sort the jobs in groups by attributes."""
-    result = defaultdict(list)
-    for job in jobs:
-        if key == "pend_reason":
-            if len(job[key]) == 1:
-                group = repr(job[key])
-            else:
-                group = job["resreq"]
-                group += repr(sorted(job[key]))
-                group += repr(sorted(job["host_req"]))
-            result[group].append(job)
-        elif isinstance(job[key], dict):
-            for val in job[key]:
-                result[val].append(job)
-        else:
-            result[job[key]].append(job)
-    return dict(result)
+    """Sort the jobs in groups by attributes.
+
+    With several keys (a list or comma-separated), the groups are nested.
+    """
+    return nestgroups(jobs, groupkeys(key), jobtitles)
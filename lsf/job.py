@@ -0,0 +1,210 @@
+"""Compact job record."""
+
+from timings import timed
+
+# fields read from bjobs -o
+keys = ("jobid", "stat", "user", "user_group", "queue", "job_name",
+        "job_description", "proj_name", "application", "service_class",
+        "job_group", "job_priority", "dependency", "command",
+        "pre_exec_command", "post_exec_command",
+        "resize_notification_command", "pids", "exit_code", "exit_reason",
+        "from_host", "first_host", "exec_host", "nexec_host", "alloc_slot",
+        "nalloc_slot", "host_file", "submit_time", "start_time",
+        "estimated_start_time", "specified_start_time",
+        "specified_terminate_time", "time_left", "finish_time",
+        "%complete", "warning_action", "action_warning_time", "pend_time",
+        "cpu_used", "run_time", "idle_factor", "exception_status", "slots",
+        "mem", "max_mem", "avg_mem", "memlimit", "swap", "swaplimit",
+        "min_req_proc", "max_req_proc", "effective_resreq", "network_req",
+        "filelimit", "corelimit", "stacklimit", "processlimit",
+        "input_file", "output_file", "error_file", "output_dir", "sub_cwd",
+        "exec_home", "exec_cwd", "forward_cluster", "forward_time")
+
+# fields read from bjobs -p and -UF or derived
+extrakeys = ("pend_reason", "host_req", "runlimit", "mail", "exclusive",
+             "resreq", "combined_resreq", "notify_begin", "notify_end",
+             "interactive", "X11")
+
+fields = keys + extrakeys
+
+aliases = (
+    ("id", "jobid"),
+    ("ugroup", "user_group"),
+    ("name", "job_name"),
+    ("description", "job_description"),
+    ("proj", "proj_name"),
+    ("project", "proj_name"),
+    ("app", "application"),
+    ("sla", "service_class"),
+    ("group", "job_group"),
+    ("priority", "job_priority"),
+    ("cmd", "command"),
+    ("pre_cmd", "pre_exec_command"),
+    ("post_cmd", "post_exec_command"),
+    ("resize_cmd", "resize_notification_command"),
+    ("estart_time", "estimated_start_time"),
+    ("sstart_time", "specified_start_time"),
+    ("sterminate_time", "specified_terminate_time"),
+    ("warn_act", "warning_action"),
+    ("warn_time", "action_warning_time"),
+    ("except_stat", "exception_status"),
+    ("eresreq", "effective_resreq"),
+    ("fwd_cluster", "forward_cluster"),
+    ("fwd_time", "forward_time")
+)
+
+# fields read on demand from bjobs -W, -p, and -UF (field: phase)
+lazyfields = {
+    "submit_time": "W",
+    "start_time": "W",
+    "finish_time": "W",
+    "pend_reason": "p",
+    "host_req": "UF",
+    "runlimit": "UF",
+    "mail": "UF",
+    "exclusive": "UF",
+    "resreq": "UF",
+    "combined_resreq": "UF",
+    "notify_begin": "UF",
+    "notify_end": "UF",
+    "interactive": "UF",
+    "X11": "UF",
+}
+
+# order of status identifiers
+statorder = {
+    "RUN": 4,
+    "PROV": 4,
+    "PSUSP": 3,
+    "USUSP": 3,
+    "SSUSP": 3,
+    "PEND": 2,
+    "WAIT": 2,
+    "UNKWN": 1,
+    "DONE": 0,
+    "ZOMBI": 0,
+    "EXIT": 0,
+}
+
+# attribute names for fields and aliases ("%complete" is not an identifier)
+attrnames = {key: key.replace("%", "p") for key in fields}
+attrnames.update({alias: attrnames[key] for alias, key in aliases})
+aliasnames = frozenset(alias for alias, key in aliases)
+# bjobs -W only refines the time stamps from bjobs -o: it's not loaded when
+# they are accessed (e.g., for sorting) but only when prefetched for a view
+lazyattrs = {attrnames[key]: phase for key, phase in lazyfields.iteritems()
+             if phase != "W"}
+
+
+class Job(object):
+    """A job with dict-like access to its fields and their aliases.
+
+    If the job has a loader, accessing a lazy field first loads the field's
+    phase for all jobs that share the loader.
+    """
+
+    __slots__ = tuple(attrnames[key] for key in fields) + ("loader",)
+
+    def __init__(self, data=None):
+        """Initialize all fields to None and set the given ones."""
+        for attr in Job.__slots__:
+            setattr(self, attr, None)
+        if data:
+            self.update(data)
+
+    def __getitem__(self, key):
+        """Get a field or alias."""
+        try:
+            attr = attrnames[key]
+        except KeyError:
+            raise KeyError(key)
+        if self.loader is not None and attr in lazyattrs:
+            self.loader.load(lazyattrs[attr])
+        return getattr(self, attr)
+
+    def __setitem__(self, key, val):
+        """Set a field."""
+        if key not in attrnames or key in aliasnames:
+            raise KeyError(key)
+        setattr(self, attrnames[key], val)
+
+    def __contains__(self, key):
+        """Check whether a field or alias exists."""
+        return key in attrnames
+
+    def __iter__(self):
+        """Iterate over fields and aliases."""
+        return iter(self.keys())
+
+    def __len__(self):
+        """Number of fields and aliases."""
+        return len(attrnames)
+
+    def __repr__(self):
+        """Represent the job by its id."""
+        return "<Job %s>" % self.jobid
+
+    def keys(self):
+        """List all fields and aliases."""
+        return list(fields) + [alias for alias, key in aliases]
+
+    def iteritems(self):
+        """Iterate over (key, value) for fields and aliases."""
+        for key in self:
+            yield key, self[key]
+
+    def items(self):
+        """List (key, value) for fields and aliases."""
+        return list(self.iteritems())
+
+    def get(self, key, default=None):
+        """Get a field or alias with default."""
+        if key in attrnames:
+            return self[key]
+        return default
+
+    def update(self, data):
+        """Set several fields."""
+        for key, val in data.iteritems():
+            self[key] = val
+
+    def todict(self):
+        """Convert to a dict of fields (without aliases)."""
+        prefetch([self], fields)
+        return {key: self[key] for key in fields}
+
+
+# aliases are read-only properties
+for alias, key in aliases:
+    setattr(Job, alias, property(lambda self, attr=attrnames[key]:
+                                 getattr(self, attr)))
+
+
+@timed("prefetch")
+def prefetch(jobs, keys):
+    """Load the lazy fields among keys for the jobs (phases concurrently)."""
+    phases = set(lazyfields[key] for key in keys if key in lazyfields)
+    if not phases:
+        return
+    loaders = set(getattr(job, "loader", None) for job in jobs)
+    loaders.discard(None)
+    for loader in loaders:
+        loader.load(*phases)
+
+
+def sortjobs(jobs):
+    """Sort jobs like ejobs: by status, run time, priority, and submit time."""
+    jobs.sort(key=lambda j: j["submit_time"])
+    jobs.sort(key=lambda j: j["priority"], reverse=True)  # can be None
+    jobs.sort(key=lambda j: -j["run_time"])
+    jobs.sort(key=lambda j: -statorder[j["stat"]])
+
+
+def iterprefetch(jobs, keys):
+    """Yield jobs, loading the lazy fields among keys for each new loader."""
+    loader = None
+    for job in jobs:
+        if getattr(job, "loader", None) is not loader:
+            loader = getattr(job, "loader", None)
+            prefetch([job], keys)
+        yield job
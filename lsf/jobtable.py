@@ -0,0 +1,170 @@
+"""Columnar job table for sorting, grouping, and summing many jobs."""
+
+from __future__ import division
+
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from job import attrnames, aliases, statorder
+from groupjobs import groupjobs
+from sumjobs import sumjobs, sumkeys, meankeys
+
+# numeric columns
+numkeys = frozenset(sumkeys + meankeys + (
+    "submit_time", "start_time", "finish_time", "estimated_start_time",
+    "specified_start_time", "specified_terminate_time", "pend_time",
+    "exit_code", "nalloc_slot"))
+
+# categorical columns
+catkeys = frozenset(("stat", "user", "user_group", "queue", "proj_name",
+                     "application", "service_class", "job_group",
+                     "from_host", "first_host", "exclusive", "interactive"))
+
+fieldnames = dict(aliases)
+
+
+class JobTable(object):
+    """Jobs with numeric and categorical fields stored as NumPy arrays.
+
+    Columns are created on first use.  Numeric columns are float arrays with
+    NaN for None; categorical columns are integer codes into a sorted list of
+    labels (None first).  Tables created by take(), sorted(), and groupby()
+    share their parent's columns.
+    """
+
+    def __init__(self, jobs, parent=None, indices=None):
+        """Create a table for a list of jobs."""
+        self.jobs = jobs
+        self.parent = parent
+        self.indices = indices
+        self.numcols = {}
+        self.catcols = {}
+
+    def __len__(self):
+        """Number of jobs."""
+        return len(self.jobs)
+
+    def __iter__(self):
+        """Iterate over the jobs."""
+        return iter(self.jobs)
+
+    def numcol(self, key):
+        """Numeric column: (values, whether all values are ints)."""
+        key = fieldnames.get(key, key)
+        if key not in self.numcols:
+            if self.parent is not None:
+                values, isint = self.parent.numcol(key)
+                self.numcols[key] = values[self.indices], isint
+            else:
+                values = [job[key] for job in self.jobs]
+                isint = all(isinstance(v, (int, long)) for v in values
+                            if v is not None)
+                values = np.array([np.nan if v is None else v
+                                   for v in values], dtype=float)
+                self.numcols[key] = values, isint
+        return self.numcols[key]
+
+    def catcol(self, key):
+        """Categorical column: (codes, labels)."""
+        key = fieldnames.get(key, key)
+        if key not in self.catcols:
+            if self.parent is not None:
+                codes, labels = self.parent.catcol(key)
+                self.catcols[key] = codes[self.indices], labels
+            else:
+                values = [job[key] for job in self.jobs]
+                labels = sorted(set(values))  # None sorts first
+                codeof = {label: i for i, label in enumerate(labels)}
+                codes = np.array([codeof[v] for v in values], dtype=int)
+                self.catcols[key] = codes, labels
+        return self.catcols[key]
+
+    def sortkey(self, key):
+        """Array that sorts like the key's values (None first)."""
+        if fieldnames.get(key, key) in numkeys:
+            values = self.numcol(key)[0].copy()
+            values[np.isnan(values)] = -np.inf
+            return values
+        return self.catcol(key)[0]
+
+    def take(self, indices):
+        """Table of the jobs at the given indices."""
+        return JobTable([self.jobs[i] for i in indices], self, indices)
+
+    def sorted(self, key=None):
+        """Table sorted like sortjobs (and then by key)."""
+        stat, labels = self.catcol("stat")
+        statrank = np.array([statorder[label] for label in labels])[stat]
+        runtime = self.sortkey("run_time")
+        priority = self.sortkey("job_priority")  # None after the rest
+        submit = self.sortkey("submit_time")
+        order = np.lexsort((submit, -priority, -runtime, -statrank))
+        if key is not None:
+            if key not in attrnames:
+                raise KeyError(key)
+            if fieldnames.get(key, key) in numkeys | catkeys:
+                values = self.sortkey(key)[order]
+                order = order[np.argsort(values, kind="mergesort")]
+            else:
+                order = sorted(order, key=lambda i: self.jobs[i][key])
+        return self.take(order)
+
+    def groupby(self, key):
+        """Group the jobs by the value of key into tables."""
+        if fieldnames.get(key, key) in catkeys:
+            codes, labels = self.catcol(key)
+            order = np.argsort(codes, kind="mergesort")
+            bounds = np.cumsum(np.bincount(codes, minlength=len(labels)))
+            groups = np.split(order, bounds[:-1])
+            return {label: self.take(group)
+                    for label, group in zip(labels, groups) if len(group)}
+        # e.g., dict-valued keys with jobs in several groups
+        index = {id(job): i for i, job in enumerate(self.jobs)}
+        return {title: self.take([index[id(job)] for job in jobs])
+                for title, jobs in groupjobs(self.jobs, key).iteritems()}
+
+    def sumjobs(self, keys=None):
+        """Summarize the jobs like sumjobs (optionally only the given keys).
+
+        Numeric and categorical fields are reduced in NumPy, all others in
+        Python.
+        """
+        if keys is None:
+            keys = list(self.jobs[0])
+        sumjob = {}
+        otherkeys = []
+        for key in keys:
+            field = fieldnames.get(key, key)
+            if field in sumkeys:
+                values, isint = self.numcol(field)
+                total = np.nansum(values)
+                sumjob[key] = int(total) if isint else float(total)
+            elif field in meankeys:
+                values = self.numcol(field)[0]
+                values = values[~np.isnan(values) & (values != 0)]
+                sumjob[key] = float(values.mean()) if len(values) else None
+            elif field in catkeys:
+                codes, labels = self.catcol(field)
+                counts = np.bincount(codes, minlength=len(labels))
+                sumjob[key] = defaultdict(int)
+                for label, count in zip(labels, counts):
+                    if count:
+                        sumjob[key][label] = int(count)
+                if key != "stat" and len(sumjob[key]) == 1:
+                    sumjob[key] = sumjob[key].keys()[0]
+            else:
+                otherkeys.append(key)
+        if otherkeys:
+            sumjob.update(sumjobs(self.jobs, keys=otherkeys))
+        return sumjob
+
+
+def maketable(jobs):
+    """Create a JobTable if NumPy is available (otherwise None)."""
+    if np is None:
+        return None
+    return JobTable(jobs)
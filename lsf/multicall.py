@@ -0,0 +1,45 @@
+"""Single entry point for ejobs, ehosts, esub, and elsfd.
+
+Only the module of the chosen subcommand is imported.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+from importlib import import_module
+
+# module of each subcommand
+commands = {
+    "jobs": "ejobs",
+    "hosts": "ehosts",
+    "sub": "esub",
+    "daemon": "daemon",
+}
+
+# subcommand of each script name (for links to python-lsf)
+scriptnames = {
+    "ejobs": "jobs",
+    "ehosts": "hosts",
+    "esub": "sub",
+    "elsfd": "daemon",
+}
+
+usage = "usage: python-lsf {%s} [arguments]" % ",".join(sorted(commands))
+
+
+def main():
+    """Main program entry point."""
+    name = os.path.basename(sys.argv[0])
+    if name in scriptnames:
+        command = scriptnames[name]
+    elif len(sys.argv) > 1 and sys.argv[1] in commands:
+        command = sys.argv.pop(1)
+        sys.argv[0] = "%s %s" % (name, command)
+    else:
+        print(usage, file=sys.stderr)
+        if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+            sys.exit(0)
+        sys.exit(2)
+    module = import_module("lsf." + commands[command])
+    module.main()
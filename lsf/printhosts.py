@@ -6,23 +6,44 @@ import os
 import sys
 import re
 from time import time
-from subprocess import check_output
 from collections import defaultdict
 
 from utility import color, fractioncolor, format_duration, format_mem
+from utility import terminalwidth
 from groupjobs import groupjobs
 from sumjobs import sumjobs
-from useraliases import getuseralias
+from useraliases import getuseralias, resolveusers
+from timings import timed
 
 
-def printhosts(hosts, jobs=[], wide=False, header=True, file=sys.stdout):
-    """Print a list of hosts."""
+def indexjobs(jobs):
+    """Index jobs by host: {host_name: [(job, slots on the host), ...]}."""
+    jobsbyhost = defaultdict(list)
+    for job in jobs:
+        if job["exec_host"]:
+            for hostname, nslots in job["exec_host"].iteritems():
+                jobsbyhost[hostname].append((job, nslots))
+    return jobsbyhost
+
+
+@timed("printhosts")
+def printhosts(hosts, jobs=[], wide=False, header=True, file=None,
+               title=None, jobsbyhost=None):
+    """Print a list of hosts.
+
+    The jobs can also be passed indexed by indexjobs() as jobsbyhost.
+    """
+    if file is None:
+        file = sys.stdout
     if len(hosts) == 0:
         return
     sumhosts = not isinstance(hosts[0]["status"], str)
-    jobsbyhost = groupjobs(jobs, "exec_host")
+    if jobsbyhost is None:
+        jobsbyhost = indexjobs(jobs)
+    resolveusers(job["user"] for host in hosts
+                 for job, nslots in jobsbyhost.get(host["host_name"], ()))
     # begin output
-    screencols = int(check_output(["tput", "cols"]))
+    screencols = terminalwidth()
     whoami = os.getenv("USER")
     namelen = max(map(len, (host["host_name"] for host in hosts)))
     lens = {
@@ -47,6 +68,8 @@ def printhosts(hosts, jobs=[], wide=False, header=True, file=sys.stdout):
         if wide:
             h += "  " + "model".ljust(lens["model"])
         h = h.upper()
+        if title:
+            h += "  " + color(title, "b")
         print(h, file=file)
     for host in hosts:
         l = ""
@@ -94,8 +117,11 @@ def printhosts(hosts, jobs=[], wide=False, header=True, file=sys.stdout):
                 total += used
             if "maxmem" in host and host["maxmem"]:
                 total = host["maxmem"]
-            c = fractioncolor(free, total)
-            l += "  " + format_mem(free, c) + "/" + format_mem(total)
+            if free is None:  # no load information (e.g., unavail)
+                l += "  " + "-".rjust(9) + "/" + format_mem(total or 0)
+            else:
+                c = fractioncolor(free, total)
+                l += "  " + format_mem(free, c) + "/" + format_mem(total)
         if wide:
             if sumhosts:
                 if len(host["model"]) == 1:
@@ -126,30 +152,35 @@ def printhosts(hosts, jobs=[], wide=False, header=True, file=sys.stdout):
             hostnames = host["host_names"]
         else:
             hostnames = [host["host_name"]]
+        # jobs on the hosts (each once) with their slots on the hosts
         jobs = []
+        slots = {}
         for hostname in hostnames:
-            if hostname in jobsbyhost:
-                for job in jobsbyhost[hostname]:
-                    if job not in jobs:
-                        jobs.append(job)
+            for job, nslots in jobsbyhost.get(hostname, ()):
+                jobid = job["jobid"]
+                if jobid not in slots:
+                    jobs.append(job)
+                    slots[jobid] = 0
+                slots[jobid] += nslots
+        jobs = [(job, slots[job["jobid"]]) for job in jobs]
         if sumhosts:
-            jobgroups = groupjobs(jobs, "user")
+            jobgroups = groupjobs([job for job, nslots in jobs], "user")
             jobs = []
             for user in sorted(jobgroups.keys()):
-                jobs.append(sumjobs(jobgroups[user]))
+                sumjob = sumjobs(jobgroups[user], keys=("exclusive",))
+                sumjob["user"] = user
+                nslots = sum(slots[job["jobid"]] for job in jobgroups[user])
+                jobs.append((sumjob, nslots))
         if jobs:
-            for job in jobs:
+            for job, nslots in jobs:
                 exclusive = job["exclusive"]
                 if sumhosts:
-                    exclusive = len(exclusive) == 1 and True in exclusive
+                    # exclusive if all jobs are
+                    exclusive = exclusive is True
                 times = color("x", "r") if exclusive else "*"
-                nslots = sum(job["exec_host"][hn] for hn in hostnames
-                             if hn in job["exec_host"])
                 c = "r" if nslots >= 100 else "y" if nslots >= 20 else 0
                 l += color(" %3d" % nslots, c)
                 user = job["user"]
-                if sumhosts:
-                    user = user.keys()[0]
                 c = "g" if user == whoami else 0
                 l += times + color(getuseralias(user).ljust(8), c)
                 if wide and not sumhosts:
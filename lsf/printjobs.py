@@ -7,16 +7,17 @@ import sys
 import re
 from time import time
 from subprocess import check_output
+from itertools import chain
 from collections import defaultdict
 
 from utility import color, fractioncolor, findstringpattern
 from utility import format_duration, format_mem, format_time
-from useraliases import getuseralias
+from useraliases import getuseralias, resolveusers
+from job import prefetch, iterprefetch
+from timings import timed
 
-
-def printjoblong(job, sumjob=False, file=sys.stdout):
-    """Print a job in long format."""
-    keys = ("jobid", "stat", "user", "user_group", "queue", "job_name",
+# fields shown in long format
+longkeys = ("jobid", "stat", "user", "user_group", "queue", "job_name",
             "job_description", "interactive", "X11", "proj_name",
             "application", "service_class", "job_group", "job_priority",
             "dependency", "notify_begin", "notify_end", "command",
@@ -35,7 +36,26 @@ def printjoblong(job, sumjob=False, file=sys.stdout):
             "processlimit", "input_file", "output_file", "error_file",
             "output_dir", "sub_cwd", "exec_home", "exec_cwd",
             "forward_cluster", "forward_time")
-    for key in keys:
+
+# fields shown in the default format
+shortkeys = ("jobid", "job_name", "stat", "pend_reason", "interactive", "X11",
+             "user", "queue", "project", "priority", "run_time", "submit_time",
+             "%complete", "memlimit", "mem", "slots", "runlimit",
+             "min_req_proc", "exec_host", "exclusive", "host_req", "resreq",
+             "alloc_slot", "dependency")
+
+# keys shown for summarized jobs (except in long format)
+sumjobkeys = ("jobid", "job_name", "stat", "user", "queue", "project",
+              "run_time", "%complete", "memlimit", "mem", "slots", "runlimit",
+              "min_req_proc", "exec_host", "exclusive", "alloc_slot",
+              "pend_reason", "dependency")
+
+
+def printjoblong(job, sumjob=False, file=None):
+    """Print a job in long format."""
+    if file is None:
+        file = sys.stdout
+    for key in longkeys:
         if not job[key]:
             continue
         if sumjob and isinstance(job[key], dict):
@@ -86,12 +106,33 @@ def printjoblong(job, sumjob=False, file=sys.stdout):
                 print(job[key], file=file)
 
 
+@timed("printjobs")
 def printjobs(jobs, wide=False, long=False, output=None, title=None,
-              header=True, file=sys.stdout):
+              header=True, file=None):
     """Print a list of jobs."""
-    if len(jobs) == 0:
+    if file is None:
+        file = sys.stdout
+    stream = not isinstance(jobs, list)
+    if long:
+        keys = longkeys
+    elif output:
+        keys = output
+    else:
+        keys = shortkeys
+    if stream:
+        # print jobs as they arrive (column widths can't depend on all jobs)
+        jobs = iterprefetch(jobs, keys)
+        try:
+            firstjob = next(jobs)
+        except StopIteration:
+            return
+        jobs = chain([firstjob], jobs)
+    elif len(jobs) == 0:
         return
-    sumjob = not isinstance(jobs[0]["jobid"], str)
+    else:
+        firstjob = jobs[0]
+        prefetch(jobs, keys)
+    sumjob = not isinstance(firstjob["jobid"], str)
     if long:
         for job in jobs:
             printjoblong(job, sumjob=sumjob, file=file)
@@ -104,10 +145,14 @@ def printjobs(jobs, wide=False, long=False, output=None, title=None,
         return
     # begin output
     whoami = os.getenv("USER")
-    namelen = max(map(len, (job["job_name"] for job in jobs)))
+    if stream:
+        namelen = 19
+    else:
+        namelen = max(map(len, (job["job_name"] for job in jobs)))
+        resolveusers(job["user"] for job in jobs)
     if sumjob:
         titlelen = 0
-        if "title" in jobs[0]:
+        if "title" in firstjob and not stream:
             titlelen = max(map(len, (job["title"] for job in jobs)))
     lens = {
         "title": 10,
@@ -120,9 +165,11 @@ def printjobs(jobs, wide=False, long=False, output=None, title=None,
     }
     if sumjob:
         lens["stat"] = 12
-    else:
-        if any(job["jobid"][-1] == "]" for job in jobs):
+    elif stream:
+        if firstjob["jobid"][-1] == "]":
             lens["jobid"] = 14
+    elif any(job["jobid"][-1] == "]" for job in jobs):
+        lens["jobid"] = 14
     if wide:
         if sumjob:
             lens["title"] = max(6, titlelen + 1)
@@ -133,7 +180,7 @@ def printjobs(jobs, wide=False, long=False, output=None, title=None,
     # header
     if header:
         h = ""
-        if sumjob and "title" in jobs[0]:
+        if sumjob and "title" in firstjob:
             h += "group".ljust(lens["title"])
         if not sumjob:
             h += "jobid".ljust(lens["jobid"])
@@ -0,0 +1,233 @@
+"""Read finished jobs from LSF's accounting files (lsb.acct).
+
+The files are memory-mapped and read in large chunks, and only JOB_FINISH
+records are parsed.  Since records are appended as jobs finish, their event
+times increase, so that the first record of a time range is found by a
+binary search rather than by parsing all records before it.
+"""
+
+from __future__ import division
+
+import os
+import mmap
+from glob import glob
+from itertools import izip
+
+from job import Job
+
+# job status (jStatus) of JOB_FINISH records
+jobstatus = {32: "EXIT", 64: "DONE"}
+
+# submission option (SUB_EXCLUSIVE) for exclusive jobs
+subexclusive = 0x40
+
+recordprefix = '"JOB_FINISH"'
+
+# bytes read at once
+chunksize = 1 << 24
+
+# bytes below which the binary search for a time switches to scanning
+scansize = 1 << 16
+
+# number of rusage values (ru_utime, ru_stime, ..., ru_exutime)
+nrusage = 19
+
+
+def logfiles(path):
+    """A log file and its rotated versions (path.N), oldest first."""
+    rotated = [name for name in glob(path + ".*")
+               if name[len(path) + 1:].isdigit()]
+    rotated.sort(key=lambda name: -int(name[len(path) + 1:]))
+    if os.path.exists(path):
+        rotated.append(path)
+    return rotated
+
+
+def eventtime(data, pos):
+    """Event time of the record at pos (None if it can't be parsed)."""
+    try:
+        return int(data[pos:pos + 64].split(" ", 3)[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def seektime(data, start):
+    """Offset of a record before the first one at or after start."""
+    lo, hi = 0, len(data)
+    while hi - lo > scansize:
+        mid = (lo + hi) // 2
+        pos = data.find("\n", mid, hi) + 1
+        if not pos or pos == hi:
+            # no record starts after mid
+            hi = mid
+            continue
+        t = eventtime(data, pos)
+        if t is not None and t >= start:
+            hi = mid
+        else:
+            lo = pos
+    return lo
+
+
+def iterlines(data, pos=0):
+    """Yield the lines from pos on (read in chunks)."""
+    size = len(data)
+    while pos < size:
+        stop = data.rfind("\n", pos, pos + chunksize) + 1
+        if stop <= pos:
+            stop = data.find("\n", pos + chunksize) + 1 or size
+        for line in data[pos:stop].splitlines():
+            yield line
+        pos = stop
+
+
+def iterrecords(data, start=None, end=None):
+    """Yield the JOB_FINISH records with event times between start and end."""
+    pos = 0 if start is None else seektime(data, start)
+    for line in iterlines(data, pos):
+        if not line.startswith(recordprefix):
+            continue
+        if start is not None or end is not None:
+            t = eventtime(line, 0)
+            if t is None:
+                continue
+            if start is not None and t < start:
+                continue
+            if end is not None and t > end:
+                return
+            start = None  # the remaining records are in range
+        yield line
+
+
+def parsevalues(line):
+    """Split a record into its values.
+
+    Values are numbers or quoted strings (with "" for ").  Splitting at the
+    quotes alternates between numbers (outside) and strings (inside).
+    """
+    parts = line.split('"')
+    values = []
+    for outside, inside in izip(parts[::2], parts[1::2]):
+        if outside == " ":
+            values.append(inside)
+        elif outside or not values:
+            values += outside.split()
+            values.append(inside)
+        else:
+            # "" within a string
+            values[-1] += '"' + inside
+    values += parts[-1].split()
+    return values
+
+
+def exitcode(status):
+    """Exit code of a job from its wait status (like bjobs)."""
+    if status & 0x7f:
+        # terminated by a signal
+        return 128 + (status & 0x7f)
+    return status >> 8
+
+
+def parseacct(line):
+    """Parse a JOB_FINISH record to a Job."""
+    return acctjob(parsevalues(line))
+
+
+def acctjob(v):
+    """Job of the values of a JOB_FINISH record (in LSF 9.1's layout)."""
+    job = Job()
+    jobid, options, nproc = int(v[3]), int(v[5]), int(v[6])
+    submit, term, start = int(v[7]), int(v[9]), int(v[10])
+    n = 22
+    nasked = int(v[n])
+    asked = v[n + 1:n + 1 + nasked]
+    n += 1 + nasked
+    nexec = int(v[n])
+    execs = v[n + 1:n + 1 + nexec]
+    n += 1 + nexec
+    status = int(v[n])
+    job.job_name = v[n + 2] or None
+    job.command = v[n + 3] or None
+    utime, stime = float(v[n + 4]), float(v[n + 5])
+    n += 4 + nrusage
+    job.mail = v[n] or None
+    job.proj_name = intern(v[n + 1]) if v[n + 1] else None
+    exitstatus = int(v[n + 2])
+    job.max_req_proc = int(v[n + 3])
+    idx = int(v[n + 6])
+    maxmem = int(v[n + 7])
+    job.service_class = intern(v[n + 12]) if v[n + 12] else None
+    job.application = intern(v[n + 20]) if v[n + 20] else None
+    job.post_exec_command = v[n + 21] or None
+    job.job_group = intern(v[n + 23]) if v[n + 23] else None
+    job.job_description = v[n + 28] or None
+    n += 29
+    # values added in later LSF versions
+    if len(v) > n:
+        n += 1 + 2 * int(v[n])  # submitEXT
+    if len(v) > n:
+        n += 1 + 5 * int(v[n])  # hostRusage
+    if len(v) > n + 3:
+        runlimit = int(v[n + 1])
+        if runlimit > 0:
+            job.runlimit = runlimit
+        avgmem = int(v[n + 2])
+        if avgmem >= 0:
+            job.avg_mem = avgmem * 1024
+        job.effective_resreq = v[n + 3] or None
+    job.jobid = "%d[%d]" % (jobid, idx) if idx else str(jobid)
+    job.stat = jobstatus.get(status, "EXIT")
+    job.user = intern(v[11])
+    job.queue = intern(v[12])
+    job.resreq = v[13] or None
+    job.dependency = v[14] or None
+    job.pre_exec_command = v[15] or None
+    job.from_host = intern(v[16])
+    job.sub_cwd = intern(v[17]) if v[17] else None
+    job.input_file = v[18] or None
+    job.output_file = v[19] or None
+    job.error_file = v[20] or None
+    job.submit_time = float(submit)
+    if start:
+        job.start_time = float(start)
+        job.run_time = float(max(0, term - start))
+    else:
+        job.run_time = 0.
+    job.finish_time = float(term or v[2])
+    if utime >= 0 and stime >= 0:
+        job.cpu_used = utime + stime
+    job.exit_code = exitcode(exitstatus)
+    if execs:
+        # execution hosts are listed once per slot
+        job.exec_host = {intern(host): execs.count(host)
+                         for host in set(execs)}
+        job.nexec_host = len(job.exec_host)
+        job.first_host = intern(execs[0])
+    job.slots = job.min_req_proc = nproc
+    if maxmem >= 0:
+        job.max_mem = maxmem * 1024
+    job.exclusive = bool(options & subexclusive)
+    job.host_req = asked
+    job.pend_reason = []
+    return job
+
+
+def readacct(path, start=None, end=None):
+    """Yield the jobs from an accounting file and its rotated versions.
+
+    With start and/or end (seconds since the epoch), only jobs whose records
+    were logged in that time range are read.
+    """
+    for filename in logfiles(path):
+        with open(filename, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                continue
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if end is not None and eventtime(data, 0) > end:
+                    # later files are newer
+                    return
+                for line in iterrecords(data, start, end):
+                    yield parseacct(line)
+            finally:
+                data.close()
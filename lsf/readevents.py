@@ -0,0 +1,320 @@
+"""Track jobs by following LSF's event log (lsb.events).
+
+mbatchd logs every change of a job as an event.  Applying the events as
+they are appended keeps a table of jobs up to date without calling bjobs.
+When the log is switched (lsb.events is renamed to lsb.events.1 and a new
+lsb.events with the events of all active jobs is started), the rest of the
+old file is read before following the new one.
+"""
+
+from __future__ import division
+
+import io
+import os
+import re
+from time import time
+from collections import OrderedDict
+
+from job import Job
+from readacct import (logfiles, parsevalues, acctjob, exitcode, subexclusive,
+                      nrusage)
+from utility import memoize
+
+# job status (jStatus) flags, in the order in which they are checked
+statusflags = (
+    (0x40, "DONE"),
+    (0x20, "EXIT"),
+    (0x10000, "UNKWN"),
+    (0x10, "USUSP"),
+    (0x08, "SSUSP"),
+    (0x02, "PSUSP"),
+    (0x04, "RUN"),
+    (0x200, "WAIT"),
+    (0x01, "PEND"),
+)
+
+finishedstats = frozenset(("DONE", "EXIT"))
+
+# number of resource limits in JOB_NEW and the position of the run limit
+nrlimits = 11
+runlimitindex = 9
+
+# positions of the memory limits (in KB) among the resource limits
+memlimitindices = {
+    "stacklimit": 3,
+    "corelimit": 4,
+    "memlimit": 5,  # RSS
+    "swaplimit": 8,
+}
+
+# job name with array indices (e.g., "name[1-10:2,20]%5")
+arrayname = re.compile(r"(.*)\[([\d,:-]+)\](?:%\d+)?$")
+
+
+def statusname(status):
+    """Name of a job status (jStatus)."""
+    for flag, name in statusflags:
+        if status & flag:
+            return name
+    return "UNKWN"
+
+
+def arrayindices(spec):
+    """Indices of an array specification (e.g., "1-10:2,20")."""
+    indices = []
+    for part in spec.split(","):
+        step = 1
+        if ":" in part:
+            part, step = part.split(":")
+            step = int(step)
+        if "-" in part:
+            first, last = map(int, part.split("-"))
+        else:
+            first = last = int(part)
+        indices += range(first, last + 1, step)
+    return indices
+
+
+def parsenew(v):
+    """Parse a JOB_NEW event (in LSF 9.1's layout) to a Job."""
+    job = Job()
+    options, nproc = int(v[5]), int(v[6])
+    runlimit = int(v[14 + runlimitindex])
+    n = 14 + nrlimits
+    job.queue = intern(v[n + 3])
+    job.resreq = v[n + 4] or None
+    job.from_host = intern(v[n + 5])
+    job.sub_cwd = intern(v[n + 6]) if v[n + 6] else None
+    job.input_file = v[n + 8] or None
+    job.output_file = v[n + 9] or None
+    job.error_file = v[n + 10] or None
+    n += 16
+    nasked = int(v[n])
+    job.host_req = v[n + 1:n + 1 + nasked]
+    n += 1 + nasked
+    job.dependency = v[n] or None
+    job.job_name = v[n + 2] or None
+    job.command = v[n + 3] or None
+    n += 5 + 3 * int(v[n + 4])  # file transfers
+    job.pre_exec_command = v[n] or None
+    job.mail = v[n + 1] or None
+    job.proj_name = intern(v[n + 2]) if v[n + 2] else None
+    job.max_req_proc = int(v[n + 4])
+    if len(v) > n + 7:
+        job.user_group = intern(v[n + 7]) if v[n + 7] else None
+    job.jobid = v[3]
+    job.stat = "PEND"
+    job.user = intern(v[13])
+    job.submit_time = float(v[7])
+    job.slots = job.min_req_proc = nproc
+    if runlimit > 0:
+        job.runlimit = runlimit
+    for key, index in memlimitindices.iteritems():
+        limit = int(v[14 + index])
+        if limit > 0:
+            job[key] = limit * 1024
+    job.exclusive = bool(options & subexclusive)
+    job.run_time = 0.
+    job.pend_reason = []
+    return job
+
+
+def copyjob(job):
+    """Copy of a job."""
+    copy = Job()
+    for attr in Job.__slots__:
+        setattr(copy, attr, getattr(job, attr))
+    copy.host_req = list(job.host_req or [])
+    copy.pend_reason = []
+    return copy
+
+
+class JobTracker(object):
+    """Jobs kept up to date from an lsb.events file.
+
+    update() applies the events logged since the last update; jobs() returns
+    the jobs with the fields that readjobs reads.  Jobs are dropped when
+    mbatchd cleans them (JOB_CLEAN).
+    """
+
+    def __init__(self, path, history=True):
+        """Start tracking (with the rotated files' events if history)."""
+        self.path = path
+        self.table = OrderedDict()
+        self.arrays = {}
+        self.file = None
+        self.inode = None
+        self.partial = ""
+        self.handlers = {
+            "JOB_NEW": self.jobnew,
+            "JOB_START": self.jobstart,
+            "JOB_STATUS": self.jobstatus,
+            "JOB_FINISH": self.jobfinish,
+            "JOB_CLEAN": self.jobclean,
+        }
+        if history:
+            self.readfiles(logfiles(path)[:-1])
+
+    def update(self):
+        """Apply the events logged since the last update; return their count.
+
+        A switched (or truncated) log is followed into the new file.
+        """
+        count = 0
+        while True:
+            if self.file is None:
+                try:
+                    self.file = io.open(self.path, "rb")
+                except IOError:
+                    return count
+                self.inode = os.fstat(self.file.fileno()).st_ino
+                self.partial = ""
+            count += self.readevents()
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                # between renaming the old and creating the new file
+                return count
+            if stat.st_ino == self.inode and \
+                    stat.st_size >= self.file.tell():
+                return count
+            # events logged before the switch
+            count += self.readevents()
+            self.file.close()
+            self.file = None
+            # files of further switches since the last update
+            rotated = logfiles(self.path)[:-1]
+            inodes = [os.stat(filename).st_ino for filename in rotated]
+            if self.inode in inodes:
+                count += self.readfiles(rotated[inodes.index(self.inode) + 1:])
+
+    def readfiles(self, filenames):
+        """Apply the events in complete files."""
+        count = 0
+        for filename in filenames:
+            with io.open(filename, "rb") as f:
+                for line in f:
+                    self.apply(line)
+                    count += 1
+        return count
+
+    def readevents(self):
+        """Apply the complete events appended to the file."""
+        lines = (self.partial + self.file.read()).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.apply(line)
+        return len(lines)
+
+    def apply(self, line):
+        """Apply an event."""
+        handler = self.handlers.get(line[1:line.find('"', 1)])
+        if handler:
+            handler(parsevalues(line))
+
+    def select(self, jobid, idx):
+        """The jobs that an event for jobid and array index idx concerns."""
+        if idx:
+            jobids = ["%s[%d]" % (jobid, idx)]
+        else:
+            jobids = self.arrays.get(jobid, [jobid])
+        return [self.table[jid] for jid in jobids if jid in self.table]
+
+    def jobnew(self, v):
+        """A job (or job array) was submitted."""
+        job = parsenew(v)
+        match = arrayname.match(job.job_name or "")
+        if not match:
+            self.table[job.jobid] = job
+            return
+        jobid = job.jobid
+        elements = self.arrays.setdefault(jobid, [])
+        for index in arrayindices(match.group(2)):
+            element = copyjob(job)
+            element.jobid = "%s[%d]" % (jobid, index)
+            element.job_name = "%s[%d]" % (match.group(1), index)
+            if element.jobid not in self.table:
+                elements.append(element.jobid)
+            self.table[element.jobid] = element
+
+    def jobstart(self, v):
+        """A job was dispatched to its execution hosts."""
+        nexec = int(v[8])
+        execs = v[9:9 + nexec]
+        idx = int(v[13 + nexec]) if len(v) > 13 + nexec else 0
+        hosts = {}
+        for host in set(execs):
+            hosts[intern(host)] = execs.count(host)
+        for job in self.select(v[3], idx):
+            job.stat = statusname(int(v[4]))
+            job.start_time = float(v[2])
+            job.finish_time = None
+            job.run_time = 0.
+            job.exec_host = dict(hosts)
+            job.nexec_host = len(hosts)
+            job.first_host = intern(execs[0]) if execs else None
+
+    def jobstatus(self, v):
+        """A job's status changed."""
+        stat = statusname(int(v[4]))
+        cputime, endtime = float(v[7]), int(v[8])
+        n = 10 + (nrusage if int(v[9]) else 0)
+        exitstatus = int(v[n + 1]) if len(v) > n + 1 else 0
+        idx = int(v[n + 2]) if len(v) > n + 2 else 0
+        for job in self.select(v[3], idx):
+            job.stat = stat
+            if stat == "PEND":
+                # requeued
+                job.start_time = job.exec_host = job.first_host = None
+                job.nexec_host = None
+                job.run_time = 0.
+            if cputime > 0:
+                job.cpu_used = cputime
+            if stat in finishedstats:
+                job.finish_time = float(endtime or v[2])
+                if job.start_time:
+                    job.run_time = max(0., job.finish_time - job.start_time)
+                job.exit_code = exitcode(exitstatus)
+
+    def jobfinish(self, v):
+        """A job's accounting record (as in lsb.acct)."""
+        job = acctjob(v)
+        if job.jobid in self.table:
+            self.table[job.jobid] = job
+
+    def jobclean(self, v):
+        """A finished job was removed from mbatchd."""
+        idx = int(v[4]) if len(v) > 4 else 0
+        for job in self.select(v[3], idx):
+            del self.table[job.jobid]
+        if not idx:
+            self.arrays.pop(v[3], None)
+
+    def jobs(self, finished=True):
+        """The tracked jobs (without the finished ones unless finished)."""
+        now = time()
+        jobs = []
+        for job in self.table.itervalues():
+            if job.stat in finishedstats:
+                if not finished:
+                    continue
+            elif job.start_time and job.stat != "PEND":
+                job.run_time = max(0., now - job.start_time)
+            jobs.append(job)
+        return jobs
+
+
+@memoize()
+def tracker(path):
+    """The JobTracker of an lsb.events file (shared by all readers)."""
+    return JobTracker(path)
+
+
+def readevents(path, finished=False):
+    """The jobs in an lsb.events file (updated since the last call).
+
+    Like bjobs, finished jobs are only included if finished.
+    """
+    jobtracker = tracker(path)
+    jobtracker.update()
+    return jobtracker.jobs(finished)
@@ -1,7 +1,9 @@
 """Read hosts from LSF."""
 
 import re
-from subprocess import Popen, PIPE, check_output
+
+from utility import readoutput, checkoutput
+from timings import timed
 
 
 def parseval(val):
@@ -20,17 +22,12 @@ def parseval(val):
     return val
 
 
-def readhosts(args, fast=False):
-    """Read hosts from LSF."""
-    # read bhosts for dynamic information
-    p = Popen(["bhosts", "-l"] + args, stdout=PIPE, stderr=PIPE)
-    out, err = p.communicate()
-    if err:
-        return []
+@timed("parse bhosts -l", records=len)
+def parsebhosts(out):
+    """Parse bhosts -l output."""
     lines = out.splitlines()
     lines.reverse()
-    hostorder = []
-    hosts = {}
+    hosts = []
     host = None
     stage = None
     while lines:
@@ -39,8 +36,7 @@ def readhosts(args, fast=False):
             continue
         if tokens[0] == "HOST":
             if host:
-                hostorder.append(host["host_name"])
-                hosts[host["host_name"]] = host
+                hosts.append(host)
             host = {
                 "host_name": tokens[1],
                 "load": {},
@@ -74,12 +70,14 @@ def readhosts(args, fast=False):
                 host[stage].update(new)
             except:
                 pass
-    hostorder.append(host["host_name"])
-    hosts[host["host_name"]] = host
-    if fast:
-        return [hosts[hn] for hn in hostorder]
-    # read lshosts for static information
-    out = check_output(["lshosts", "-w"] + hostorder)
+    if host:
+        hosts.append(host)
+    return hosts
+
+
+@timed("parse lshosts -w")
+def parselshosts(hosts, out):
+    """Parse lshosts -w output into hosts (by name)."""
     lines = out.splitlines()
     keys = lines[0].lower().split()
     for line in lines[1:]:
@@ -93,4 +91,37 @@ def readhosts(args, fast=False):
         resources[0] = resources[0][1:]  # get rid of ()
         resources[-1] = resources[-1][:-1]
         host[keys[-1]] = resources
-    return [hosts[hn] for hn in hostorder]
+
+
+@timed("readhosts", records=len)
+def readhosts(args, fast=False, maxage=None):
+    """Read hosts from LSF.
+
+    With maxage, LSF output cached up to maxage seconds ago may be used.
+    """
+    # read bhosts for dynamic information
+    out, err = readoutput(["bhosts", "-l"] + args, maxage)
+    if err:
+        return []
+    hosts = parsebhosts(out)
+    if fast:
+        return hosts
+    # read lshosts for static information
+    hostorder = [host["host_name"] for host in hosts]
+    out = checkoutput(["lshosts", "-w"] + hostorder, maxage)
+    parselshosts({host["host_name"]: host for host in hosts}, out)
+    return hosts
+
+
+def refreshhosts(args, oldhosts, maxage=None):
+    """Read hosts from bhosts, reusing the lshosts information of oldhosts."""
+    hosts = readhosts(args, fast=True, maxage=maxage)
+    oldhosts = {host["host_name"]: host for host in oldhosts}
+    if not all(host["host_name"] in oldhosts for host in hosts):
+        return readhosts(args, maxage=maxage)
+    for host in hosts:
+        oldhost = oldhosts[host["host_name"]]
+        for key in oldhost:
+            if key not in host:
+                host[key] = oldhost[key]
+    return hosts
@@ -4,7 +4,23 @@ from __future__ import division
 
 import re
 from time import strptime, strftime, mktime, time
-from subprocess import Popen, check_output, PIPE, CalledProcessError
+from threading import RLock
+
+from utility import (readoutput, iteroutput, checkoutput, checkoutputs,
+                     memoize)
+from job import Job, keys, fields, aliases, attrnames, lazyfields
+from timings import span, timed
+
+delimiter = "\7"
+
+# attributes of fields read from bjobs -o only
+eagerattrs = tuple(attrnames[key] for key in fields if key not in lazyfields)
+
+# fields with few distinct values (shared between jobs)
+internkeys = frozenset(("stat", "user", "user_group", "queue", "proj_name",
+                        "application", "service_class", "job_group",
+                        "from_host", "first_host", "exit_reason", "sub_cwd",
+                        "exec_home", "exec_cwd"))
 
 
 def parsemem(value, unit):
@@ -13,153 +29,141 @@ def parsemem(value, unit):
     return int(float(value) * 1024 ** e)
 
 
-def readjobs(args, fast=False):
-    """Read jobs from bjobs."""
-    keys = ("jobid", "stat", "user", "user_group", "queue", "job_name",
-            "job_description", "proj_name", "application", "service_class",
-            "job_group", "job_priority", "dependency", "command",
-            "pre_exec_command", "post_exec_command",
-            "resize_notification_command", "pids", "exit_code", "exit_reason",
-            "from_host", "first_host", "exec_host", "nexec_host", "alloc_slot",
-            "nalloc_slot", "host_file", "submit_time", "start_time",
-            "estimated_start_time", "specified_start_time",
-            "specified_terminate_time", "time_left", "finish_time",
-            "%complete", "warning_action", "action_warning_time", "pend_time",
-            "cpu_used", "run_time", "idle_factor", "exception_status", "slots",
-            "mem", "max_mem", "avg_mem", "memlimit", "swap", "swaplimit",
-            "min_req_proc", "max_req_proc", "effective_resreq", "network_req",
-            "filelimit", "corelimit", "stacklimit", "processlimit",
-            "input_file", "output_file", "error_file", "output_dir", "sub_cwd",
-            "exec_home", "exec_cwd", "forward_cluster", "forward_time")
-    aliases = (
-        ("id", "jobid"),
-        ("ugroup", "user_group"),
-        ("name", "job_name"),
-        ("description", "job_description"),
-        ("proj", "proj_name"),
-        ("project", "proj_name"),
-        ("app", "application"),
-        ("sla", "service_class"),
-        ("group", "job_group"),
-        ("priority", "job_priority"),
-        ("cmd", "command"),
-        ("pre_cmd", "pre_exec_command"),
-        ("post_cmd", "post_exec_command"),
-        ("resize_cmd", "resize_notification_command"),
-        ("estart_time", "estimated_start_time"),
-        ("sstart_time", "specified_start_time"),
-        ("sterminate_time", "specified_terminate_time"),
-        ("warn_act", "warning_action"),
-        ("warn_time", "action_warning_time"),
-        ("except_stat", "exception_status"),
-        ("eresreq", "effective_resreq"),
-        ("fwd_cluster", "forward_cluster"),
-        ("fwd_time", "forward_time")
-    )
-    delimiter = "\7"
-    # get detailed job information
-    cmd = ["bjobs", "-X", "-o",
-           " ".join(keys) + " delimiter='" + delimiter + "'"] + args
-    p = Popen(cmd, stdout=PIPE, stderr=PIPE)
-    out, err = p.communicate()
-    # ignore certain errors
-    err = [line for line in err.splitlines() if line]
-    # (fix for bjobs display_flexibleOutput bug)
-    err = [line for line in err if "display_flexibleOutput: Failed to get the "
-           "value of job_name" not in line]
-    if err:
-        return []
-    out = out.splitlines()[1:]  # get rid of header
-    joborder = []
-    jobs = {}
-    for line in out:
-        job = dict(zip(keys, line.split(delimiter)))
-        for key, val in job.iteritems():
-            if val == "-":
-                job[key] = None
-            elif key in ("exit_code", "nexec_host", "slots", "job_priority",
-                         "min_req_proc", "max_req_proc"):
-                job[key] = int(val)
-            elif key in ("cpu_used", "run_time", "idle_factor"):
-                job[key] = float(val.split()[0])
-            elif key in ("submit_time", "start_time", "finish_time"):
-                if val[-1] in "ELXA":
-                    val = val[:-2]
-                job[key] = mktime(strptime(val,
-                                           "%b %d %H:%M:%S %Y"))
-            elif key == "time_left":
-                if val[-1] in "ELXA":
-                    val = val[:-2]
-                try:
-                    v = val.split(":")
-                    job[key] = 60 * (60 * int(v[0]) + int(v[1]))
-                except:
-                    job[key] = mktime(strptime(year + " " + val,
-                                               "%Y %b %d %H:%M"))
-            elif key == "%complete":
-                job[key] = float(val.split("%")[0])
-            elif key in ("exec_host", "alloc_slot"):
-                val = val.split(":")
-                hosts = {}
-                for v in val:
-                    if "*" in v:
-                        v = v.split("*")
-                        hosts[v[1]] = int(v[0])
-                    else:
-                        hosts[v] = 1
-                job[key] = hosts
-            elif key in ("swap", "mem", "avg_mem", "max_mem", "memlimit",
-                         "swaplimit", "corelimit", "stacklimit"):
-                val = val.split()
-                job[key] = parsemem(val[0], val[1][0])
-            elif key == "pids":
-                if val:
-                    job[key] = map(int, val.split(","))
-                else:
-                    job[key] = []
-
-        # set jet unknown keys
-        for key in ("pend_reason", "runlimit", "mail", "exclusive", "resreq",
-                    "combined_resreq", "notify_begin", "notify_end"):
-            job[key] = None
-        # info from resreq
-        if job["effective_resreq"]:
-            job["exclusive"] = "exclusive=1" in job["effective_resreq"]
-            if "runlimit" in job["effective_resreq"]:
-                match = re.match("runlimit=\d+", job["effective_resreq"])
-                job["runlimit"] = int(match.groups()[0])
-        elif job["run_time"] and job["%complete"]:
-            t = job["run_time"] / job["%complete"] * 100
-            # rounding
-            if t > 10 * 60 * 60:
-                job["runlimit"] = round(t / (60 * 60)) * 60 * 60
-            else:
-                job["runlimit"] = round(t / 60) * 60
-        # extract array id
-        if job["job_name"]:
-            match = re.match(".*(\[\d+\])$", job["job_name"])
-            if match:
-                job["jobid"] += match.groups()[0]
-        joborder.append(job["jobid"])
-        jobs[job["jobid"]] = job
-    if not joborder:
-        return []
-    # set some keys
-    for job in jobs.values():
-        job.update({
-            "interactive": None,
-            "pend_reason": [],
-            "host_req": []
-        })
-    if fast:
-        for job in jobs.values():
-            job.update({alias: job[key] for alias, key in aliases})
-        return [jobs[jid] for jid in joborder]
-    # get more accurate timestamps from -W output
+@memoize()
+def parsememfield(val):
+    """Parse a memory field (e.g., "1.5 Gbytes")."""
+    val = val.split()
+    return parsemem(val[0], val[1][0])
+
+
+@memoize()
+def parsetimestamp(val):
+    """Parse a time stamp field (e.g., "Oct 18 11:52:56 2026 L")."""
+    if val[-1] in "ELXA":
+        val = val[:-2]
+    return mktime(strptime(val, "%b %d %H:%M:%S %Y"))
+
+
+@memoize()
+def parseshorttime(val):
+    """Parse a time stamp without year from bjobs -W (e.g., 10/18-11:52:56).
+
+    Returns None if the time stamp can't be parsed.
+    """
     try:
-        out = check_output(["bjobs", "-noheader", "-W"] + joborder)
-    except CalledProcessError as e:
-        out = e.output
+        year = strftime("%Y")  # guess year
+        t = mktime(strptime(year + " " + val, "%Y %m/%d-%H:%M:%S"))
+        if t > time():
+            # adjust guess for year
+            year = str(int(year) - 1)
+            t = mktime(strptime(year + " " + val, "%Y %m/%d-%H:%M:%S"))
+        return t
+    except ValueError:
+        return None
+
+
+@memoize()
+def parsetimeleft(val):
+    """Parse a time left field (e.g., "1:30 L" or "Oct 18 12:00 L")."""
+    if val[-1] in "ELXA":
+        val = val[:-2]
+    try:
+        v = val.split(":")
+        return 60 * (60 * int(v[0]) + int(v[1]))
+    except (ValueError, IndexError):
+        year = strftime("%Y")  # guess year
+        return mktime(strptime(year + " " + val, "%Y %b %d %H:%M"))
+
+
+def parseseconds(val):
+    """Parse a duration field (e.g., "900 second(s)")."""
+    return float(val.split()[0])
+
+
+def parsepercent(val):
+    """Parse a percentage field (e.g., "12.50% L")."""
+    return float(val.split("%")[0])
+
+
+def parsehosts(val):
+    """Parse a host list field (e.g., "16*host1:8*host2")."""
+    hosts = {}
+    for v in val.split(":"):
+        if "*" in v:
+            v = v.split("*")
+            hosts[intern(v[1])] = int(v[0])
+        else:
+            hosts[intern(v)] = 1
+    return hosts
+
+
+def parsepids(val):
+    """Parse a process id list field."""
+    if val:
+        return map(int, val.split(","))
+    return []
+
+
+# parser for each bjobs -o field (fields not listed are kept as strings)
+parsers = {key: intern for key in internkeys}
+parsers.update({key: int for key in (
+    "exit_code", "nexec_host", "slots", "job_priority", "min_req_proc",
+    "max_req_proc")})
+parsers.update({key: parseseconds for key in (
+    "cpu_used", "run_time", "idle_factor")})
+parsers.update({key: parsetimestamp for key in (
+    "submit_time", "start_time", "finish_time")})
+parsers.update({key: parsememfield for key in (
+    "swap", "mem", "avg_mem", "max_mem", "memlimit", "swaplimit", "corelimit",
+    "stacklimit")})
+parsers.update({key: parsehosts for key in ("exec_host", "alloc_slot")})
+parsers["time_left"] = parsetimeleft
+parsers["%complete"] = parsepercent
+parsers["pids"] = parsepids
+
+# (attribute, parser) in bjobs -o order
+fieldparsers = tuple((attrnames[key], parsers.get(key, str)) for key in keys)
+
+# bjobs -o fields that a field is derived from (besides itself)
+fielddeps = {
+    "jobid": ("job_name",),  # array index
+    "runlimit": ("effective_resreq", "run_time", "%complete"),
+    "exclusive": ("effective_resreq",),
+}
+
+# bjobs -o fields always read (to identify jobs in bjobs -W, -p, and -UF)
+basekeys = ("jobid", "stat")
+
+aliaskeys = dict(aliases)
+
+
+def bjobskeys(fields=None):
+    """The bjobs -o fields needed for fields and their dependencies.
+
+    Without fields, all bjobs -o fields are needed.
+    """
+    if fields is None:
+        return keys
+    needed = set()
+    todo = list(basekeys) + [aliaskeys.get(key, key) for key in fields]
+    while todo:
+        key = todo.pop()
+        if key not in needed:
+            needed.add(key)
+            todo += fielddeps.get(key, ())
+    return tuple(key for key in keys if key in needed)
+
+
+def makefieldparsers(fields=None):
+    """(attribute, parser) for the bjobs -o fields needed for fields."""
+    if fields is None:
+        return fieldparsers
+    return tuple((attrnames[key], parsers.get(key, str))
+                 for key in bjobskeys(fields))
+
+
+def parsetimes(jobs, out):
+    """Parse accurate timestamps from bjobs -W output."""
     for line in out.splitlines():
         line = line.split()
         if len(line) != 15:
@@ -175,51 +179,38 @@ def readjobs(args, fast=False):
                 (-1, "finish_time")
                 ):
             if line[n] != "-":
-                try:
-                    year = strftime("%Y")  # guess year
-                    t = mktime(strptime(year + " " + line[n],
-                                        "%Y %m/%d-%H:%M:%S"))
-                    if t > time():
-                        # adjust guess for year
-                        year = str(int(year) - 1)
-                        t = mktime(strptime(year + " " + line[n],
-                                            "%Y %m/%d-%H:%M:%S"))
+                t = parseshorttime(line[n])
+                if t is not None:
                     job[key] = t
-                except:
-                    pass
-    # get pending reasons (if any)
-    pids = [jid for jid in joborder if jobs[jid]["stat"] == "PEND"]
-    if pids:
-        try:
-            out = check_output(["bjobs", "-p"] + pids)
-        except CalledProcessError as e:
-            out = e.output
-        job = None
-        for line in out.split("\n")[1:-1]:
-            if line[0] == " " or line[:4] == "JOBS":
-                # pending reason
-                if ":" in line:
-                    match = re.match(" ?(.*): (\d+) hosts?;", line).groups()
-                    job["pend_reason"].append((match[0], int(match[1])))
-                else:
-                    match = re.match(" ?(.*);", line).groups()
-                    job["pend_reason"].append((match[0], True))
+
+
+def parsepending(jobs, out):
+    """Parse pending reasons from bjobs -p output."""
+    job = None
+    for line in out.split("\n")[1:-1]:
+        if line[0] == " " or line[:4] == "JOBS":
+            # pending reason
+            if ":" in line:
+                match = re.match(" ?(.*): (\d+) hosts?;", line).groups()
+                job["pend_reason"].append((match[0], int(match[1])))
             else:
-                if job:
-                    job["pend_reason"].sort(key=lambda p: -p[1])
-                # next job
-                line = line.split()
-                jobid = line[0]
-                match = re.match(".*(\[\d+\])$", " ".join(line[5:-3]))
-                if match:
-                    jobid += match.groups()[0]
-                job = jobs[jobid]
-                job["pend_reason"] = []
-    # get -UF (long) output (may be restricted)
-    try:
-        out = check_output(["bjobs", "-UF"] + joborder)
-    except CalledProcessError as e:
-        out = e.output
+                match = re.match(" ?(.*);", line).groups()
+                job["pend_reason"].append((match[0], True))
+        else:
+            if job:
+                job["pend_reason"].sort(key=lambda p: -p[1])
+            # next job
+            line = line.split()
+            jobid = line[0]
+            match = re.match(".*(\[\d+\])$", " ".join(line[5:-3]))
+            if match:
+                jobid += match.groups()[0]
+            job = jobs[jobid]
+            job["pend_reason"] = []
+
+
+def parselong(jobs, out):
+    """Parse details from bjobs -UF (long) output."""
     out = out.split(78 * "-" + "\n")
     for jobout in out:
         lines = [line.strip() for line in jobout.splitlines()]
@@ -254,7 +245,210 @@ def readjobs(args, fast=False):
         idx = lines.index("RUNLIMIT")
         job["runlimit"] = int(float(lines[idx + 1].split()[0]) * 60)
         # memlimits
-    # aliases
-    for job in jobs.values():
-        job.update({alias: job[key] for alias, key in aliases})
+
+
+# parser for each enrichment phase
+phaseparsers = {"W": parsetimes, "p": parsepending, "UF": parselong}
+
+
+def parsejob(line, fieldparsers=fieldparsers):
+    """Parse a line of bjobs -o output (of the fields in fieldparsers)."""
+    job = Job()
+    for (attr, parse), val in zip(fieldparsers, line.split(delimiter)):
+        if val != "-":
+            setattr(job, attr, parse(val))
+    # set jet unknown keys
+    job["pend_reason"] = []
+    job["host_req"] = []
+    # info from resreq
+    if job["effective_resreq"]:
+        job["exclusive"] = "exclusive=1" in job["effective_resreq"]
+        if "runlimit" in job["effective_resreq"]:
+            match = re.search("runlimit=(\d+)", job["effective_resreq"])
+            if match:
+                job["runlimit"] = int(match.groups()[0])
+    elif job["run_time"] and job["%complete"]:
+        t = job["run_time"] / job["%complete"] * 100
+        # rounding
+        if t > 10 * 60 * 60:
+            job["runlimit"] = round(t / (60 * 60)) * 60 * 60
+        else:
+            job["runlimit"] = round(t / 60) * 60
+    # extract array id
+    if job["job_name"]:
+        match = re.match(".*(\[\d+\])$", job["job_name"])
+        if match:
+            job["jobid"] += match.groups()[0]
+    return job
+
+
+class JobLoader(object):
+    """Loader for the bjobs -W, -p, and -UF information of a set of jobs.
+
+    Each phase is read for all jobs in one bjobs call when first needed.
+    """
+
+    def __init__(self, jobs, joborder, concurrent=True, maxage=None):
+        """Create a loader for parsed jobs (by jobid in joborder)."""
+        self.jobs = jobs
+        self.joborder = joborder
+        self.concurrent = concurrent
+        self.maxage = maxage
+        self.loaded = set()
+        self.loading = set()
+        self.lock = RLock()
+
+    def command(self, phase):
+        """The bjobs command line for a phase (None if not needed)."""
+        if phase == "W":
+            return ["bjobs", "-noheader", "-W"] + self.joborder
+        if phase == "p":
+            pids = [jid for jid in self.joborder
+                    if self.jobs[jid].stat == "PEND"]
+            if pids:
+                return ["bjobs", "-p"] + pids
+            return None
+        return ["bjobs", "-UF"] + self.joborder
+
+    def load(self, *phases):
+        """Load the phases not loaded yet (concurrently)."""
+        if all(phase in self.loaded for phase in phases):
+            return
+        with self.lock:
+            # parsing a phase in this thread may access its own fields
+            phases = [phase for phase in phases if phase not in self.loading]
+            if not phases:
+                return
+            self.loading.update(phases)
+            try:
+                cmds = [(phase, self.command(phase)) for phase in phases]
+                cmds = [(phase, cmd) for phase, cmd in cmds if cmd]
+                if self.concurrent and len(cmds) > 1:
+                    outs = checkoutputs([cmd for phase, cmd in cmds],
+                                        self.maxage)
+                else:
+                    outs = [checkoutput(cmd, self.maxage)
+                            for phase, cmd in cmds]
+                for (phase, cmd), out in zip(cmds, outs):
+                    with span("parse bjobs -" + phase) as record:
+                        phaseparsers[phase](self.jobs, out)
+                        record["bytes"] = len(out)
+                        record["records"] = len(self.joborder)
+            except:
+                self.loading.difference_update(phases)
+                raise
+            self.loaded.update(phases)
+
+
+def enrichjobs(jobs, joborder, fast=False, concurrent=True, maxage=None):
+    """Let parsed jobs load the output of bjobs -W, -p, and -UF on demand."""
+    if not fast:
+        loader = JobLoader(jobs, joborder, concurrent, maxage)
+        for job in jobs.itervalues():
+            job.loader = loader
     return [jobs[jid] for jid in joborder]
+
+
+def bjobscmd(args, fields=None):
+    """Construct the bjobs -o command line (see bjobskeys)."""
+    return ["bjobs", "-X", "-o", " ".join(bjobskeys(fields)) +
+            " delimiter='" + delimiter + "'"] + args
+
+
+def bjobserrors(err):
+    """Relevant lines of bjobs' error output."""
+    # ignore certain errors
+    err = [line for line in err.splitlines() if line]
+    # (fix for bjobs display_flexibleOutput bug)
+    return [line for line in err if "display_flexibleOutput: Failed to get "
+            "the value of job_name" not in line]
+
+
+@timed("readjobs", records=len)
+def readjobs(args, fast=False, concurrent=True, maxage=None, fields=None):
+    """Read jobs from bjobs.
+
+    Unless fast, information from bjobs -W, -p, and -UF is loaded on demand
+    (see JobLoader).  With maxage, LSF output cached up to maxage seconds ago
+    may be used.  With fields, only the bjobs -o fields needed for them are
+    read (see bjobskeys); the others are None.
+    """
+    # get detailed job information
+    out, err = readoutput(bjobscmd(args, fields), maxage)
+    if bjobserrors(err):
+        return []
+    out = out.splitlines()[1:]  # get rid of header
+    joborder = []
+    jobs = {}
+    jobparsers = makefieldparsers(fields)
+    with span("parse bjobs -o") as record:
+        for line in out:
+            job = parsejob(line, jobparsers)
+            joborder.append(job["jobid"])
+            jobs[job["jobid"]] = job
+        record["records"] = len(joborder)
+    if not joborder:
+        return []
+    return enrichjobs(jobs, joborder, fast, concurrent, maxage)
+
+
+@timed("refreshjobs", records=len)
+def refreshjobs(args, oldjobs, concurrent=True, maxage=None, fields=None):
+    """Read jobs from bjobs, reusing information from a previous read.
+
+    Only the bjobs -o listing is read for all jobs.  Jobs with the same jobid
+    and stat as in oldjobs are updated in place and keep their bjobs -W, -p,
+    and -UF information; only the other jobs load it (on demand).
+    """
+    oldjobs = {job["jobid"]: job for job in oldjobs}
+    result = []
+    joborder = []
+    jobs = {}
+    for job in readjobs(args, fast=True, maxage=maxage, fields=fields):
+        oldjob = oldjobs.get(job["jobid"])
+        if oldjob is not None and oldjob["stat"] == job["stat"]:
+            for attr in eagerattrs:
+                setattr(oldjob, attr, getattr(job, attr))
+            job = oldjob
+        else:
+            joborder.append(job["jobid"])
+            jobs[job["jobid"]] = job
+        result.append(job)
+    if joborder:
+        enrichjobs(jobs, joborder, concurrent=concurrent, maxage=maxage)
+    return result
+
+
+def iterjobs(args, fast=False, concurrent=True, batchsize=1000,
+             maxage=None, fields=None):
+    """Read jobs from bjobs incrementally.
+
+    Jobs are yielded as soon as bjobs prints them (fast=True) or in batches
+    of batchsize jobs that load their -W, -p, and -UF information together.
+    """
+    with span("iterjobs", nest=False) as record:
+        record["records"] = 0
+        lines = iteroutput(bjobscmd(args, fields), maxage)
+        jobparsers = makefieldparsers(fields)
+        try:
+            next(lines, None)  # get rid of header
+            joborder = []
+            jobs = {}
+            for line in lines:
+                job = parsejob(line.rstrip("\n"), jobparsers)
+                joborder.append(job["jobid"])
+                jobs[job["jobid"]] = job
+                if fast or len(joborder) >= batchsize:
+                    record["records"] += len(joborder)
+                    for job in enrichjobs(jobs, joborder, fast, concurrent,
+                                          maxage):
+                        yield job
+                    joborder = []
+                    jobs = {}
+            if joborder:
+                record["records"] += len(joborder)
+                for job in enrichjobs(jobs, joborder, fast, concurrent,
+                                      maxage):
+                    yield job
+        finally:
+            lines.close()
@@ -0,0 +1,242 @@
+"""Evaluate the selection of resource requirements for hosts."""
+
+from __future__ import division
+
+import os
+import re
+
+# sections of resource requirement strings
+sections = ("select", "order", "rusage", "span", "same", "cu", "affinity")
+
+tokenpattern = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|([A-Za-z_]\w*)|"
+                          r"(==|!=|>=|<=|&&|\|\||[=><!()]))")
+
+# comparison operators (= is the same as ==)
+comparisons = {
+    "==": lambda a, b: a == b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+# bytes per unit of memory sizes in selections (LSF_UNIT_FOR_LIMITS)
+unitsizes = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40,
+             "PB": 1 << 50, "EB": 1 << 60}
+
+unitpattern = re.compile(r"\s*LSF_UNIT_FOR_LIMITS\s*=\s*[\"']?(\w+)")
+
+# bytes per unit (None: not yet determined, False: unknown)
+unitsize = None
+
+
+def limitunit():
+    """Bytes per unit of memory sizes in selections (None if unknown).
+
+    The unit is LSF_UNIT_FOR_LIMITS from the environment or lsf.conf (in
+    $LSF_ENVDIR or /etc), which defaults to MB.
+    """
+    global unitsize
+    if unitsize is None:
+        unit = os.environ.get("LSF_UNIT_FOR_LIMITS")
+        if not unit:
+            conf = os.path.join(os.environ.get("LSF_ENVDIR", "/etc"),
+                                "lsf.conf")
+            try:
+                with open(conf) as f:
+                    matches = filter(None, map(unitpattern.match, f))
+            except IOError:
+                matches = None
+            if matches is not None:
+                unit = matches[-1].group(1) if matches else "MB"
+        unitsize = unitsizes.get((unit or "").upper(), False)
+    return unitsize or None
+
+
+def tounit(val):
+    """Convert a size in bytes to the unit of selections."""
+    if val is None:
+        return None
+    return val / limitunit()
+
+
+def loadunit(host, key):
+    """Current load index (in the unit of selections) of a host."""
+    return tounit(host["load"].get(key, (None,))[0])
+
+
+# host attributes by their selection names (functions of the host)
+attributes = {
+    "hname": lambda host: host["host_name"],
+    "type": lambda host: host.get("type"),
+    "model": lambda host: host.get("model"),
+    "ncpus": lambda host: host.get("ncpus"),
+    "cpuf": lambda host: host.get("cpuf"),
+    "maxmem": lambda host: tounit(host.get("maxmem")),
+    "maxswp": lambda host: tounit(host.get("maxswp")),
+    "mem": lambda host: loadunit(host, "mem"),
+    "swp": lambda host: loadunit(host, "swp"),
+    "tmp": lambda host: loadunit(host, "tmp"),
+}
+
+# attributes that are memory sizes
+memoryattributes = frozenset(("maxmem", "maxswp", "mem", "swp", "tmp"))
+
+
+def selection(resreq):
+    """Extract the selection expression from a resource requirement.
+
+    Raises ValueError for unsupported requirements (e.g., compound).
+    """
+    if not any(section + "[" in resreq for section in sections):
+        return resreq  # plain selection
+    if "{" in resreq or resreq.count("select[") > 1:
+        raise ValueError("unsupported resource requirement: " + resreq)
+    start = resreq.find("select[")
+    if start == -1:
+        return ""
+    start += len("select[")
+    depth = 0
+    for i in range(start, len(resreq)):
+        if resreq[i] == "[":
+            depth += 1
+        elif resreq[i] == "]":
+            if depth == 0:
+                return resreq[start:i]
+            depth -= 1
+    raise ValueError("unbalanced resource requirement: " + resreq)
+
+
+def tokenize(expr):
+    """Split a selection expression into tokens."""
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        match = tokenpattern.match(expr, pos)
+        if not match:
+            raise ValueError("unsupported selection: " + expr)
+        number, name, op = match.groups()
+        if number is not None:
+            tokens.append(("number", float(number)))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", op))
+        pos = match.end()
+    return tokens
+
+
+class Parser(object):
+    """Parser that turns a selection into a function of a host."""
+
+    def __init__(self, expr):
+        """Tokenize the expression."""
+        self.tokens = tokenize(expr)
+        self.pos = 0
+
+    def peek(self):
+        """Next token (or None)."""
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def pop(self):
+        """Consume the next token."""
+        token = self.peek()
+        if token is None:
+            raise ValueError("incomplete selection")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        """Parse the entire expression."""
+        if not self.tokens:
+            return lambda host: True
+        f = self.parseor()
+        if self.peek() is not None:
+            raise ValueError("unexpected token: %s" % self.peek()[1])
+        return f
+
+    def parseor(self):
+        """Parse a disjunction."""
+        terms = [self.parseand()]
+        while self.peek() == ("op", "||"):
+            self.pop()
+            terms.append(self.parseand())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda host: any(f(host) for f in terms)
+
+    def parseand(self):
+        """Parse a conjunction."""
+        terms = [self.parseunary()]
+        while self.peek() == ("op", "&&"):
+            self.pop()
+            terms.append(self.parseunary())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda host: all(f(host) for f in terms)
+
+    def parseunary(self):
+        """Parse a negation, parenthesized expression, or comparison."""
+        kind, val = self.pop()
+        if (kind, val) == ("op", "!"):
+            f = self.parseunary()
+            return lambda host: not f(host)
+        if (kind, val) == ("op", "("):
+            f = self.parseor()
+            if self.pop() != ("op", ")"):
+                raise ValueError("missing )")
+            return f
+        if kind != "name":
+            raise ValueError("unexpected token: %s" % val)
+        if val == "defined":
+            if self.pop() != ("op", "("):
+                raise ValueError("missing (")
+            kind, resource = self.pop()
+            if self.pop() != ("op", ")"):
+                raise ValueError("missing )")
+            return lambda host: resource in host.get("resources", ())
+        token = self.peek()
+        if token is None or token[0] != "op" or token[1] not in comparisons:
+            # boolean resource
+            return lambda host: val in host.get("resources", ())
+        self.pop()
+        return self.parsecomparison(val, comparisons[token[1]])
+
+    def parsecomparison(self, name, compare):
+        """Parse the right-hand side of a comparison with an attribute."""
+        kind, other = self.pop()
+        if name == "type" and other in ("any", "local"):
+            if other == "any" and compare(0, 0) and not compare(0, 1):
+                return lambda host: True  # == any
+            raise ValueError("unsupported type selection: " + other)
+        if name not in attributes:
+            raise ValueError("unsupported attribute: " + name)
+        if name in memoryattributes and limitunit() is None:
+            raise ValueError("unknown unit (LSF_UNIT_FOR_LIMITS) of " + name)
+        attribute = attributes[name]
+        if kind not in ("number", "name"):
+            raise ValueError("unexpected token: %s" % other)
+
+        def f(host):
+            value = attribute(host)
+            if value is None:
+                return False
+            if kind == "number" and isinstance(value, str):
+                raise ValueError("can't compare %s to a number" % name)
+            return compare(value, other)
+        return f
+
+
+def selecthosts(resreq, hosts):
+    """Select the hosts that satisfy a resource requirement (like bhosts -R).
+
+    Raises ValueError for requirements that can't be evaluated locally.
+    """
+    match = Parser(selection(resreq)).parse()
+    return [host for host in hosts if match(host)]
@@ -1,63 +1,75 @@
-"""Submit a job to LSF."""
+"""Submit jobs to LSF."""
 
 from __future__ import print_function, division
 
 import sys
 import re
 from subprocess import Popen, PIPE
+from collections import OrderedDict
 
+from timings import span, timed
 
-def submitjob(data, shell=False):
-    """Submit a job to LSF."""
-    if "command" not in data:
-        print("no command given", file=sys.stderr)
-        return False
-    aliases = (
-        ("id", "jobid"),
-        ("name", "job_name"),
-        ("description", "job_description"),
-        ("proj", "proj_name"),
-        ("project", "proj_name"),
-        ("app", "application"),
-        ("sla", "service_class"),
-        ("group", "job_group"),
-        ("priority", "job_priority"),
-        ("cmd", "command"),
-        ("pre_cmd", "pre_exec_command"),
-        ("post_cmd", "post_exec_command"),
-        ("resize_cmd", "resize_notification_command"),
-        ("estart_time", "estimated_start_time"),
-        ("sstart_time", "specified_start_time"),
-        ("sterminate_time", "specified_terminate_time"),
-        ("warn_act", "warning_action"),
-        ("warn_time", "action_warning_time"),
-        ("except_stat", "exception_status"),
-        ("eresreq", "effective_resreq"),
-        ("fwd_cluster", "forward_cluster"),
-        ("fwd_time", "forward_time")
-    )
-    strargs = {
-        "job_name": "-J",
-        "job_description": "-Jd",
-        "input_file": "-i",
-        "output_file": "-o",
-        "error_file": "-e",
-        "project": "-P",
-        "dependency": "-w"
-    }
-    intargs = {
-        "slots": "-n"
-    }
-    memargs = {
-        "memlimit": "-M",
-        "corelimit": "-C",
-        "stacklimit": "-S"
-    }
-    timeargs = {
-        "runlimit": "-W"
-    }
+aliases = dict((
+    ("id", "jobid"),
+    ("name", "job_name"),
+    ("description", "job_description"),
+    ("proj", "proj_name"),
+    ("project", "proj_name"),
+    ("app", "application"),
+    ("sla", "service_class"),
+    ("group", "job_group"),
+    ("priority", "job_priority"),
+    ("cmd", "command"),
+    ("pre_cmd", "pre_exec_command"),
+    ("post_cmd", "post_exec_command"),
+    ("resize_cmd", "resize_notification_command"),
+    ("estart_time", "estimated_start_time"),
+    ("sstart_time", "specified_start_time"),
+    ("sterminate_time", "specified_terminate_time"),
+    ("warn_act", "warning_action"),
+    ("warn_time", "action_warning_time"),
+    ("except_stat", "exception_status"),
+    ("eresreq", "effective_resreq"),
+    ("fwd_cluster", "forward_cluster"),
+    ("fwd_time", "forward_time")
+))
+strargs = {
+    "job_name": "-J",
+    "job_description": "-Jd",
+    "input_file": "-i",
+    "output_file": "-o",
+    "error_file": "-e",
+    "proj_name": "-P",
+    "dependency": "-w"
+}
+intargs = {
+    "slots": "-n"
+}
+memargs = {
+    "memlimit": "-M",
+    "corelimit": "-C",
+    "stacklimit": "-S"
+}
+timeargs = {
+    "runlimit": "-W"
+}
+
+# maximum number of elements per job array (LSF's default MAX_JOB_ARRAY_SIZE)
+maxarraysize = 1000
+
+# name of job arrays whose jobs have no name
+arrayname = "array"
+
+# shebang of a POSIX shell (e.g., "#!/bin/bash -l" or "#!/usr/bin/env sh")
+shellshebang = re.compile(r"#!\s*(?:\S*/)?(?:env\s+)?(?:ba|da|k|z)?sh(?:\s|$)")
+
+
+def bsubargs(data, array=False):
+    """Construct the bsub arguments for a job (without its command)."""
     args = []
-    for key, val in data.iteritems():
+    for key, val in sorted(data.iteritems()):
+        if key == "command":
+            continue
         if key[0] == "-":
             if val is True:
                 args += [key]
@@ -67,24 +79,39 @@ def submitjob(data, shell=False):
         if key in aliases:
             key = aliases[key]
         if key in strargs:
-            args += [key, val]
+            args += [strargs[key], val]
         if key in intargs:
-            args += [key, str(val)]
+            args += [intargs[key], str(val)]
         if key in memargs:
-            args += [key, str(val // 1024)]
+            args += [memargs[key], str(val // 1024)]
         if key in timeargs:
-            args += [key, str(val // 60)]
+            args += [timeargs[key], str(val // 60)]
     # output file from jobname
     if "-o" not in args and "-J" in args:
-        args += ["-o", args[args.index["-J"] + 1] + ".%J.out"]
-    cmd = ["bsub"] + args
-    p = Popen(cmd, stdout=PIPE, stderr=PIPE, stdin=PIPE)
+        name = args[args.index("-J") + 1]
+        args += ["-o", name + (".%J.%I.out" if array else ".%J.out")]
+    return args
+
+
+def jobscript(command, shell=False):
+    """Job script for a command."""
     if shell:
-        command = '#!/bin/bash -l\n'
-    else:
-        command = ''
-    command += data["command"]
-    out, err = p.communicate(command)
+        return '#!/bin/bash -l\n' + command
+    return command
+
+
+def bsub(args, script):
+    """Submit a job script with bsub and return the job id."""
+    cmd = ["bsub"] + args
+    with span("command", cmd) as record:
+        p = Popen(cmd, stdout=PIPE, stderr=PIPE, stdin=PIPE)
+        out, err = p.communicate(script)
+        record["bytes"] = len(out)
+    return parsebsub(out, err)
+
+
+def parsebsub(out, err):
+    """Extract the job id from bsub's output (or raise its error)."""
     match = re.search("Job <(.*?)> is submitted", out)
     if match:
         return match.groups()[0]
@@ -92,4 +119,99 @@ def submitjob(data, shell=False):
         match = re.search("Error: (.*)\n", err)
         if match:
             err = match.groups()[0]
-        raise EnvironmentError(1, err)
+        raise EnvironmentError(1, err.strip())
+
+
+@timed("submitjob")
+def submitjob(data, shell=False):
+    """Submit a job to LSF."""
+    if "command" not in data:
+        print("no command given", file=sys.stderr)
+        return False
+    return bsub(bsubargs(data), jobscript(data["command"], shell))
+
+
+def shebang(command):
+    """A command's shebang line (or None)."""
+    if command.startswith("#!"):
+        return command.split("\n", 1)[0]
+    return None
+
+
+def shellcommand(command):
+    """Whether a command is run by a POSIX shell (it has no other shebang)."""
+    line = shebang(command)
+    return line is None or bool(shellshebang.match(line))
+
+
+def arrayscript(commands, shell=False):
+    """Job script that runs the $LSB_JOBINDEX-th command (from 1).
+
+    The commands must be shell commands (see shellcommand).
+    """
+    header = jobscript("", shell)
+    firstlines = set(command.split("\n", 1)[0] for command in commands)
+    if not shell and len(firstlines) == 1 and \
+            next(iter(firstlines)).startswith("#!"):
+        # common shell
+        header = next(iter(firstlines)) + "\n"
+        commands = [command.split("\n", 1)[1] if "\n" in command else ""
+                    for command in commands]
+    lines = [header + 'case "$LSB_JOBINDEX" in']
+    for index, command in enumerate(commands, 1):
+        lines += ["%d)" % index, command.rstrip("\n"), ";;"]
+    lines.append("esac")
+    return "\n".join(lines) + "\n"
+
+
+@timed("submitjobs", records=len)
+def submitjobs(datas, shell=False):
+    """Submit jobs to LSF, those that differ only in their command as arrays.
+
+    Returns the job ids in the order of datas (with the index for elements
+    of job arrays, e.g., "1234[5]").  Jobs whose submission failed have the
+    EnvironmentError instead, so that the other jobs' ids are not lost.
+    """
+    jobids = [None] * len(datas)
+    groups = OrderedDict()  # job indices by bsub arguments and shebang
+    for i, data in enumerate(datas):
+        if "command" not in data:
+            print("no command given", file=sys.stderr)
+            jobids[i] = False
+            continue
+        args = tuple(bsubargs(data))
+        if "-J" in args and "[" in args[args.index("-J") + 1]:
+            args = (i,)  # already an array: submit on its own
+        elif not shellcommand(data["command"]):
+            args = (i,)  # other interpreter: can't be merged into a case
+        else:
+            args += (shebang(data["command"]),)  # one shell per array
+        groups.setdefault(args, []).append(i)
+    for indices in groups.itervalues():
+        if len(indices) == 1:
+            i = indices[0]
+            try:
+                jobids[i] = submitjob(datas[i], shell)
+            except EnvironmentError as e:
+                jobids[i] = e
+            continue
+        args = bsubargs(datas[indices[0]], array=True)
+        if "-J" in args:
+            nameidx = args.index("-J") + 1
+        else:
+            args += ["-J", arrayname]
+            nameidx = len(args) - 1
+        name = args[nameidx]
+        for start in range(0, len(indices), maxarraysize):
+            chunk = indices[start:start + maxarraysize]
+            args[nameidx] = "%s[1-%d]" % (name, len(chunk))
+            script = arrayscript([datas[j]["command"] for j in chunk], shell)
+            try:
+                jobid = bsub(args, script)
+            except EnvironmentError as e:
+                for i in chunk:
+                    jobids[i] = e
+                continue
+            for index, i in enumerate(chunk, 1):
+                jobids[i] = "%s[%d]" % (jobid, index)
+    return jobids
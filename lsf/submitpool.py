@@ -0,0 +1,145 @@
+"""Submit many jobs to LSF concurrently."""
+
+from __future__ import print_function, division
+
+import re
+from time import time, sleep
+from random import random
+from threading import Thread, Lock
+from Queue import Queue
+
+from submitjob import submitjob
+from timings import current, adopt, timed
+
+# number of bsub processes in flight
+concurrency = 4
+
+# submissions per second (None: unlimited)
+rate = 10.
+
+# number of retries for transient errors
+retries = 5
+
+# seconds before the first retry (doubled with each retry)
+backoff = 1.
+maxbackoff = 60.
+
+# bsub errors worth retrying (mbatchd busy, restarting, or unreachable)
+transienterrors = re.compile("not responding|LSF is down|Please wait|"
+                             "Cannot connect|Internal library error|"
+                             "Failed in an LSF library call: .*timed out")
+
+
+class TokenBucket(object):
+    """Token bucket rate limit."""
+
+    def __init__(self, rate, burst=None):
+        """Initialize a full bucket of burst (default: rate) tokens."""
+        self.rate = rate
+        self.capacity = max(1., burst or rate)
+        self.tokens = self.capacity
+        self.time = time()
+        self.lock = Lock()
+
+    def take(self):
+        """Wait for and take a token."""
+        while True:
+            with self.lock:
+                now = time()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.time) * self.rate)
+                self.time = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+
+class SubmitPool(object):
+    """Pool of threads submitting jobs with bsub.
+
+    Each job's result is its job id or the EnvironmentError that bsub failed
+    with (after retrying transient errors), or any other exception raised
+    while submitting it.
+    """
+
+    def __init__(self, concurrency=concurrency, rate=rate, burst=None,
+                 retries=retries, backoff=backoff, shell=False):
+        """Start the submitting threads."""
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.shell = shell
+        self.results = []
+        self.lock = Lock()
+        self.queue = Queue()
+        self.parent = current()
+        self.threads = [Thread(target=self.work)
+                        for _ in range(max(1, concurrency))]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.join()
+
+    def submit(self, data):
+        """Queue a job for submission and return its index in the results."""
+        with self.lock:
+            index = len(self.results)
+            self.results.append(None)
+        self.queue.put((index, data))
+        return index
+
+    def join(self):
+        """Wait for all queued jobs and return the results."""
+        if self.threads:
+            for thread in self.threads:
+                self.queue.put(None)
+            for thread in self.threads:
+                thread.join()
+            self.threads = []
+        return self.results
+
+    def work(self):
+        """Submit queued jobs until the pool is joined."""
+        with adopt(self.parent):
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                index, data = item
+                try:
+                    self.results[index] = self.submitone(data)
+                except Exception as e:
+                    # e.g., unexpected bsub output: keep the worker running
+                    self.results[index] = e
+
+    def submitone(self, data):
+        """Submit a job, retrying transient errors with backoff."""
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if self.bucket:
+                self.bucket.take()
+            try:
+                return submitjob(data, self.shell)
+            except EnvironmentError as e:
+                if attempt == self.retries or \
+                        not transienterrors.search(str(e.strerror)):
+                    return e
+            # jitter keeps failed submissions from retrying in lockstep
+            sleep(min(delay, maxbackoff) * (.5 + random()))
+            delay *= 2
+
+
+@timed("submitall")
+def submitall(datas, **kwargs):
+    """Submit jobs concurrently (see SubmitPool) and return their results."""
+    with SubmitPool(**kwargs) as pool:
+        for data in datas:
+            pool.submit(data)
+    return pool.results
@@ -2,44 +2,105 @@
 
 from collections import defaultdict
 
-from utility import findstringpattern
+from utility import findstringpattern, sumgroups
+from timings import timed
 
+# keys summarized by their sum
+sumkeys = ("max", "njobs", "run", "ssusp", "ususp", "rsv", "ncpus", "maxmem",
+           "maxswp")
 
+# keys summarized by their counts
+countkeys = ("status", "server", "type", "comment")
+
+
+class HostSummary(object):
+    """Summary of hosts added in batches, with one accumulator per key.
+
+    The keys (and load indices) are those of the first host.
+    """
+
+    def __init__(self, host):
+        """Initialize the accumulators for a host's keys."""
+        self.keys = list(host)
+        self.acc = {}
+        for key in self.keys:
+            if key in sumkeys:
+                self.acc[key] = 0
+            elif key in countkeys:
+                self.acc[key] = defaultdict(int)
+            elif key in ("load", "threshold"):
+                self.acc[key] = {key2: [None, None] for key2 in host[key]}
+            else:
+                self.acc[key] = []
+        self.names = []
+
+    def values(self, hosts):
+        """The values of a list of hosts by key."""
+        return {key: [host[key] for host in hosts] for key in self.keys}
+
+    def add(self, hosts):
+        """Add a list of hosts."""
+        self.addvalues(self.values(hosts))
+
+    def addvalues(self, valuesbykey):
+        """Add the values of a list of hosts (see values)."""
+        for key in self.keys:
+            acc = self.acc[key]
+            values = valuesbykey[key]
+            if key == "host_name":
+                self.names += values
+            elif key in sumkeys:
+                # sum
+                self.acc[key] = sum((value for value in values if value), acc)
+            elif key in countkeys:
+                # count
+                for value in values:
+                    acc[value] += 1
+            elif key in ("load", "threshold"):
+                # sum up free/used pairs
+                for key2, pair in acc.iteritems():
+                    # (not all hosts have all load indices, e.g., GPUs)
+                    for value in values:
+                        for i, x in enumerate(value.get(key2, (None, None))):
+                            # (not all values are numbers, e.g., "45C")
+                            if isinstance(x, (int, long, float)):
+                                pair[i] = x if pair[i] is None else pair[i] + x
+            else:
+                # colect
+                for value in values:
+                    if value and value not in acc:
+                        acc.append(value)
+
+    def result(self):
+        """The summarized host."""
+        sumhost = {}
+        for key in self.keys:
+            if key == "host_name":
+                # find string pattern
+                sumhost[key] = findstringpattern([name for name in self.names
+                                                  if name])
+            elif key in ("load", "threshold"):
+                sumhost[key] = {key2: list(pair)
+                                for key2, pair in self.acc[key].iteritems()}
+            else:
+                sumhost[key] = self.acc[key]
+        sumhost["host_names"] = self.names
+        return sumhost
+
+
+@timed("sumhosts")
 def sumhosts(hosts):
     """Summarize a list of hosts."""
-    sumhost = {}
-    for key in hosts[0]:
-        if key in ("host_name"):
-            # find string pattern
-            sumhost[key] = findstringpattern([host[key] for host in hosts
-                                              if host[key]])
-        elif key in ("max", "njobs", "run", "ssusp", "ususp", "rsv", "ncpus",
-                     "maxmem", "maxswp"):
-            # sum
-            sumhost[key] = sum(host[key] for host in hosts if host[key])
-        elif key in ("status", "server", "type", "comment"):
-            sumhost[key] = defaultdict(int)
-            for host in hosts:
-                sumhost[key][host[key]] += 1
-        elif key in ("load", "threshold"):
-            # sum up free/used pairs
-            sumhost[key] = dict()
-            for key2 in hosts[0][key]:
-                free, used = zip(*[host[key][key2] for host in hosts])
-                if all(x is None for x in free):
-                    free = None
-                else:
-                    free = sum(x for x in free if x)
-                if all(x is None for x in used):
-                    used = None
-                else:
-                    used = sum(x for x in used if x)
-                sumhost[key][key2] = [free, used]
-        else:
-            # colect
-            sumhost[key] = []
-            for host in hosts:
-                if host[key] and host[key] not in sumhost[key]:
-                    sumhost[key].append(host[key])
-    sumhost["host_names"] = [host["host_name"] for host in hosts]
-    return sumhost
+    summary = HostSummary(hosts[0])
+    summary.add(hosts)
+    return summary.result()
+
+
+@timed("sumhosts")
+def sumhostgroups(groups, hosts):
+    """Summarize nested groups of hosts (see grouphosts) at all levels.
+
+    Returns (titles, summarized host) like flattengroups; each host is added
+    once to the summaries of all its groups.
+    """
+    return sumgroups(groups, hosts, HostSummary)
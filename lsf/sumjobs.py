@@ -2,76 +2,164 @@
 
 from __future__ import division
 
-from utility import findstringpattern
+from utility import StringPattern, sumgroups
+from job import fields, prefetch
+from timings import timed
 
+from operator import itemgetter
+from itertools import islice
 from collections import defaultdict
 
+# keys summarized by a string pattern
+patternkeys = ("job_name", "job_description", "input_file", "output_file",
+               "error_file", "output_dir", "sub_cwd", "exec_home", "exec_cwd",
+               "exit_reson", "application", "dependency", "command",
+               "pre_exec_command", "post_exec_command",
+               "resize_notification_command", "effective_resreq")
 
-def sumjobs(jobs):
-    """Summarize a list of jobs."""
-    sumjob = {}
-    for key in jobs[0]:
-        if key in ("job_name", "job_description", "input_file", "output_file",
-                   "error_file", "output_dir", "sub_cwd", "exec_home",
-                   "exec_cwd", "exit_reson", "application", "dependency",
-                   "command", "pre_exec_command", "post_exec_command",
-                   "resize_notification_command", "effective_resreq"):
-            # find string pattern
-            sumjob[key] = findstringpattern([job[key] for job in jobs
-                                             if job[key]])
-        elif key in ("runlimit", "swaplimit", "stacklimit", "memlimit",
-                     "filelimit", "processlimit", "corelimit", "run_time",
-                     "swap", "slots", "min_req_proc", "max_req_proc", "mem",
-                     "max_mem", "avg_mem", "nexec_host", "cpu_used",
-                     "time_left"):
-            # sum
-            sumjob[key] = sum(job[key] for job in jobs if job[key])
-        elif key in ("%complete", "job_priority", "idle_factor"):
-            # compute average
-            pcomp = [job[key] for job in jobs if job[key]]
-            if pcomp:
-                sumjob[key] = sum(pcomp) / len(pcomp)
+# keys summarized by their sum
+sumkeys = ("runlimit", "swaplimit", "stacklimit", "memlimit", "filelimit",
+           "processlimit", "corelimit", "run_time", "swap", "slots",
+           "min_req_proc", "max_req_proc", "mem", "max_mem", "avg_mem",
+           "nexec_host", "cpu_used", "time_left")
+
+# keys summarized by their average
+meankeys = ("%complete", "job_priority", "idle_factor")
+
+# number of jobs summarized at a time
+batchsize = 1000
+
+
+class JobSummary(object):
+    """Summary of jobs added in batches, with one accumulator per key."""
+
+    def __init__(self, keys):
+        """Initialize the accumulators for keys."""
+        self.keys = list(keys)
+        self.acc = {}
+        for key in self.keys:
+            if key in patternkeys:
+                self.acc[key] = StringPattern()
+            elif key in sumkeys:
+                self.acc[key] = 0
+            elif key in meankeys:
+                self.acc[key] = [0, 0]  # sum, count
+            elif key == "pids":
+                self.acc[key] = []
+            elif key == "jobid":
+                self.acc[key] = [], set()  # in order, seen
+            else:
+                self.acc[key] = defaultdict(int)  # counts
+
+    def values(self, jobs):
+        """The values of a list of jobs by key."""
+        return {key: map(itemgetter(key), jobs) for key in self.keys}
+
+    def add(self, jobs):
+        """Add a list of jobs."""
+        self.addvalues(self.values(jobs))
+
+    def addvalues(self, valuesbykey):
+        """Add the values of a list of jobs (see values)."""
+        for key in self.keys:
+            acc = self.acc[key]
+            values = valuesbykey[key]
+            if key in patternkeys:
+                # string pattern
+                for value in values:
+                    if value:
+                        acc.add(value)
+            elif key in sumkeys:
+                # sum
+                self.acc[key] = sum((value for value in values if value), acc)
+            elif key in meankeys:
+                # average
+                values = [value for value in values if value]
+                acc[0] = sum(values, acc[0])
+                acc[1] += len(values)
+            elif key in ("exec_host", "rsvd_host", "alloc_slot"):
+                # host counts
+                for value in values:
+                    if value:
+                        for host, count in value.iteritems():
+                            acc[host] += count
+            elif key == "pids":
+                # collect
+                for value in values:
+                    if value:
+                        acc.extend(value)
+            elif key == "jobid":
+                # collect once
+                ordered, seen = acc
+                for value in values:
+                    if value and value not in seen:
+                        seen.add(value)
+                        ordered.append(value)
+            elif key == "pend_reason":
+                # sum
+                for value in values:
+                    if value:
+                        for reason, count in value:
+                            acc[reason] += count
+            elif key == "host_req":
+                # count
+                for value in values:
+                    for host in value:
+                        acc[host] += 1
             else:
-                sumjob[key] = None
-        elif key in ("exec_host", "rsvd_host"):
-            # collect host counts
-            sumjob[key] = defaultdict(int)
-            for job in jobs:
-                if job[key]:
-                    for host, count in job[key].iteritems():
-                        sumjob[key][host] += count
-        elif key == "pids":
-            # collect
-            sumjob[key] = sum((job[key] for job in jobs if job[key]), [])
-        elif key == "jobid":
-            # collect
-            sumjob[key] = []
-            for job in jobs:
-                if job[key] and job[key] not in sumjob[key]:
-                    sumjob[key].append(job[key])
-        elif key == "pend_reason":
-            # sum
-            sumjob[key] = defaultdict(int)
-            for job in jobs:
-                if not job[key]:
-                    continue
-                for key2, val in job[key]:
-                    sumjob[key][key2] += val
-            sumjob[key] = sumjob[key].items()
-        else:
-            # collect and count
-            sumjob[key] = defaultdict(int)
-            for job in jobs:
-                if key == "host_req":
-                    for host in job[key]:
-                        sumjob[key][host] += 1
-                elif key == "alloc_slot":
-                    if job[key]:
-                        for host in job[key]:
-                            sumjob[key][host] += job[key][host]
-                else:
-                    sumjob[key][job[key]] += 1
-            if key not in ("stat", "alloc_slot"):
-                if len(sumjob[key]) == 1:
-                    sumjob[key] = sumjob[key].keys()[0]
-    return sumjob
+                # count
+                for value in values:
+                    acc[value] += 1
+
+    def result(self):
+        """The summarized job."""
+        sumjob = {}
+        for key in self.keys:
+            acc = self.acc[key]
+            if key in patternkeys:
+                sumjob[key] = acc.pattern()
+            elif key in meankeys:
+                sumjob[key] = acc[0] / acc[1] if acc[1] else None
+            elif key == "jobid":
+                sumjob[key] = acc[0]
+            elif key == "pend_reason":
+                sumjob[key] = acc.items()
+            elif key in sumkeys or key in ("exec_host", "rsvd_host", "pids"):
+                sumjob[key] = acc
+            elif key in ("stat", "alloc_slot") or len(acc) != 1:
+                sumjob[key] = acc
+            else:
+                sumjob[key] = acc.keys()[0]
+        return sumjob
+
+
+@timed("sumjobs")
+def sumjobs(jobs, keys=None):
+    """Summarize jobs (optionally only the given keys).
+
+    The jobs (a list or an iterable) are consumed once, in batches.
+    """
+    jobs = iter(jobs)
+    summary = None
+    while True:
+        batch = list(islice(jobs, batchsize))
+        if not batch:
+            break
+        if summary is None:
+            summary = JobSummary(keys or batch[0])
+        prefetch(batch, summary.keys)
+        summary.add(batch)
+    if summary is None:
+        summary = JobSummary(keys or ())
+    return summary.result()
+
+
+@timed("sumjobs")
+def sumjobgroups(groups, jobs, keys=None):
+    """Summarize nested groups of jobs (see groupjobs) at all levels.
+
+    Returns (titles, summarized job) like flattengroups; each job is added
+    once to the summaries of all its groups.
+    """
+    prefetch(jobs, keys or fields)
+    return sumgroups(groups, jobs, lambda job: JobSummary(keys or job))
@@ -0,0 +1 @@
+"""Tools for testing without an LSF cluster."""
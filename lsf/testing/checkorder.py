@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Check that ejobs sorts jobs alike with and without NumPy.
+
+Random jobs (with many ties and unknown priorities) are sorted by sortjobs
+and by JobTable.sorted(), with and without a sorting key, and the orders are
+compared:
+
+    python -m lsf.testing.checkorder [NJOBS]
+"""
+
+from __future__ import print_function
+
+import sys
+import random
+
+from lsf.job import Job, statorder, sortjobs
+from lsf.jobtable import JobTable
+
+# sorting keys checked after the default order
+sortkeys = (None, "priority", "user", "run_time")
+
+
+def randomjobs(njobs, seed=0):
+    """Jobs with few distinct values (so that the tie-breaking matters)."""
+    rand = random.Random(seed)
+    stats = sorted(statorder)
+    return [Job({
+        "jobid": str(i),
+        "stat": rand.choice(stats),
+        "user": rand.choice(("alice", "bob", None)),
+        "run_time": float(rand.choice((0, 60, 3600))),
+        "job_priority": rand.choice((None, 1, 50, 100)),
+        "submit_time": float(rand.randrange(5)),
+    }) for i in range(njobs)]
+
+
+def listorder(jobs, key):
+    """Job ids in the order of sortjobs (and then key)."""
+    jobs = list(jobs)
+    sortjobs(jobs)
+    if key:
+        jobs.sort(key=lambda j: j[key])
+    return [job["jobid"] for job in jobs]
+
+
+def tableorder(jobs, key):
+    """Job ids in the order of JobTable.sorted(key)."""
+    return [job["jobid"] for job in JobTable(jobs).sorted(key)]
+
+
+def main():
+    """Main program entry point."""
+    njobs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    jobs = randomjobs(njobs)
+    failed = False
+    for key in sortkeys:
+        expected, actual = listorder(jobs, key), tableorder(jobs, key)
+        if actual != expected:
+            first = next(i for i, (a, b) in enumerate(zip(actual, expected))
+                         if a != b)
+            print("sort %s: JobTable differs from sortjobs at position %d" %
+                  (key or "(default)", first), file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
+    print("%d jobs sorted alike by %d keys" % (njobs, len(sortkeys)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,900 @@
+#!/usr/bin/env python
+"""Stand-ins for the LSF commands bjobs, bhosts, lshosts, and bsub.
+
+Install them into a directory and put it first on PATH:
+
+    python -m lsf.testing.fakelsf install DIR
+    PATH=DIR:$PATH ejobs -u all
+
+They print output in LSF's formats for a synthetic cluster that is generated
+deterministically from the environment variables in settings (e.g.,
+FAKELSF_JOBS=100000 FAKELSF_HOSTS=5000).  Unlike LSF, bjobs shows the jobs
+of all users unless -u is given.  Jobs submitted with bsub are stored in
+FAKELSF_STATE (default: a directory in /tmp) and shown as pending.
+
+    python -m lsf.testing.fakelsf acct > lsb.acct
+    python -m lsf.testing.fakelsf events > lsb.events
+
+write the finished jobs as an LSF accounting file and all jobs' submissions,
+starts, and ends as an LSF event log.
+"""
+
+from __future__ import print_function, division
+
+import os
+import re
+import sys
+import json
+import fcntl
+import random
+import getpass
+import tempfile
+from time import time, sleep, strftime, localtime
+
+from lsf.resreq import selecthosts
+
+# environment variable: (setting, type, default)
+settings = {
+    "FAKELSF_JOBS": ("njobs", int, 1000),
+    "FAKELSF_HOSTS": ("nhosts", int, 100),
+    "FAKELSF_USERS": ("nusers", int, 50),
+    "FAKELSF_ARRAYS": ("arrays", float, .2),  # fraction of array elements
+    "FAKELSF_ARRAYSIZE": ("arraysize", int, 50),
+    "FAKELSF_PENDING": ("pending", float, .3),  # fraction of pending jobs
+    "FAKELSF_FINISHED": ("finished", float, .1),  # fraction of DONE/EXIT
+    "FAKELSF_REASONS": ("reasons", int, 3),  # max pending reasons per job
+    "FAKELSF_EXECHOSTS": ("exechosts", int, 4),  # max hosts per job
+    "FAKELSF_GPU": ("gpu", float, .1),  # fraction of hosts with GPUs
+    "FAKELSF_PHI": ("phi", float, .05),  # fraction of hosts with Xeon Phis
+    "FAKELSF_LATENCY": ("latency", float, 0.),  # seconds per command
+    "FAKELSF_FAILURES": ("failures", float, 0.),  # fraction of failing bsubs
+    "FAKELSF_SEED": ("seed", int, 0),
+    "FAKELSF_STATE": ("state", str, None),
+}
+
+commands = ("bjobs", "bhosts", "lshosts", "bsub")
+
+# model: (ncpus, maxmem in GB)
+models = {
+    "XeonE5": (16, 64),
+    "XeonX5": (12, 48),
+    "Gold6148": (40, 192),
+    "Platinum8160": (48, 384),
+}
+
+modelnames = sorted(models)
+
+queues = ("normal", "short", "long", "gpu")
+
+# pending reasons for some hosts and for the whole job
+hostreasons = (
+    "Not enough slots or resources for whole duration of the job",
+    "Not enough hosts to meet the job's spanning requirement",
+    "Job's requirement for exclusive execution not satisfied",
+    "Running an exclusive job",
+    "Load information unavailable",
+    "Closed by LSF administrator",
+    "Job slot limit reached",
+)
+jobreasons = (
+    "New job is waiting for scheduling",
+    "The user has reached his/her job slot limit",
+    "Job dependency condition not satisfied",
+    "The queue has reached its job slot limit",
+)
+
+firstjobid = 100000
+firstsubmitid = 10000000
+
+# bsub options that take a value
+bsubvalueopts = frozenset((
+    "-J", "-Jd", "-q", "-P", "-n", "-R", "-W", "-M", "-o", "-oo", "-e", "-eo",
+    "-i", "-w", "-m", "-u", "-C", "-S", "-G", "-g", "-app", "-sla", "-E",
+    "-Ep", "-cwd", "-outdir", "-We", "-b", "-t", "-L", "-Lp", "-c", "-v",
+    "-F", "-D", "-p",
+))
+
+timeformat = "%b %d %H:%M:%S %Y"
+shorttimeformat = "%m/%d-%H:%M:%S"
+
+
+def config():
+    """Settings from the environment."""
+    result = {}
+    for var, (name, type, default) in settings.iteritems():
+        val = os.environ.get(var)
+        result[name] = default if val is None else type(val)
+    return result
+
+
+def statedir(conf):
+    """Directory for submitted jobs."""
+    path = conf["state"]
+    if not path:
+        path = os.path.join(tempfile.gettempdir(),
+                            "fakelsf-" + getpass.getuser())
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+def formattime(t, fmt=timeformat):
+    """Format a time stamp ("-" for None)."""
+    return strftime(fmt, localtime(t)) if t else "-"
+
+
+def formatmem(mb):
+    """Format a memory size like bjobs."""
+    if mb >= 1024:
+        return "%.1f Gbytes" % (mb / 1024)
+    return "%d Mbytes" % mb
+
+
+def makehosts(conf):
+    """Generate the hosts."""
+    rand = random.Random(conf["seed"])
+    hosts = []
+    for i in range(conf["nhosts"]):
+        model = rand.choice(modelnames)
+        ncpus, maxmem = models[model]
+        r = rand.random()
+        resources = ["mg"]
+        if r < conf["gpu"]:
+            resources.append("gpu")
+        elif r < conf["gpu"] + conf["phi"]:
+            resources.append("mic")
+        r = rand.random()
+        hosts.append({
+            "name": "node%04d" % i,
+            "model": model,
+            "ncpus": ncpus,
+            "maxmem": maxmem,
+            "resources": resources,
+            "closed": "closed_Adm" if r < .02 else
+                      "unavail" if r < .03 else None,
+            "slots": 0,
+            "njobs": 0,
+            "r15s": rand.random() * ncpus,
+            "ut": rand.randrange(100),
+            "mem": rand.randrange(1, maxmem),
+        })
+    return hosts
+
+
+def chooseexechosts(rand, conf, candidates, slots, running=True):
+    """Choose execution hosts and slots for a job (loaded if running)."""
+    nexec = min(rand.randint(1, conf["exechosts"]), slots)
+    exechosts = []
+    for n in range(nexec):
+        host = rand.choice(candidates)
+        nslots = slots // nexec + (n < slots % nexec)
+        if running:
+            host["slots"] += nslots
+            host["njobs"] += 1
+        exechosts.append((host["name"], nslots))
+    return exechosts
+
+
+def makejobs(conf, hosts):
+    """Generate the jobs (and their load on the hosts)."""
+    rand = random.Random(conf["seed"] + 1)
+    now = int(time())
+    jobs = []
+    # probability to start an array (of arraysize elements) at a job
+    size = max(1, conf["arraysize"])
+    newarray = conf["arrays"] / (size * (1 - conf["arrays"]) + conf["arrays"])
+    gpuhosts = [host for host in hosts if "gpu" in host["resources"]] or hosts
+    jobid = firstjobid
+    arrayleft = 0
+    for i in range(conf["njobs"]):
+        job = {"index": None}
+        if not arrayleft and rand.random() < newarray:
+            arrayleft = size
+            arrayid = jobid
+            jobid += 1
+        if arrayleft:
+            job["jobid"] = arrayid
+            job["index"] = size - arrayleft + 1
+            job["name"] = "array%d[%d]" % (arrayid, job["index"])
+            arrayleft -= 1
+        else:
+            job["jobid"] = jobid
+            job["name"] = "%s_%d" % (rand.choice(("sim", "post", "test")), i)
+            jobid += 1
+        r = rand.random()
+        if r < conf["pending"]:
+            job["stat"] = "PEND"
+        elif r < conf["pending"] + conf["finished"]:
+            job["stat"] = "DONE" if rand.random() < .8 else "EXIT"
+        else:
+            job["stat"] = "RUN"
+        job["user"] = "user%03d" % rand.randrange(conf["nusers"])
+        job["queue"] = rand.choice(queues)
+        job["proj"] = "project%d" % rand.randrange(10)
+        job["submit"] = now - rand.randrange(60, 7 * 24 * 3600)
+        job["slots"] = rand.choice((1, 1, 1, 4, 16, 48))
+        job["runlimit"] = rand.choice((60, 240, 1440))  # minutes
+        job["command"] = "./run.sh --case %d" % i
+        job["exclusive"] = rand.random() < .1
+        model = rand.choice(modelnames)
+        job["resreq"] = "select[model==%s] rusage[mem=%d]" % (
+            model, rand.choice((512, 2048, 8192)))
+        if job["queue"] == "gpu":
+            job["resreq"] = "select[gpu] rusage[mem=2048]"
+        job["hostreq"] = []
+        if rand.random() < .05 and hosts:
+            job["hostreq"] = sorted(set(
+                rand.choice(hosts)["name"] for n in range(3)))
+        job["hosts"] = []
+        job["reasons"] = []
+        job["start"] = None
+        job["finish"] = None
+        job["runtime"] = 0
+        if job["stat"] == "PEND":
+            if rand.random() < .3:
+                job["reasons"].append([rand.choice(jobreasons), None])
+            nreasons = rand.randint(1, max(1, conf["reasons"]))
+            for reason in rand.sample(hostreasons,
+                                      min(nreasons, len(hostreasons))):
+                job["reasons"].append(
+                    [reason, rand.randint(1, max(1, len(hosts)))])
+        else:
+            job["start"] = job["submit"] + rand.randrange(3600)
+            job["runtime"] = min(rand.randrange(1, 60 * job["runlimit"]),
+                                 max(1, now - job["start"]))
+            if job["stat"] != "RUN":
+                job["finish"] = job["start"] + job["runtime"]
+            if hosts:
+                job["hosts"] = chooseexechosts(
+                    rand, conf, gpuhosts if job["queue"] == "gpu" else hosts,
+                    job["slots"], job["stat"] == "RUN")
+        jobs.append(job)
+    return jobs
+
+
+def readsubmitted(conf):
+    """Jobs submitted with bsub."""
+    try:
+        with open(os.path.join(statedir(conf), "jobs")) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except IOError:
+        return []
+
+
+def cluster(conf):
+    """Generate the hosts and jobs (including submitted ones)."""
+    hosts = makehosts(conf)
+    jobs = makejobs(conf, hosts)
+    return hosts, jobs + readsubmitted(conf)
+
+
+def displayid(job):
+    """Job id as shown by LSF (with array index)."""
+    if job["index"] is None:
+        return str(job["jobid"])
+    return "%d[%d]" % (job["jobid"], job["index"])
+
+
+def exechoststr(job):
+    """Execution hosts as in bjobs -o exec_host."""
+    return ":".join("%d*%s" % (n, host) if n > 1 else host
+                    for host, n in job["hosts"]) or "-"
+
+
+def outputvalues(job, now):
+    """Values of the bjobs -o fields of a job."""
+    running = job["stat"] == "RUN"
+    started = job["start"] is not None
+    vals = {
+        "jobid": str(job["jobid"]),
+        "stat": job["stat"],
+        "user": job["user"],
+        "user_group": "group%s" % job["user"][-1],
+        "queue": job["queue"],
+        "job_name": job["name"],
+        "proj_name": job["proj"],
+        "job_priority": "50",
+        "command": job["command"],
+        "from_host": "login1",
+        "submit_time": formattime(job["submit"]),
+        "start_time": formattime(job["start"]),
+        "finish_time": formattime(job["finish"]),
+        "slots": str(job["slots"]),
+        "min_req_proc": str(job["slots"]),
+        "max_req_proc": str(job["slots"]),
+        "run_time": "%d second(s)" % job["runtime"],
+        "cpu_used": "%.1f second(s)" % (.9 * job["runtime"] * job["slots"]),
+        "idle_factor": "0.90" if started else "0.00",
+        "pend_time": "%d second(s)" % (
+            (job["start"] if started else now) - job["submit"]),
+        "memlimit": "4 Gbytes",
+        "sub_cwd": "$HOME/work",
+        "exec_home": "/home/%s" % job["user"],
+        "exec_cwd": "/home/%s/work" % job["user"],
+        "output_file": "%s.%%J.out" % job["name"].split("[")[0],
+        "effective_resreq": job["resreq"],
+    }
+    if job["hosts"]:
+        vals["exec_host"] = vals["alloc_slot"] = exechoststr(job)
+        vals["nexec_host"] = str(len(job["hosts"]))
+        vals["nalloc_slot"] = str(job["slots"])
+        vals["first_host"] = job["hosts"][0][0]
+    if running:
+        limit = 60 * job["runlimit"]
+        vals["%complete"] = "%.2f%% L" % (100 * job["runtime"] / limit)
+        left = max(0, limit - job["runtime"])
+        vals["time_left"] = "%d:%02d L" % (left // 3600, left % 3600 // 60)
+        vals["mem"] = formatmem(job["slots"] * 256)
+        vals["max_mem"] = formatmem(job["slots"] * 384)
+        vals["avg_mem"] = formatmem(job["slots"] * 200)
+        vals["swap"] = "0 Mbytes"
+        vals["pids"] = ",".join(str(20000 + job["jobid"] % 10000 + n)
+                                for n in range(min(job["slots"], 4)))
+    if job["stat"] == "EXIT":
+        vals["exit_code"] = "1"
+        vals["exit_reason"] = "exited with non-zero status"
+    if job["stat"] == "PEND" and job["reasons"]:
+        vals["dependency"] = "-"
+    return vals
+
+
+def selectjobs(args, jobs):
+    """Apply the bjobs job selection options."""
+    opts = {}
+    ids = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("-u", "-q", "-P", "-J", "-o", "-m", "-G", "-g"):
+            opts[arg] = args[i + 1] if i + 1 < len(args) else ""
+            i += 2
+            continue
+        if arg[0] == "-":
+            opts[arg] = True
+        else:
+            ids.append(arg)
+        i += 1
+    if "-u" in opts and opts["-u"] != "all":
+        users = set(opts["-u"].split())
+        jobs = [job for job in jobs if job["user"] in users]
+    if "-q" in opts:
+        jobs = [job for job in jobs if job["queue"] == opts["-q"]]
+    if "-P" in opts:
+        jobs = [job for job in jobs if job["proj"] == opts["-P"]]
+    if "-J" in opts:
+        jobs = [job for job in jobs if job["name"] == opts["-J"]]
+    if "-m" in opts:
+        hosts = set(opts["-m"].split())
+        jobs = [job for job in jobs
+                if any(host in hosts for host, n in job["hosts"])]
+    if "-r" in opts:
+        jobs = [job for job in jobs if job["stat"] == "RUN"]
+    elif "-p" in opts:
+        jobs = [job for job in jobs if job["stat"] == "PEND"]
+    elif "-d" in opts:
+        jobs = [job for job in jobs if job["stat"] in ("DONE", "EXIT")]
+    if ids:
+        ids = set(ids)
+        jobs = [job for job in jobs
+                if str(job["jobid"]) in ids or displayid(job) in ids]
+    return opts, jobs
+
+
+def bjobso(jobs, spec, header=True):
+    """bjobs -o output."""
+    match = re.match(r"(.*?)(?:\s+delimiter='(.*)')?\s*$", spec)
+    keys = match.group(1).split()
+    delimiter = match.group(2) or " "
+    keys = [key.split(":")[0].lower() for key in keys]
+    now = time()
+    lines = []
+    if header:
+        lines.append(delimiter.join(key.upper() for key in keys))
+    for job in jobs:
+        vals = outputvalues(job, now)
+        lines.append(delimiter.join(vals.get(key, "-") for key in keys))
+    return lines
+
+
+def bjobsw(jobs, header=True):
+    """bjobs -W output."""
+    lines = []
+    if header:
+        lines.append("JOBID   USER    STAT  QUEUE      FROM_HOST   EXEC_HOST "
+                     "  JOB_NAME   SUBMIT_TIME  PROJ_NAME CPU_USED MEM SWAP "
+                     "PIDS START_TIME FINISH_TIME")
+    for job in jobs:
+        running = job["stat"] == "RUN"
+        lines.append(" ".join((
+            str(job["jobid"]), job["user"], job["stat"], job["queue"],
+            "login1", exechoststr(job), job["name"],
+            formattime(job["submit"], shorttimeformat), job["proj"],
+            "%03d:%02d:%02d.00" % (job["runtime"] // 3600,
+                                   job["runtime"] % 3600 // 60,
+                                   job["runtime"] % 60),
+            str(job["slots"] * 256) if running else "0",
+            "0", "-", formattime(job["start"], shorttimeformat),
+            formattime(job["finish"], shorttimeformat))))
+    return lines
+
+
+def bjobsp(jobs):
+    """bjobs -p output."""
+    lines = ["JOBID   USER    STAT  QUEUE      FROM_HOST   JOB_NAME   "
+             "SUBMIT_TIME"]
+    for job in jobs:
+        if job["stat"] != "PEND":
+            continue
+        lines.append("%-7d %-7s PEND  %-10s login1      %-10s %s" % (
+            job["jobid"], job["user"], job["queue"], job["name"],
+            formattime(job["submit"], "%b %d %H:%M")))
+        for reason, nhosts in job["reasons"]:
+            if nhosts is None:
+                lines.append(" %s;" % reason)
+            else:
+                lines.append(" %s: %d host%s;" % (
+                    reason, nhosts, "s" if nhosts > 1 else ""))
+    return lines
+
+
+def bjobsuf(jobs):
+    """bjobs -UF output."""
+    blocks = []
+    for job in jobs:
+        block = "\nJob <%s>, Job Name <%s>, User <%s>, Project <%s>, " \
+            "Mail <%s@example.org>, Status <%s>, Queue <%s>, " \
+            "Command <%s>\n" % (displayid(job), job["name"], job["user"],
+                                job["proj"], job["user"], job["stat"],
+                                job["queue"], job["command"])
+        submitted = formattime(job["submit"], "%a %b %d %H:%M:%S")
+        block += "%s: Submitted from host <login1>, CWD <$HOME/work>, " % \
+            submitted
+        if job["exclusive"]:
+            block += "Exclusive Execution, "
+        if job["slots"] > 1:
+            block += "%d Task(s), " % job["slots"]
+        if job["hostreq"]:
+            block += "Specified Hosts <%s>, " % ">, <".join(job["hostreq"])
+        block += "Requested Resources <%s>;\n" % job["resreq"]
+        if job["start"]:
+            block += "%s: Started %d Task(s) on Host(s) <%s>, " \
+                "Allocated %d Slot(s) on Host(s) <%s>, " \
+                "Execution Home </home/%s>, Execution CWD </home/%s/work>;\n" \
+                % (formattime(job["start"], "%a %b %d %H:%M:%S"),
+                   job["slots"], ">, <".join(exechoststr(job).split(":")),
+                   job["slots"], ">, <".join(exechoststr(job).split(":")),
+                   job["user"], job["user"])
+        if job["finish"]:
+            block += "%s: %s;\n" % (
+                formattime(job["finish"], "%a %b %d %H:%M:%S"),
+                "Done successfully" if job["stat"] == "DONE" else
+                "Exited with exit code 1")
+        block += "\n RUNLIMIT\n %.1f min of login1\n\n" % job["runlimit"]
+        block += " MEMLIMIT\n      4 G \n\n"
+        block += " RESOURCE REQUIREMENT DETAILS:\n"
+        block += " Combined: %s order[r15s:pg]\n" % job["resreq"]
+        block += " Effective: %s order[r15s:pg]\n" % job["resreq"]
+        blocks.append(block)
+    return (78 * "-" + "\n").join(blocks)
+
+
+def bjobs(args, conf):
+    """bjobs stand-in."""
+    hosts, jobs = cluster(conf)
+    opts, jobs = selectjobs(args, jobs)
+    header = "-noheader" not in opts
+    if not jobs:
+        print("No unfinished job found", file=sys.stderr)
+        return 0
+    if "-o" in opts:
+        lines = bjobso(jobs, opts["-o"], header)
+    elif "-W" in opts:
+        lines = bjobsw(jobs, header)
+    elif "-UF" in opts:
+        sys.stdout.write(bjobsuf(jobs))
+        return 0
+    elif "-p" in opts:
+        lines = bjobsp(jobs)
+    else:
+        lines = bjobso(jobs, "jobid stat user queue from_host exec_host "
+                       "job_name submit_time", header)
+    sys.stdout.write("\n".join(lines) + "\n")
+    return 0
+
+
+def loadlines(host, running):
+    """The CURRENT LOAD lines of bhosts -l for a host."""
+    load = (host["r15s"], host["ut"], host["mem"], host["ncpus"] - running) \
+        if host["closed"] != "unavail" else None
+    if load:
+        values = ("%.1f" % load[0], "%d%%" % load[1], "%dG" % load[2],
+                  load[3])
+    else:
+        values = ("-", "-", "-", "-")
+    lines = [
+        "              r15s   r1m  r15m    ut    pg    io   ls    it   tmp"
+        "   swp   mem  slots",
+        " Total         %s   0.0   0.0   %s   0.0     0    0    13  100G"
+        "   16G  %s     %s" % values,
+        " Reserved      0.0   0.0   0.0    0%   0.0     0    0     0    0M"
+        "    0M    0M      -",
+    ]
+    if "gpu" in host["resources"]:
+        lines += [
+            "              ngpus gpu_shared_avg_ut gpu_shared_avg_mut "
+            "gpu_mode0 gpu_temp0 gpu_ut0 gpu_mut0",
+            " Total            2               %d%%                 12%%"
+            "         0       45C     %d%%      12%%" % (
+                host["ut"], host["ut"]),
+            " Reserved       0.0                0%                  0%"
+            "       0.0        0C      0%       0%",
+        ]
+    if "mic" in host["resources"]:
+        lines += [
+            "              nmics mic_ncores0 mic_temp0 mic_util0 "
+            "mic_freemem0",
+            " Total            1          61       52C      %.1f        %dM"
+            % (host["ut"] / 100, 16 * 1024 - 16 * host["ut"]),
+            " Reserved       0.0         0.0        0C      0.0         0M",
+        ]
+    return lines
+
+
+def bhosts(args, conf):
+    """bhosts stand-in (the -l format)."""
+    hosts, jobs = cluster(conf)
+    req = None
+    names = []
+    i = 0
+    while i < len(args):
+        if args[i] == "-R":
+            req = args[i + 1] if i + 1 < len(args) else ""
+            i += 1
+        elif args[i][0] != "-":
+            names.append(args[i])
+        i += 1
+    if names:
+        byname = {host["name"]: host for host in hosts}
+        for name in names:
+            if name not in byname and name != "all":
+                print("%s: Bad host name, host group name or cluster name" %
+                      name, file=sys.stderr)
+                return 255
+        if "all" not in names:
+            hosts = [byname[name] for name in names]
+    if req is not None:
+        # all hosts have the type of the submission host
+        req = re.sub(r"type\s*==\s*local", "type==X86_64", req)
+        # memory sizes are in MB unless configured otherwise
+        os.environ.setdefault("LSF_UNIT_FOR_LIMITS", "MB")
+        try:
+            selected = set(host["host_name"] for host in selecthosts(
+                req, [hostattributes(host) for host in hosts]))
+        except ValueError:
+            print("Bad resource requirement syntax", file=sys.stderr)
+            return 255
+        hosts = [host for host in hosts if host["name"] in selected]
+    if not hosts:
+        print("No matching host found", file=sys.stderr)
+        return 255
+    sys.stdout.write("\n".join(bhostsl(hosts)) + "\n")
+    return 0
+
+
+def bhostsl(hosts):
+    """bhosts -l output."""
+    lines = []
+    for host in hosts:
+        running = min(host["slots"], host["ncpus"])
+        status = host["closed"] or ("closed_Full" if running >= host["ncpus"]
+                                    else "ok")
+        lines += [
+            "HOST  %s" % host["name"],
+            "STATUS           CPUF  JL/U    MAX  NJOBS    RUN  SSUSP  USUSP"
+            "    RSV DISPATCH_WINDOW",
+            "%-15s 60.00     -  %5d  %5d  %5d      0      0      0      -" % (
+                status, host["ncpus"], running, running),
+            "",
+            " CURRENT LOAD USED FOR SCHEDULING:",
+        ] + loadlines(host, running) + [
+            "",
+            "",
+            " LOAD THRESHOLD USED FOR SCHEDULING:",
+            "           r15s   r1m  r15m   ut      pg    io   ls    it    tmp"
+            "    swp    mem",
+            " loadSched   -     -     -     -       -     -    -     -     -"
+            "      -      -",
+            " loadStop    -     -     -     -       -     -    -     -     -"
+            "      -      -",
+            "",
+        ]
+        if host["closed"] == "closed_Adm":
+            lines += [" ADMIN ACTION COMMENT: \"maintenance\"", ""]
+        lines += [" CONFIGURED AFFINITY CPU LIST: all", ""]
+    return lines
+
+
+def hostattributes(host):
+    """A host in the form used by lsf.resreq."""
+    return {
+        "host_name": host["name"],
+        "type": "X86_64",
+        "model": host["model"],
+        "ncpus": host["ncpus"],
+        "cpuf": 60.0,
+        "maxmem": host["maxmem"] * 1024 ** 3,
+        "maxswp": 16 * 1024 ** 3,
+        "resources": host["resources"],
+        "load": {"mem": (host["mem"] * 1024 ** 3, 0)},
+    }
+
+
+def lshosts(args, conf):
+    """lshosts stand-in (the -w format)."""
+    hosts = makehosts(conf)
+    names = [arg for arg in args if arg[0] != "-"]
+    if names:
+        byname = {host["name"]: host for host in hosts}
+        for name in names:
+            if name not in byname:
+                print("%s: Unknown host" % name, file=sys.stderr)
+                return 255
+        hosts = [byname[name] for name in names]
+    sys.stdout.write("\n".join(lshostsw(hosts)) + "\n")
+    return 0
+
+
+def lshostsw(hosts):
+    """lshosts -w output."""
+    lines = ["HOST_NAME                     type       model  cpuf ncpus "
+             "maxmem maxswp server RESOURCES"]
+    for host in hosts:
+        lines.append("%-29s X86_64 %12s  60.0 %5d %5dG   16G    Yes (%s)" % (
+            host["name"], host["model"], host["ncpus"], host["maxmem"],
+            " ".join(host["resources"])))
+    return lines
+
+
+def arrayindices(spec):
+    """Indices of an array specification (e.g., "1-10:2,20")."""
+    indices = []
+    for part in spec.split(","):
+        step = 1
+        if ":" in part:
+            part, step = part.split(":")
+            step = int(step)
+        if "-" in part:
+            first, last = map(int, part.split("-"))
+        else:
+            first = last = int(part)
+        indices += range(first, last + 1, step)
+    return indices
+
+
+def bsub(args, conf, stdin=None):
+    """bsub stand-in (allocates job ids and stores the jobs as pending)."""
+    opts = {}
+    command = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if command:
+            command.append(arg)
+        elif arg in bsubvalueopts:
+            if i + 1 == len(args):
+                print("%s: option requires an argument" % arg,
+                      file=sys.stderr)
+                return 255
+            opts[arg] = args[i + 1]
+            i += 1
+        elif arg[0] == "-":
+            opts[arg] = True
+        else:
+            command.append(arg)
+        i += 1
+    if command:
+        command = " ".join(command)
+    else:
+        command = (stdin or sys.stdin).read().strip()
+    if not command:
+        print("No command is specified. Job not submitted.", file=sys.stderr)
+        return 255
+    queue = opts.get("-q", "normal")
+    if queue not in queues:
+        print("%s: No such queue. Job not submitted." % queue,
+              file=sys.stderr)
+        return 255
+    if random.random() < conf["failures"]:
+        print("Error: Failed in an LSF library call: Internal library error. "
+              "Job not submitted.", file=sys.stderr)
+        return 255
+    name = opts.get("-J", command.split()[0])
+    indices = [None]
+    match = re.match(r"(.*)\[([\d,:-]+)\](?:%\d+)?$", name)
+    if match:
+        name = match.group(1)
+        try:
+            indices = arrayindices(match.group(2))
+        except ValueError:
+            print("Bad job name. Job not submitted.", file=sys.stderr)
+            return 255
+    path = statedir(conf)
+    with open(os.path.join(path, "lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(os.path.join(path, "nextid")) as f:
+                    jobid = int(f.read())
+            except (IOError, ValueError):
+                jobid = firstsubmitid
+            with open(os.path.join(path, "nextid"), "w") as f:
+                f.write(str(jobid + 1))
+            with open(os.path.join(path, "jobs"), "a") as f:
+                for index in indices:
+                    f.write(json.dumps({
+                        "jobid": jobid,
+                        "index": index,
+                        "name": name if index is None else
+                        "%s[%d]" % (name, index),
+                        "stat": "PEND",
+                        "user": getpass.getuser(),
+                        "queue": queue,
+                        "proj": opts.get("-P", "default"),
+                        "submit": int(time()),
+                        "slots": int(opts.get("-n", 1)),
+                        "runlimit": int(opts.get("-W", 60)),
+                        "command": command.splitlines()[-1],
+                        "exclusive": "-x" in opts,
+                        "resreq": opts.get("-R", "select[type == local]"),
+                        "hostreq": opts.get("-m", "").split(),
+                        "hosts": [],
+                        "reasons": [[jobreasons[0], None]],
+                        "start": None,
+                        "finish": None,
+                        "runtime": 0,
+                    }) + "\n")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    if "-q" in opts:
+        print("Job <%d> is submitted to queue <%s>." % (jobid, queue))
+    else:
+        print("Job <%d> is submitted to default queue <%s>." % (jobid, queue))
+    return 0
+
+
+def acctvalue(val):
+    """Format a value of an lsb.acct record."""
+    if isinstance(val, basestring):
+        return '"%s"' % val.replace('"', '""')
+    return str(val)
+
+
+def acctrecord(job):
+    """JOB_FINISH record of a finished job in LSF 9.1's lsb.acct format."""
+    execs = [host for host, n in job["hosts"] for _ in range(n)]
+    exitstatus = 0 if job["stat"] == "DONE" else 1 << 8
+    cpu = .9 * job["runtime"] * job["slots"]
+    vals = ["JOB_FINISH", "9.13", job["finish"], job["jobid"], 1000,
+            0x40 if job["exclusive"] else 0, job["slots"], job["submit"],
+            0, job["finish"], job["start"], job["user"], job["queue"],
+            job["resreq"], "", "", "login1", "$HOME/work", "/dev/null",
+            "%s.%%J.out" % job["name"].split("[")[0], "",
+            "%d.%d" % (job["submit"], job["jobid"]), len(job["hostreq"])]
+    vals += job["hostreq"] + [len(execs)] + execs
+    vals += [64 if job["stat"] == "DONE" else 32, 1., job["name"],
+             job["command"], cpu, .05 * cpu] + 17 * [-1.]
+    vals += ["", job["proj"], exitstatus, job["slots"], "/bin/sh", "",
+             job["index"] or 0, job["slots"] * 384 * 1024, 0, "", "", "",
+             "", 0, "", 0, "", 0, "", "", "", "", -1, "", 0, "", "", 0, "",
+             0, 0, 0, 60 * job["runlimit"], job["slots"] * 200 * 1024,
+             job["resreq"], "", -1, "", -1, 0]
+    return " ".join(map(acctvalue, vals))
+
+
+def acct(args, conf):
+    """lsb.acct records of the finished jobs (in the order they finished)."""
+    hosts, jobs = cluster(conf)
+    jobs = [job for job in jobs if job["finish"] is not None]
+    jobs.sort(key=lambda job: job["finish"])
+    out = sys.stdout
+    for job in jobs:
+        out.write(acctrecord(job) + "\n")
+    return 0
+
+
+def eventrecords(job):
+    """(time, record) of the lsb.events events of a job."""
+    # memory (RSS) limit in KB
+    limits = 5 * [-1] + [4 << 20] + 3 * [-1] + [60 * job["runlimit"], -1]
+    vals = ["JOB_NEW", "9.13", job["submit"], job["jobid"], 1000,
+            0x40 if job["exclusive"] else 0, job["slots"], job["submit"],
+            0, 0, 0, 0, -1, job["user"]] + limits
+    vals += ["", 1., 18, job["queue"], job["resreq"], "login1",
+             "$HOME/work", "", "/dev/null",
+             "%s.%%J.out" % job["name"].split("[")[0], "", "", "", "",
+             "/home/%s" % job["user"], "%d.%d" % (job["submit"], job["jobid"]),
+             len(job["hostreq"])] + job["hostreq"]
+    vals += ["", "", job["name"], job["command"], 0, "", "", job["proj"], 0,
+             job["slots"], "", "/bin/sh", "group%s" % job["user"][-1]]
+    events = [(job["submit"], vals)]
+    if job["start"] is not None:
+        execs = [host for host, n in job["hosts"] for _ in range(n)]
+        events.append((job["start"], [
+            "JOB_START", "9.13", job["start"], job["jobid"], 4, 0, 0, 1.,
+            len(execs)] + execs + ["", "", 0, "", job["index"] or 0]))
+    if job["finish"] is not None:
+        done = job["stat"] == "DONE"
+        events.append((job["finish"], [
+            "JOB_STATUS", "9.13", job["finish"], job["jobid"],
+            0xc0 if done else 0x20, 0, 0, .9 * job["runtime"] * job["slots"],
+            job["finish"], 0, 0, 0 if done else 1 << 8, job["index"] or 0]))
+    return [(t, " ".join(map(acctvalue, values))) for t, values in events]
+
+
+def events(args, conf):
+    """lsb.events records of all jobs (in the order they happened)."""
+    hosts, jobs = cluster(conf)
+    records = []
+    for job in jobs:
+        records += eventrecords(job)
+    records.sort(key=lambda record: record[0])
+    out = sys.stdout
+    out.write("#%d\n" % len(records))
+    for t, record in records:
+        out.write(record + "\n")
+    return 0
+
+
+def install(path):
+    """Install the stand-in commands into a directory."""
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    script = "#!%s\nimport sys\nsys.path.insert(0, %r)\n" \
+        "from lsf.testing import fakelsf\nfakelsf.main()\n" % (
+            sys.executable, root)
+    for cmd in commands:
+        filename = os.path.join(path, cmd)
+        with open(filename, "w") as f:
+            f.write(script)
+        os.chmod(filename, 0o755)
+
+
+def main():
+    """Main program entry point.
+
+    Acts as the command it is installed as, or runs
+    fakelsf install DIR, fakelsf acct, fakelsf events, or
+    fakelsf COMMAND [ARGS].
+    """
+    cmd = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+    if cmd not in commands:
+        if args[:1] == ["install"] and len(args) == 2:
+            install(args[1])
+            return
+        if args == ["acct"]:
+            sys.exit(acct(args, config()))
+        if args == ["events"]:
+            sys.exit(events(args, config()))
+        if not args or args[0] not in commands:
+            print("usage: fakelsf install DIR | fakelsf acct | fakelsf events"
+                  " | fakelsf {%s} [ARGS]" %
+                  ",".join(commands), file=sys.stderr)
+            sys.exit(2)
+        cmd = args.pop(0)
+    conf = config()
+    if conf["latency"]:
+        sleep(conf["latency"])
+    run = {"bjobs": bjobs, "bhosts": bhosts, "lshosts": lshosts,
+           "bsub": bsub}[cmd]
+    sys.exit(run(args, conf))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Instrumentation of LSF commands, parsing, summarizing, and printing.
+
+Once enabled (by --timings or LSF_PROFILE), each span of work is recorded
+with its name, command line, wall time, bytes read, and number of records.
+"""
+
+from __future__ import print_function, division
+
+import os
+import sys
+import json
+import cProfile
+from time import time
+from functools import wraps
+from threading import local, Lock
+from contextlib import contextmanager
+from collections import OrderedDict, defaultdict
+
+enabled = False
+
+# print the spans on stderr when the program is done
+report = False
+
+starttime = time()
+
+# recorded spans (dicts) in the order they were started
+spans = []
+spanslock = Lock()
+
+threadstate = local()
+
+# maximum length of command lines in reports
+cmdlength = 60
+
+
+def enable(printreport=False):
+    """Start recording spans (and print them on stderr when done)."""
+    global enabled, report
+    enabled = True
+    report = report or printreport
+
+
+def openspans():
+    """The spans open in this thread (innermost last)."""
+    if not hasattr(threadstate, "spans"):
+        threadstate.spans = []
+    return threadstate.spans
+
+
+def current():
+    """The innermost span open in this thread (or None)."""
+    stack = openspans()
+    return stack[-1] if stack else None
+
+
+def close(stack, record):
+    """Remove a span from a stack (not necessarily the innermost one)."""
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i] is record:
+            del stack[i]
+            return
+
+
+@contextmanager
+def adopt(parent):
+    """Nest the spans of this thread (e.g., a worker) in a parent span."""
+    stack = openspans()
+    if parent is not None:
+        stack.append(parent)
+    try:
+        yield
+    finally:
+        if parent is not None:
+            close(stack, parent)
+
+
+@contextmanager
+def span(name, cmd=None, nest=True):
+    """Record the wall time of a block.
+
+    Yields the span's record, whose "bytes" and "records" may be set.  Spans
+    started in the block are nested in it unless not nest (e.g., for
+    generators, which are suspended while their consumer runs).
+    """
+    if not enabled:
+        yield {}
+        return
+    stack = openspans()
+    record = {
+        "name": name,
+        "cmd": list(cmd) if cmd else None,
+        "start": time() - starttime,
+        "seconds": None,
+        "bytes": None,
+        "records": None,
+        "parent": stack[-1]["id"] if stack else None,
+    }
+    with spanslock:
+        record["id"] = len(spans)
+        spans.append(record)
+    if nest:
+        stack.append(record)
+    try:
+        yield record
+    finally:
+        record["seconds"] = time() - starttime - record["start"]
+        close(stack, record)
+
+
+def timed(name, records=None):
+    """Record each call of a function as a span.
+
+    records(result) is the number of records (default: the length of the
+    first argument, if it has one).
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            with span(name) as record:
+                if records is None and args and \
+                        isinstance(args[0], (list, tuple)):
+                    record["records"] = len(args[0])
+                result = f(*args, **kwargs)
+                if records is not None:
+                    record["records"] = records(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def label(record):
+    """Name and abbreviated command line of a span."""
+    if not record["cmd"]:
+        return record["name"]
+    args = [arg if len(arg) < 20 else arg[:16] + "..." for arg in
+            (repr(arg)[1:-1] for arg in record["cmd"])]
+    cmd = " ".join(args)
+    if len(cmd) > cmdlength:
+        cmd = cmd[:cmdlength - 3] + "..."
+    return cmd
+
+
+def printreport(file=None):
+    """Print the recorded spans as a tree (merging repeated ones)."""
+    if file is None:
+        file = sys.stderr
+    children = defaultdict(list)
+    for record in spans:
+        children[record["parent"]].append(record)
+
+    def printspans(records, depth):
+        groups = OrderedDict()
+        for record in records:
+            groups.setdefault(label(record), []).append(record)
+        for name, group in groups.iteritems():
+            seconds = sum(record["seconds"] or 0 for record in group)
+            nbytes = [record["bytes"] for record in group
+                      if record["bytes"] is not None]
+            nrecords = [record["records"] for record in group
+                        if record["records"] is not None]
+            if len(group) > 1:
+                name += " (%d times)" % len(group)
+            print("%9.3f s %12s %10s  %s%s" % (
+                seconds, "%d B" % sum(nbytes) if nbytes else "",
+                sum(nrecords) if nrecords else "", "  " * depth, name),
+                file=file)
+            printspans([child for record in group
+                        for child in children[record["id"]]], depth + 1)
+
+    print("%9s   %12s %10s  %s" % ("time", "read", "records", "span"),
+          file=file)
+    printspans(children[None], 0)
+    print("%9.3f s total" % (time() - starttime), file=file)
+
+
+def writetrace(filename):
+    """Write the recorded spans as a JSON trace."""
+    with open(filename, "w") as f:
+        json.dump({
+            "argv": sys.argv,
+            "seconds": time() - starttime,
+            "spans": spans,
+        }, f, indent=1)
+        f.write("\n")
+
+
+def profiled(main):
+    """Run a main function with the requested instrumentation.
+
+    With LSF_PROFILE=FILE, a JSON trace of the spans (if FILE ends in .json)
+    or cProfile statistics (for pstats) are written to FILE.
+    """
+    @wraps(main)
+    def wrapper(*args, **kwargs):
+        filename = os.environ.get("LSF_PROFILE")
+        profile = None
+        if filename:
+            enable()
+            if not filename.endswith(".json"):
+                profile = cProfile.Profile()
+                profile.enable()
+        try:
+            return main(*args, **kwargs)
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats(filename)
+            elif filename:
+                writetrace(filename)
+            if report:
+                printreport()
+    return wrapper
@@ -1,36 +1,155 @@
-"""Username to real name aliasing utilities."""
+"""Username to real name aliasing utilities.
+
+Aliases are read from ~/.useraliases.  With LSF_REALNAMES set, users without
+an alias are shown by their real names from the passwd database (GECOS).
+Since that is slow over NSS/LDAP, real names are looked up once per user
+(for all users of a listing at once with resolveusers).  Aliases and real
+names are kept in a cache file, which is dropped when ~/.useraliases
+changes or after realnamemaxage.
+"""
 
 import os
+import pwd
+import json
+from time import time
+from tempfile import mkstemp
+
+from cache import cachedir
+from utility import decodeobject
 
+# seconds for which real names are cached
+realnamemaxage = 24 * 60 * 60
+
+# user -> alias and alias -> user (aliases include cached real names)
 useraliases = None
+aliasusers = None
+
+# user -> real name (None if unknown) looked up in the passwd database
+realnames = None
+
+# when the cached real names were first looked up
+cachetime = None
+
+
+def aliasfile():
+    """File with the user's aliases."""
+    return os.environ["HOME"] + "/.useraliases"
+
+
+def aliascache():
+    """Cache file for the aliases and real names."""
+    return os.path.join(cachedir(), "useraliases.json")
+
+
+def userealnames():
+    """Whether to show users without aliases by their real names."""
+    return bool(os.environ.get("LSF_REALNAMES"))
+
+
+def readaliases(filename):
+    """Read aliases from a file (user name and alias on each line)."""
+    with open(filename) as fin:
+        return dict(line.strip().split(None, 1) for line in fin
+                    if line.strip())
+
+
+def readcache(mtime):
+    """Cached (aliases, real names, time) for an alias file's mtime."""
+    try:
+        with open(aliascache()) as f:
+            cache = json.load(f, object_pairs_hook=decodeobject)
+    except (IOError, OSError, ValueError):
+        return None
+    if cache.get("mtime") != mtime or \
+            time() - cache.get("time", 0) > realnamemaxage:
+        return None
+    return cache["aliases"], cache["realnames"], cache["time"]
+
+
+def writecache(mtime):
+    """Store the aliases and real names (atomically replacing the cache)."""
+    try:
+        fd, tmpname = mkstemp(dir=cachedir())
+    except (IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"mtime": mtime, "time": cachetime,
+                       "aliases": useraliases, "realnames": realnames}, f)
+        os.rename(tmpname, aliascache())
+    except (IOError, OSError):
+        pass
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+
+def aliasmtime():
+    """Modification time of the alias file (None if it doesn't exist)."""
+    try:
+        return os.path.getmtime(aliasfile())
+    except OSError:
+        return None
 
 
 def loadaliases():
-    """Load all aliases from ~/.useraliases."""
-    global useraliases
+    """Load all aliases from ~/.useraliases (or the cache)."""
+    global useraliases, aliasusers, realnames, cachetime
     if useraliases is None:
-        filename = os.environ["HOME"] + "/.useraliases"
-        if os.path.isfile(filename):
-            with open(filename) as fin:
-                useraliases = dict(line.strip().split(None, 1) for line in fin)
+        mtime = aliasmtime()
+        cached = readcache(mtime)
+        if cached:
+            useraliases, realnames, cachetime = cached
         else:
-            useraliases = {}
+            useraliases = readaliases(aliasfile()) if mtime else {}
+            realnames = {}
+            cachetime = time()
+            writecache(mtime)
+        aliasusers = {alias: user for user, alias in useraliases.iteritems()}
+        for user, name in realnames.iteritems():
+            if name and user not in useraliases:
+                aliasusers.setdefault(name, user)
     return useraliases
 
 
+def realname(user):
+    """Real name of a user from the passwd database (None if unknown)."""
+    try:
+        gecos = pwd.getpwnam(user).pw_gecos
+    except KeyError:
+        return None
+    return gecos.split(",")[0].strip() or None
+
+
+def resolveusers(users):
+    """Look up the real names of users without aliases (in one go)."""
+    if not userealnames():
+        return
+    aliases = loadaliases()
+    new = set(user for user in users if isinstance(user, basestring) and
+              user not in aliases and user not in realnames)
+    if not new:
+        return
+    for user in new:
+        name = realnames[user] = realname(user)
+        if name:
+            aliasusers.setdefault(name, user)
+    writecache(aliasmtime())
+
+
 def getuseralias(user):
     """Look up the alias for a user."""
     aliases = loadaliases()
     if user in aliases:
         return aliases[user]
-    else:
-        return user
+    if userealnames():
+        if user not in realnames:
+            resolveusers([user])
+        return realnames[user] or user
+    return user
 
 
 def lookupalias(alias):
     """Look up the user for an alias."""
-    aliases = loadaliases()
-    try:
-        return next(k for k, v in aliases.iteritems() if v == alias)
-    except:
-        return alias
+    loadaliases()
+    return aliasusers.get(alias, alias)
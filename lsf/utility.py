@@ -2,8 +2,33 @@
 
 from __future__ import division
 
+import os
 import sys
+from functools import wraps
 from time import strftime, localtime
+from threading import Thread
+from tempfile import TemporaryFile
+from subprocess import Popen, PIPE, check_output, CalledProcessError
+
+from cache import cachedoutput, itercachedoutput
+from timings import span, current, adopt
+
+
+# number of terminal columns (determined once)
+terminalcols = None
+
+
+def terminalwidth():
+    """Number of terminal columns (80 if unknown)."""
+    global terminalcols
+    if terminalcols is None:
+        try:
+            with open(os.devnull, "w") as devnull:
+                terminalcols = int(check_output(["tput", "cols"],
+                                                stderr=devnull))
+        except (OSError, CalledProcessError, ValueError):
+            terminalcols = 80
+    return terminalcols
 
 
 def color(string, c):
@@ -89,3 +114,268 @@ def findstringpattern(strings):
         suffix = strings[0][-1] + suffix
         strings = [s[:-1] for s in strings]
     return prefix + "*" + suffix
+
+
+class StringPattern(object):
+    """findstringpattern for strings added one at a time.
+
+    Only the first string and the lengths of its common prefixes and
+    suffixes with the others are kept.
+    """
+
+    def __init__(self):
+        """Initialize without strings."""
+        self.first = None
+        self.same = True
+        self.prefix = None  # length of the pattern's prefix
+        self.suffixes = {}  # common suffix by length of the rest
+        self.longsuffix = None  # common suffix of strings longer than first
+
+    def add(self, string):
+        """Add a string."""
+        first = self.first
+        if first is None:
+            self.first = string
+            self.prefix = len(string)
+            return
+        if string == first:
+            return
+        self.same = False
+        n = min(len(string), len(first))
+        # a string that first starts with (or vice versa) doesn't shorten
+        # the prefix
+        i = 0
+        while i < n and string[i] == first[i]:
+            i += 1
+        if i < n and i < self.prefix:
+            self.prefix = i
+        # the suffix is found in what the prefix leaves of the strings
+        i = 0
+        while i < n and string[-1 - i] == first[-1 - i]:
+            i += 1
+        if len(string) > len(first):
+            if self.longsuffix is None or i < self.longsuffix:
+                self.longsuffix = i
+        else:
+            rest = len(string) - i
+            if i < self.suffixes.get(rest, n + 1):
+                self.suffixes[rest] = i
+
+    def pattern(self):
+        """The pattern of the strings added so far."""
+        first = self.first
+        if first is None:
+            return ""
+        if self.same:
+            return first
+        prefix = self.prefix
+        suffix = len(first) - prefix
+        if self.longsuffix is not None:
+            suffix = min(suffix, self.longsuffix)
+        for rest, common in self.suffixes.iteritems():
+            if rest > prefix:
+                suffix = min(suffix, common)
+        return first[:prefix] + "*" + first[len(first) - suffix:]
+
+
+def groupkeys(key):
+    """Keys to group by (from a list or a comma-separated string)."""
+    if isinstance(key, basestring):
+        return [k for k in key.split(",") if k]
+    return list(key)
+
+
+def nestgroups(items, keys, titles):
+    """Group items by several keys into nested dicts of lists.
+
+    titles(item, key) lists the groups of an item for a key (e.g., several
+    for dict-valued keys).
+    """
+    result = {}
+    for item in items:
+        nodes = [result]
+        for key in keys[:-1]:
+            nodes = [node.setdefault(title, {}) for node in nodes
+                     for title in titles(item, key)]
+        for title in titles(item, keys[-1]):
+            for node in nodes:
+                node.setdefault(title, []).append(item)
+    return result
+
+
+def flattengroups(groups, items):
+    """List (titles, items) for the nested groups at all levels.
+
+    Groups are in sorted order, each before its subgroups.  An outer group
+    has the items of its subgroups once, in their order in items.
+    """
+    position = {id(item): i for i, item in enumerate(items)}
+
+    def walk(node, path):
+        entries = []
+        for title in sorted(node):
+            subpath = path + (title,)
+            if not isinstance(node[title], dict):
+                entries.append((subpath, node[title]))
+                continue
+            subentries = walk(node[title], subpath)
+            members = {}
+            for titles, group in subentries:
+                if len(titles) == len(subpath) + 1:
+                    for item in group:
+                        members[id(item)] = item
+            entries.append((subpath, sorted(members.itervalues(),
+                                            key=lambda i: position[id(i)])))
+            entries += subentries
+        return entries
+
+    return walk(groups, ())
+
+
+def sumgroups(groups, items, newsummary, batchsize=1 << 16):
+    """List (titles, summary) for the nested groups at all levels.
+
+    The groups are in the order of flattengroups.  The items are read once,
+    in batches: newsummary(item) creates a summary with values(items), which
+    reads the items' values, addvalues(values) for a selection of these
+    values, and result().  Each item is added once to the summaries of all
+    groups that contain it, in its order in items.  (Large batches keep the
+    number of addvalues calls per group small.)
+    """
+    order = []
+    ancestors = {}  # id(item) -> titles of all groups with the item
+
+    def walk(node, path):
+        for title in sorted(node):
+            subpath = path + (title,)
+            order.append(subpath)
+            if isinstance(node[title], dict):
+                walk(node[title], subpath)
+                continue
+            paths = [subpath[:n] for n in range(1, len(subpath) + 1)]
+            for item in node[title]:
+                ancestors.setdefault(id(item), set()).update(paths)
+
+    walk(groups, ())
+    summaries = {}
+    for start in range(0, len(items), batchsize):
+        batch = items[start:start + batchsize]
+        members = {}  # titles -> indices in batch
+        for i, item in enumerate(batch):
+            for path in ancestors.get(id(item), ()):
+                members.setdefault(path, []).append(i)
+        values = None
+        for path, indices in members.iteritems():
+            if path not in summaries:
+                summaries[path] = newsummary(batch[indices[0]])
+            if values is None:
+                values = summaries[path].values(batch)
+            if len(indices) < len(batch):
+                summaries[path].addvalues({
+                    key: [vals[i] for i in indices]
+                    for key, vals in values.iteritems()})
+            else:
+                summaries[path].addvalues(values)
+    return [(path, summaries[path].result()) for path in order]
+
+
+def memoize(maxsize=1024):
+    """Cache a single-argument function's results.
+
+    The cache is cleared whenever it would exceed maxsize entries.
+    """
+    def decorator(f):
+        cache = {}
+
+        @wraps(f)
+        def wrapper(arg):
+            try:
+                return cache[arg]
+            except KeyError:
+                if len(cache) >= maxsize:
+                    cache.clear()
+                result = cache[arg] = f(arg)
+                return result
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def tostr(obj):
+    """Convert unicode strings from JSON back to str."""
+    if isinstance(obj, unicode):
+        return obj.encode("utf-8")
+    if isinstance(obj, list):
+        return [tostr(x) for x in obj]
+    return obj
+
+
+def decodeobject(pairs):
+    """Decode a JSON object with str keys and values."""
+    return {tostr(key): tostr(val) for key, val in pairs}
+
+
+def readoutput(cmd, maxage=None):
+    """Run a command and return its output and error output.
+
+    With maxage, a cached output up to maxage seconds old may be returned.
+    """
+    with span("command", cmd) as record:
+        if maxage is not None:
+            out, err = cachedoutput(cmd, maxage)
+        else:
+            p = Popen(cmd, stdout=PIPE, stderr=PIPE)
+            out, err = p.communicate()
+        record["bytes"] = len(out)
+        return out, err
+
+
+def iteroutput(cmd, maxage=None):
+    """Run a command and yield its output line by line."""
+    with span("command", cmd, nest=False) as record:
+        record["bytes"] = 0
+        if maxage is not None:
+            for line in itercachedoutput(cmd, maxage):
+                record["bytes"] += len(line)
+                yield line
+            return
+        p = Popen(cmd, stdout=PIPE, stderr=TemporaryFile())
+        try:
+            for line in iter(p.stdout.readline, ""):
+                record["bytes"] += len(line)
+                yield line
+        finally:
+            if p.poll() is None:
+                p.kill()
+            p.wait()
+
+
+def checkoutput(cmd, maxage=None):
+    """Run a command and return its output (even if it fails)."""
+    with span("command", cmd) as record:
+        if maxage is not None:
+            out = cachedoutput(cmd, maxage)[0]
+        else:
+            try:
+                out = check_output(cmd)
+            except CalledProcessError as e:
+                out = e.output
+        record["bytes"] = len(out)
+        return out
+
+
+def checkoutputs(cmds, maxage=None):
+    """Run several commands concurrently and return their outputs."""
+    outs = [None] * len(cmds)
+    parent = current()
+
+    def run(i):
+        with adopt(parent):
+            outs[i] = checkoutput(cmds[i], maxage)
+
+    threads = [Thread(target=run, args=(i,)) for i in range(len(cmds))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outs
@@ -0,0 +1,69 @@
+"""Periodically redraw the output of ejobs and ehosts in place."""
+
+from __future__ import print_function
+
+import os
+import sys
+from time import time, sleep, strftime
+from StringIO import StringIO
+
+# every fullrefresh-th redraw reads all information from LSF again
+fullrefresh = 12
+
+clearscreen = "\033[H\033[2J"
+
+
+class Capture(StringIO):
+    """Output buffer that is a tty if the real output is."""
+
+    def __init__(self, tty):
+        """Create an empty buffer."""
+        StringIO.__init__(self)
+        self.tty = tty
+
+    def isatty(self):
+        """Whether the real output is a tty."""
+        return self.tty
+
+
+def highlight(line):
+    """Highlight a (colored) line in reverse video."""
+    return "\033[7m" + line.replace("\033[0m", "\033[0m\033[7m") + "\033[0m"
+
+
+def watch(render, interval):
+    """Call render() every interval seconds and redraw its output in place.
+
+    render(previous) is passed what it returned the last time, or None for
+    every fullrefresh-th call.  Lines that changed are highlighted.
+    """
+    tty = sys.stdout.isatty()
+    title = "Every %gs: %s" % (interval, " ".join(
+        [os.path.basename(sys.argv[0])] + sys.argv[1:]))
+    state = None
+    oldlines = None
+    tick = 0
+    while True:
+        start = time()
+        if tick % fullrefresh == 0:
+            state = None
+        capture = Capture(tty)
+        stdout = sys.stdout
+        sys.stdout = capture
+        try:
+            state = render(state)
+        finally:
+            sys.stdout = stdout
+        lines = capture.getvalue().splitlines()
+        if tty:
+            sys.stdout.write(clearscreen)
+        print(title, strftime("%c"), sep="    ")
+        print()
+        for line in lines:
+            if tty and oldlines is not None and line not in oldlines:
+                line = highlight(line)
+            print(line)
+        sys.stdout.flush()
+        oldlines = set(lines)
+        tick += 1
+        sleep(max(0, interval - (time() - start)))
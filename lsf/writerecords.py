@@ -0,0 +1,68 @@
+"""Write jobs and hosts as JSON, NDJSON, or CSV records."""
+
+import sys
+import csv
+import json
+from itertools import chain
+from collections import OrderedDict
+
+from job import Job, fields, iterprefetch
+
+formats = ("json", "ndjson", "csv")
+
+
+def recordkeys(record):
+    """Default keys of a record (job fields or sorted dict keys)."""
+    if isinstance(record, Job):
+        return list(fields)
+    keys = sorted(record)
+    for key in ("host_name", "title"):
+        if key in keys:
+            keys.remove(key)
+            keys.insert(0, key)
+    return keys
+
+
+def csvvalue(val):
+    """Convert a value for a CSV cell (nested values as JSON)."""
+    if val is None:
+        return ""
+    if isinstance(val, str):
+        return val
+    return json.dumps(val)
+
+
+def writerecords(records, format, keys=None, file=None):
+    """Write records one at a time (each key's value, all by default).
+
+    format is one of formats: a JSON array, one JSON object per line, or CSV
+    with a header line.
+    """
+    if file is None:
+        file = sys.stdout
+    records = iter(records)
+    firstrecord = next(records, None)
+    if firstrecord is not None:
+        if keys is None:
+            keys = recordkeys(firstrecord)
+        records = iterprefetch(chain([firstrecord], records), keys)
+    writer = None
+    first = True
+    if format == "json":
+        file.write("[")
+    for record in records:
+        values = [(key, record.get(key)) for key in keys]
+        if format == "csv":
+            if writer is None:
+                writer = csv.writer(file, lineterminator="\n")
+                writer.writerow(keys)
+            writer.writerow([csvvalue(val) for key, val in values])
+        else:
+            line = json.dumps(OrderedDict(values))
+            if format == "json":
+                file.write(("\n" if first else ",\n") + line)
+            else:
+                file.write(line + "\n")
+        first = False
+    if format == "json":
+        file.write("]\n" if first else "\n]\n")
@@ -7,6 +7,7 @@ setup(name="lsf",
       author="Elmar Peise",
       author_email="peise@aices.rwth-aachen.de",
       url="http://github.com/elmar-peise/python-lsf",
-      packages=["lsf"],
-      scripts=["scripts/ejobs", "scripts/ehosts", "scripts/esub"]
+      packages=["lsf", "lsf.testing"],
+      scripts=["scripts/ejobs", "scripts/ehosts", "scripts/esub",
+               "scripts/elsfd", "scripts/python-lsf"]
       )